@@ -0,0 +1,223 @@
+"""Benchmark für die Hot-Paths (render → compose → send), komplett ohne GUI/Spotify/VRChat.
+
+  python bench.py                      # Tabelle über alle Template/Style-Kombinationen
+  python bench.py --quick              # weniger Iterationen
+  python bench.py --payloads rec.jsonl # aufgezeichnete Playback-Responses statt der Samples
+  python bench.py --max-us 300         # CI: Exit 1 wenn irgendein Pfad (p99) langsamer ist
+  python bench.py --max-us 300 --max frame=800 --max build_bar=20   # Schwelle pro Pfad
+"""
+import sys
+import json
+import time
+import datetime
+import argparse
+import itertools
+import tracemalloc
+
+import main
+
+SAMPLE_PAYLOADS = [
+    {"is_playing": True, "progress_ms": 61000, "item": {
+        "id": "4u7EnebtmKWzUH433cf5Qv", "name": "Bohemian Rhapsody - Remastered 2011", "duration_ms": 354320,
+        "artists": [{"name": "Queen"}]}},
+    {"is_playing": True, "progress_ms": 12500, "item": {
+        "id": "0VjIjW4GlUZAMYd2vXMi3b", "name": "Blinding Lights", "duration_ms": 200040,
+        "artists": [{"name": "The Weeknd"}]}},
+    {"is_playing": True, "progress_ms": 95000, "item": {
+        "id": "3n3Ppam7vgaVa1iaRUc9Lp", "name": "Ich will – Live aus Berlin (Überlänge Version mit Zugabe)", "duration_ms": 297000,
+        "artists": [{"name": "Rammstein"}, {"name": "Gäste"}]}},
+    {"is_playing": False, "progress_ms": 40000, "item": {
+        "id": "1EzrEOXmMH3G43AXT1y7pA", "name": "夜に駆ける", "duration_ms": 261000,
+        "artists": [{"name": "YOASOBI"}, {"name": "Ayase"}, {"name": "ikura"}]}},
+]
+
+TEMPLATES = {
+    "default": main.APP_DEFAULTS["template"],
+    "times": "{prefix} {title}{sep}{artist}{newline}{elapsed} {remaining} {bar}",
+    "fields": "{title}{sep}{artist} ({album}){newline}{bar} CPU {cpu} {clock}",
+}
+STYLES = ("ascii", "unicode", "hud")
+
+FAKE_SPECS = (23.0, {"used": 12 * 1024**3, "total": 32 * 1024**3, "percent": 37.5}, {"util": 41.0, "name": "GPU"})
+FIXED_NOW = datetime.datetime(2025, 1, 1, 20, 15, 0)
+
+class FakeOSC:
+    def __init__(self):
+        self.count = 0
+        self.last = None
+
+    def send_message(self, address, value):
+        self.count += 1
+        self.last = (address, value)
+
+class FakeClock:
+    def __init__(self, t=1000.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+    def advance(self, dt):
+        self.t += dt
+
+def load_payloads(path):
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            rec = json.loads(line)
+            if "k" in rec:
+                # Aufnahme von main.py --record: nur Playback-Records
+                if rec["k"] != "pb":
+                    continue
+                pb = rec.get("d")
+            else:
+                pb = rec
+            if pb and pb.get("item"):
+                out.append(pb)
+    return out
+
+def make_updater(overrides, clock):
+    cfg = dict(main.APP_DEFAULTS)
+    cfg.update(overrides)
+    renderer = main.Renderer(cfg, specs_reader=lambda: FAKE_SPECS, idle_reader=lambda: 0.0, now=lambda: FIXED_NOW)
+    return main.Updater(cfg, {}, renderer=renderer, clock=clock, sleep=lambda s: None, osc=FakeOSC())
+
+def percentile(sorted_vals, p):
+    if not sorted_vals:
+        return 0.0
+    k = min(len(sorted_vals) - 1, max(0, int(round(p / 100.0 * (len(sorted_vals) - 1)))))
+    return sorted_vals[k]
+
+def measure(fn, iterations, alloc_iterations):
+    for _ in range(min(50, iterations)):
+        fn()
+    samples = []
+    pc = time.perf_counter_ns
+    t_start = pc()
+    for _ in range(iterations):
+        t0 = pc(); fn(); samples.append(pc() - t0)
+    total_s = (pc() - t_start) / 1e9
+    samples.sort()
+    tracemalloc.start()
+    alloc = 0
+    for _ in range(alloc_iterations):
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn()
+        alloc += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return {
+        "ops": iterations / total_s if total_s > 0 else 0.0,
+        "p50_us": percentile(samples, 50) / 1000.0,
+        "p99_us": percentile(samples, 99) / 1000.0,
+        "alloc_b": alloc / max(1, alloc_iterations),
+    }
+
+def bench_config(tpl_name, style, ascii_only, payloads, iterations, alloc_iterations):
+    clock = FakeClock()
+    u = make_updater({
+        "template": TEMPLATES[tpl_name], "progress_style": style, "ascii_only": ascii_only,
+        "show_specs_line": True, "show_clock_line": True
+    }, clock)
+    r = u.renderer
+    feed = itertools.cycle(payloads)
+    step_ms = 250
+    n = [0]
+
+    def next_payload():
+        pb = next(feed)
+        u.apply_playback(pb)
+        # Fortschritt mitlaufen lassen, damit Bar/Zeiten sich wie live ändern
+        n[0] += 1
+        u.last_progress = (u.last_progress + step_ms * n[0]) % max(1, u.last_duration)
+
+    def frame():
+        next_payload(); clock.advance(step_ms / 1000.0); u.step(clock())
+
+    main_line, time_line = u.render_lines()
+    frame_text = u.preview()
+    parts = r.frame_parts(main_line, time_line)
+    slots = main.ChatboxSlots(u.cfg["slot_intervals"])
+    flip = itertools.cycle((0, 1))
+
+    def select_slots():
+        # wie Updater.step: Slots setzen, fällige auswählen, gesendete markieren. Die Zeitzeile ändert
+        # sich jeden Frame, ist aber Low-Priority → meist nicht fällig (der typische Fall live)
+        slots.update("track", (u.last_item.get("id"), u.cfg_epoch))
+        for name in ("rotation", "main", "specs", "clock"):
+            slots.update(name, parts[name])
+        slots.update("time", (parts["time"], next(flip)))
+        now = clock()
+        if slots.due(now):
+            slots.mark_sent(now)
+
+    paths = {
+        "render_spotify_lines": lambda: r.render_spotify_lines(u.last_item, u.last_progress, u.last_duration),
+        "build_bar": lambda: main.build_bar(u.last_progress, u.last_duration, 20, style, ascii_only, True, True),
+        "compose_full": lambda: r.compose_full(main_line, time_line),
+        "frame_parts": lambda: r.compose_parts(r.frame_parts(main_line, time_line)),
+        "slot_select": select_slots,
+        "fmt_specs": lambda: main.fmt_specs(*FAKE_SPECS, True, True, True, True, ascii_only),
+        "normalize_spaces": lambda: main.normalize_spaces_keep_newlines(frame_text),
+        "send_chatbox_raw": lambda: u.send_chatbox_raw(frame_text),
+        "frame": frame,
+    }
+    next_payload()
+    return {name: measure(fn, iterations, alloc_iterations) for name, fn in paths.items()}
+
+def main_cli():
+    ap = argparse.ArgumentParser(description="Hot-path benchmark")
+    ap.add_argument("--quick", action="store_true", help="fewer iterations")
+    ap.add_argument("--iterations", type=int, default=3000)
+    ap.add_argument("--payloads", help="JSONL with recorded playback responses")
+    ap.add_argument("--max-us", type=float, default=0.0, help="fail if any path's p99 exceeds this (µs)")
+    ap.add_argument("--max", action="append", default=[], metavar="PATH=US",
+                    help="per-path p99 limit (µs), overrides --max-us for that path; repeatable")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    limits = {}
+    for spec in args.max:
+        name, _, us = spec.partition("=")
+        try:
+            limits[name.strip()] = float(us)
+        except ValueError:
+            print(f"Bad --max {spec!r} (expected PATH=US)"); return 2
+
+    iterations = 300 if args.quick else args.iterations
+    alloc_iterations = max(20, iterations // 20)
+    payloads = load_payloads(args.payloads) if args.payloads else SAMPLE_PAYLOADS
+    if not payloads:
+        print("No playback payloads found"); return 2
+
+    results = {}
+    for tpl_name, style, ascii_only in itertools.product(TEMPLATES, STYLES, (False, True)):
+        key = f"{tpl_name}/{style}/{'ascii' if ascii_only else 'uni'}"
+        results[key] = bench_config(tpl_name, style, ascii_only, payloads, iterations, alloc_iterations)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'config':<22} {'path':<22} {'ops/s':>10} {'p50 µs':>9} {'p99 µs':>9} {'alloc/frame B':>14}")
+        for key, paths in results.items():
+            for name, m in paths.items():
+                print(f"{key:<22} {name:<22} {m['ops']:>10.0f} {m['p50_us']:>9.1f} {m['p99_us']:>9.1f} {m['alloc_b']:>14.0f}")
+
+    unknown = set(limits) - {name for paths in results.values() for name in paths}
+    if unknown:
+        print(f"Unknown path in --max: {', '.join(sorted(unknown))}"); return 2
+    slow = []
+    for key, paths in results.items():
+        for name, m in paths.items():
+            limit = limits.get(name, args.max_us)
+            if limit > 0 and m["p99_us"] > limit:
+                slow.append((key, name, m["p99_us"], limit))
+    for key, name, v, limit in slow:
+        print(f"FAIL {key} {name}: p99 {v:.1f} µs > {limit:.1f} µs")
+    return 1 if slow else 0
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -2,6 +2,7 @@ import sys
 import os
 import subprocess
 import shutil
+import ast
 import importlib.util
 
 def is_installed(modname):
@@ -39,7 +40,31 @@ if not os.path.isfile(entry):
     print(f"Entry script not found: {entry}")
     sys.exit(1)
 
-name = "VRChatSpotifyStatus"
+# Build-Profile: onefile (klassisch), onedir (startet schnell, kein Self-Extract),
+# lean (onedir ohne ungenutzte Stdlib-Module), headless (ohne tkinter/customtkinter).
+GUI_MODULES = ["tkinter", "customtkinter"]
+LEAN_EXCLUDES = [
+    "unittest", "pydoc", "doctest", "pdb", "lib2to3", "xmlrpc",
+    "test", "distutils", "setuptools", "pip"
+]
+
+PROFILES = {
+    "onefile": {"onefile": True, "gui": True, "excludes": [], "strip": False, "noupx": False},
+    "onedir": {"onefile": False, "gui": True, "excludes": [], "strip": False, "noupx": True},
+    "lean": {"onefile": False, "gui": True, "excludes": LEAN_EXCLUDES, "strip": True, "noupx": True},
+    "headless": {"onefile": False, "gui": False, "excludes": GUI_MODULES + LEAN_EXCLUDES, "strip": True, "noupx": True},
+}
+
+profile_arg = sys.argv[2] if len(sys.argv) > 2 else "onefile"
+if profile_arg == "all":
+    profile_names = list(PROFILES)
+elif profile_arg in PROFILES:
+    profile_names = [profile_arg]
+else:
+    print(f"Unknown profile: {profile_arg} (choose from {', '.join(PROFILES)}, all)")
+    sys.exit(1)
+
+base_name = "VRChatSpotifyStatus"
 workpath = os.path.abspath("build_artifacts")
 distpath = os.path.abspath("dist_artifacts")
 
@@ -71,26 +96,95 @@ hidden_imports = [
     "socketserver"
 ]
 
-args = [
-    entry,
-    "--noconfirm",
-    "--clean",
-    "--onefile",
-    "--windowed",
-    "--name", name,
-    "--distpath", distpath,
-    "--workpath", workpath,
-    collect_flag, "customtkinter",
-    "--add-data", add_data
-]
-
-for hi in hidden_imports:
-    args += ["--hidden-import", hi]
-
-pyimain.run(args)
-
-exe_path = os.path.join(distpath, f"{name}.exe")
-if os.path.isfile(exe_path):
-    print(f"Built: {exe_path}")
-else:
-    print("Build finished, but .exe not found. Check PyInstaller output.")
+def hard_gui_imports(path):
+    # Top-Level-Imports von tkinter/customtkinter außerhalb von try/except: die
+    # würden ein Build ohne GUI-Stack schon beim Start mit ImportError beenden.
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    found = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            mods = [a.name for a in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            mods = [node.module or ""]
+        else:
+            continue
+        found += [m for m in mods if m.split(".")[0] in GUI_MODULES]
+    return found
+
+def build_args(name, prof):
+    args = [
+        entry,
+        "--noconfirm",
+        "--clean",
+        "--onefile" if prof["onefile"] else "--onedir",
+        "--windowed" if prof["gui"] else "--console",
+        "--name", name,
+        "--distpath", distpath,
+        "--workpath", workpath,
+        "--add-data", add_data
+    ]
+    if prof["gui"]:
+        args += [collect_flag, "customtkinter"]
+    if prof["noupx"]:
+        args.append("--noupx")
+    if prof["strip"] and shutil.which("strip"):
+        args.append("--strip")
+    for hi in hidden_imports:
+        if hi in prof["excludes"]:
+            continue
+        args += ["--hidden-import", hi]
+    for ex in prof["excludes"]:
+        args += ["--exclude-module", ex]
+    return args
+
+def artifact_path(name, prof):
+    exe = name + (".exe" if os.name == "nt" else "")
+    if prof["onefile"]:
+        return os.path.join(distpath, exe)
+    return os.path.join(distpath, name, exe)
+
+def dist_size(name, prof):
+    if prof["onefile"]:
+        p = artifact_path(name, prof)
+        return os.path.getsize(p) if os.path.isfile(p) else 0
+    total = 0
+    for root, _dirs, files in os.walk(os.path.join(distpath, name)):
+        for f in files:
+            try: total += os.path.getsize(os.path.join(root, f))
+            except OSError: pass
+    return total
+
+def import_count(name):
+    # PYZ-00.toc listet alle gebündelten Python-Module (ein Eintrag pro 'PYMODULE')
+    toc = os.path.join(workpath, name, "PYZ-00.toc")
+    try:
+        with open(toc, "r", encoding="utf-8", errors="ignore") as f:
+            return f.read().count("'PYMODULE'")
+    except OSError:
+        return None
+
+report = []
+for pname in profile_names:
+    prof = PROFILES[pname]
+    if not prof["gui"]:
+        hard = hard_gui_imports(entry)
+        if hard:
+            print(f"Skipping profile '{pname}': {entry} imports {', '.join(hard)} unconditionally "
+                  f"(wrap them in try/except ImportError and provide a --headless mode)")
+            continue
+    name = base_name if pname == "onefile" else f"{base_name}-{pname}"
+    print(f"=== Building profile '{pname}' ===")
+    pyimain.run(build_args(name, prof))
+    exe_path = artifact_path(name, prof)
+    if os.path.isfile(exe_path):
+        print(f"Built: {exe_path}")
+    else:
+        print(f"Build finished, but {exe_path} not found. Check PyInstaller output.")
+    report.append((pname, dist_size(name, prof), import_count(name), exe_path))
+
+print("")
+print(f"{'profile':<10} {'size (MB)':>10} {'modules':>8}  artifact")
+for pname, size, mods, path in report:
+    mods_s = str(mods) if mods is not None else "?"
+    print(f"{pname:<10} {size / (1024**2):>10.1f} {mods_s:>8}  {path}")
@@ -11,18 +11,39 @@ import webbrowser
 import urllib.parse
 import subprocess
 import datetime
+import argparse
+import bisect
+import heapq
+import itertools
+import collections
+import contextlib
+import functools
+import unicodedata
 import shutil
+import re
+import struct
+import select
+import types
 import ctypes
 from ctypes import wintypes
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import requests
-import tkinter as tk
-import customtkinter as ctk
+try:
+    import tkinter as tk
+    import customtkinter as ctk
+except ImportError:
+    tk = ctk = None     # Headless-Build ohne GUI-Stack
 try:
     import psutil
 except:
     psutil = None
+try:
+    from unidecode import unidecode     # optional: bessere Transliteration (auch CJK-Ideogramme)
+except ImportError:
+    unidecode = None
 from pythonosc.udp_client import SimpleUDPClient
+from pythonosc.dispatcher import Dispatcher
+from pythonosc.osc_server import BlockingOSCUDPServer
 
 # ----------------------------- Help ---------------------------------
 
@@ -36,16 +57,33 @@ Setup
 Platzhalter
 - {prefix} {title} {artist} {sep} {bar} {position} {duration} {elapsed} {remaining} {newline}
 - {newline} fügt einen Zeilenumbruch ein.
+- Extra: {album} {context} {device} {volume} {shuffle} {repeat} {bpm} {cpu} {ram} {gpu} {clock} {lyric}
+  Werden nur berechnet, wenn sie im Template stehen. {device}/{volume}/{shuffle}/{repeat} fragen
+  /me/player ab, {context} holt den Playlist-Namen einmal pro Playlist, {bpm} liest bpm.json
+  ({"track_id" oder "artist - title": bpm}) neben der Config.
+
+Lyrics
+- {lyric} zeigt die aktuelle Zeile aus lyrics/<track_id>.lrc oder lyrics/<Artist> - <Titel>.lrc
+  (neben der Config), z.B. Template „{title}{sep}{artist}{newline}{lyric}“.
+- Gesendet wird nur beim Zeilenwechsel; zwischen zwei Polls wacht der Loop genau dafür auf.
+
+Verlauf
+- Jeder Trackwechsel landet in history/history.bin (config: history_enabled, history_max_mb).
+- Platzhalter: {top_artist} (Session), {session_tracks}, {today_tracks}, {total_tracks}.
 
 Progress
 - Styles: ascii / unicode / hud (HUD zeigt Zeiten links/rechts).
 - „HUD transparent“ → leere Segmente sind Leerzeichen (überlagert die Chatbox).
 - Länge der Bar über „Bar length“.
+- „Smooth bar“ nutzt Teilzellen (▏▎▍▌▋▊▉) → 8× feinere Auflösung bei gleicher Länge (nicht mit ASCII).
 - Für Unicode/HUD „Strip non-ASCII“ AUS lassen (Standard: AUS).
 
 Rotation
-- Enable rotation → wechselt die Einträge im Intervall.
+- Enable rotation → wechselt die Einträge im Intervall – sekundengenau, unabhängig vom Update-Intervall
+  (Poll, Rotation, Anti-AFK, Uhr/Specs und Lyrics haben je einen eigenen Termin).
 - Mode: standalone / prepend / append / twoline.
+- Pro Eintrag: Weight (1–10, öfter zeigen), Duration (s, 0 = Intervall), Window (z.B. 22:00-02:00)
+  und Bedingung (always / playing / paused / afk / active).
 
 Uhrzeit / Specs (Extra-Zeilen)
 - Separate Zeilen für Uhrzeit und/oder PC-Specs.
@@ -54,13 +92,73 @@ AFK
 - Anti-AFK: periodischer Pulse (Mode jump/wiggle).
 - AFK Tagger: hängt nach X s Windows-Inaktivität einen Tag an die erste Zeile.
 
+Kürzen
+- „Max title/artist“ und „Line width (cols)“ zählen Spalten: CJK- und Bar-Zeichen zählen doppelt,
+  kombinierende Zeichen/Emoji werden nie zerschnitten. Line width 0 = nur 144-Zeichen-Limit.
+- „Strip non-ASCII“ transliteriert statt zu löschen: ö → o, ß → ss, Kyrillisch/Griechisch/Kana → lateinisch
+  (mit installiertem unidecode auch chinesische/japanische Schriftzeichen).
+
+Stats
+- Tab „Stats“ zeigt Latenzen (Poll, Refresh, Render, Compose, Specs, Send) und Zähler (gesendet/unterdrückt, Overruns).
+- config: metrics_enabled = true → http://127.0.0.1:9105/metrics (Prometheus) und /metrics.json.
+- Mit "sessions" zählt jede Session getrennt: Werte einer Session unter /metrics ihrer Control-API.
+
+Control-API (Stream-Tools)
+- config: control_enabled = true → http://127.0.0.1:9106 (control_port), optional control_token
+  (Header „Authorization: Bearer …“ oder ?token=…).
+- GET /status, /frame (?text = nur Chatbox-Text), /metrics, /metrics.json, /config (ohne client_id).
+- POST /command mit JSON {"command": "force_send" | "pause" | "resume" | "next_rotation" | "next_profile" | "profile:NAME"}.
+- WebSocket /ws schickt jeden neuen Frame als JSON {"seq", "frame"} – kein Polling nötig; Close/Ping vom Client werden beantwortet.
+
+Overlay (OBS)
+- config: overlay_enabled = true → Browser-Source http://127.0.0.1:9106/overlay (startet den Control-Server mit).
+- ?mode=chatbox zeigt exakt den Chatbox-Text statt Titel/Artist/Bar; Token ggf. als ?token=… anhängen.
+- Fortschritt wird mit overlay_hz (Standard 10) interpoliert; gesendet werden nur geänderte Felder.
+
+Aufnahme / Replay
+- „Record“ (oder main.py --record) schreibt Spotify-Antworten und OSC-Ausgabe nach recordings/*.jsonl.
+- main.py --replay DATEI [--speed 10] [--check] spielt sie offline ab; --check vergleicht die Chatbox-Ausgabe.
+
+OSC-Eingang
+- „OSC input“ + Listen-Port (VRChat: 9001) → Avatar-Parameter steuern die App (nach Start).
+- Mapping in config (osc_actions): Adresse → show | hide | toggle_hide | force_send | next_rotation.
+  Standard: SpotifyShow (an/aus), SpotifyRefresh (sofort senden), SpotifyNext (nächster Rotator-Eintrag).
+  Profile: profile:NAME (bestimmtes Profil) oder next_profile (durchschalten).
+
+Profile
+- „Save as…“ speichert alle Display-Felder (Template, Bar, Rotator, Uhr/Specs/AFK-Zeile) unter einem Namen.
+- Ist ein Profil aktiv, landen Änderungen im Profil; „(base)“ sind die normalen Settings.
+- Umschalten (Menü, --profile NAME, OSC) tauscht nur das vorkompilierte Profil – kein Neuparsen.
+
+Avatar-Parameter
+- „Avatar params“ sendet SpotifyProgress (Float 0..1, interpoliert), SpotifyPlaying (Bool) und einen kurzen
+  SpotifyTrackChange-Puls. Gesendet wird nur, wenn sich der quantisierte Wert ändert (avatar_params_steps/-hz).
+
+Config
+- config.json wird beim Laden geprüft; ungültige Werte stehen im Log und fallen auf den Standard zurück.
+- Änderungen an config.json von außen (Editor, Skript) werden innerhalb ~1 s übernommen – ohne Neustart.
+
+Mehrere Personen (Sessions)
+- config: "sessions": [{"name": "Ann", "port": 9000}, {"name": "Bob", "ip": "192.168.0.20", "client_id": "…"}]
+  Jede Session erbt die Basis-Settings und überschreibt einzelne Keys (OSC-Ziel, Template, Profil, Ports …).
+- main.py --headless startet alle Sessions in einem Prozess; Tokens je Session in spotify_tokens-<Name>.json
+  (oder "tokens": Pfad), Verlauf in history/<Name>/. Fehlen Tokens, öffnet sich nacheinander der Login.
+- Namen müssen auch als Dateiname verschieden sein ("Ann B" und "Ann_B" kollidieren, ebenso "ann"/"Ann").
+- OSC-Listener und Control-API/Overlay pro Session nur mit eigenem osc_listen_port bzw. control_port –
+  doppelt belegte Ports schalten den Dienst für die spätere Session ab (steht im Log).
+
 Troubleshooting
 - Redirect-Fehler (Browser): Prüfe Firewall/Antivirus. „Fix firewall (callback)“ kann helfen.
 - EXE speichert nicht? In diesem Build wird neben der EXE gespeichert; fällt sonst auf %LOCALAPPDATA%.
 - 401/Refresh-Fehler: „Clear Tokens“ und neu einloggen.
+- „Token lacks scope …“ im Log: neue Version braucht weitere Berechtigungen (Prefetch der Queue, Namen eigener Playlists für {context}) → neu einloggen.
 
 Chatbox
 - „Chat sound“ toggelt Sound pro Nachricht.
+- config: typing_indicator = true → „tippt…“ erscheint typing_lead_ms (Standard 1200) vor einem Rotations-
+  oder Trackwechsel und geht nach dem Send wieder aus.
+- „Only send on change“: Titel/Artist- und Rotation-Wechsel werden sofort gesendet; Bar, Zeit, Specs und Uhr
+  lösen allein erst nach ihrem Mindestintervall (config: slot_intervals) einen Resend aus.
 """
 
 # ----------------------------- Consts ---------------------------------
@@ -69,11 +167,17 @@ PORTABLE_MODE = True
 CLIENT_ID_DEFAULT = ""
 DEFAULT_REDIRECT_HOST = "127.0.0.1"
 DEFAULT_REDIRECT_PORT = 57893
-SCOPE = "user-read-playback-state"
+# /me/player/queue (Prefetch) braucht user-read-currently-playing, {context} für eigene/geteilte
+# Playlists playlist-read-private/-collaborative. Neue Scopes greifen erst nach erneutem Login –
+# missing_scopes() meldet alte Tokens.
+SCOPE = ("user-read-playback-state user-read-currently-playing "
+         "playlist-read-private playlist-read-collaborative")
 MAX_MESSAGE_LEN = 144
 CHATBOX_INPUT = "/chatbox/input"
 CHATBOX_TYPING = "/chatbox/typing"
 INPUT_JUMP = "/input/Jump"
+STATUS_INTERVAL = 1.2               # s, Spotify/VRChat-Erkennung + Stats in der GUI
+SAVE_DEBOUNCE_MS = 400              # GUI-Eingaben erst nach kurzer Tipp-Pause speichern/neu kompilieren
 
 APP_DEFAULTS = {
     "client_id": CLIENT_ID_DEFAULT,
@@ -119,16 +223,64 @@ APP_DEFAULTS = {
     "show_specs_gpu": True,
     "ram_in_gb": True,
 
+    "prefetch_queue": False,         # nächsten Queue-Track vorab rendern (extra API-Call pro Trackwechsel)
+
     "clamp_long": True,
     "max_title_len": 28,
     "max_artist_len": 28,
+    "line_columns": 0,               # Spaltenbudget pro Zeile (0 = nur 144-Zeichen-Limit)
 
     "afk_tag_enabled": False,
     "afk_tag_after": 120,
     "afk_tag_text": "[AFK]",
 
+    # OSC-Eingang (VRChat sendet Avatar-Parameter standardmäßig an Port 9001)
+    "osc_listen_enabled": False,
+    "osc_listen_port": 9001,
+    "osc_actions": {
+        "/avatar/parameters/SpotifyShow": "show",
+        "/avatar/parameters/SpotifyRefresh": "force_send",
+        "/avatar/parameters/SpotifyNext": "next_rotation"
+    },
+
+    # Avatar-Parameter-Ausgabe (Progress 0..1, Playing, Track-Change-Puls)
+    "avatar_params_enabled": False,
+    "avatar_params": {
+        "progress": "/avatar/parameters/SpotifyProgress",
+        "playing": "/avatar/parameters/SpotifyPlaying",
+        "track_change": "/avatar/parameters/SpotifyTrackChange"
+    },
+    "avatar_params_steps": 100,      # Quantisierung des Progress-Floats
+    "avatar_params_hz": 5,
+
+    "history_enabled": True,         # history/history.bin: eine Zeile pro Trackwechsel
+    "history_max_mb": 4,             # danach wird die Datei archiviert und neu begonnen
+
+    "metrics_enabled": False,        # /metrics (Prometheus) + /metrics.json auf 127.0.0.1
+    "metrics_port": 9105,
+
+    # Lokale Steuer-API (HTTP + WebSocket) für Stream-Tools; Token optional (Bearer oder ?token=)
+    "control_enabled": False,
+    "control_port": 9106,
+    "control_token": "",
+    "overlay_enabled": False,        # /overlay (OBS Browser-Source) auf dem Control-Port
+    "overlay_hz": 10,                # Update-Rate des interpolierten Fortschritts
+
     "chat_sound": True,
-    "hud_transparent": True
+    "typing_indicator": False,       # „tippt…“ kurz vor Rotations-/Trackwechsel-Sends, danach aus
+    "typing_lead_ms": 1200,
+    "hud_transparent": True,
+    "bar_smooth": False,             # Teilzellen (▏▎▍▌▋▊▉) für feinere Bars
+
+    # Mindestabstand (s) bis eine Änderung in einer Low-Priority-Zeile allein einen Resend auslöst
+    "slot_intervals": {"main": 6, "time": 6, "specs": 10, "clock": 15},
+
+    # Benannte Anzeige-Profile: {name: {Display-Keys...}}, "" = Basis-Settings
+    "profiles": {},
+    "active_profile": "",
+
+    # Mehrere Personen in einem Prozess (headless): [{"name": ..., Overrides wie ip/port/client_id, "tokens": Pfad}]
+    "sessions": []
 }
 
 # ----------------------------- Paths ---------------------------------
@@ -177,6 +329,197 @@ def gen_pkce():
     c = b64u(d)
     return v, c
 
+# ------------------------ Metrics -------------------------------------
+
+# Bucket-Grenzen in ms (Prometheus-Histogramm, kumulativ beim Export)
+METRIC_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+class Histogram:
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self):
+        self.counts = [0] * (len(METRIC_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(METRIC_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        need = q * self.count; acc = 0
+        for i, n in enumerate(self.counts):
+            acc += n
+            if acc >= need:
+                return METRIC_BUCKETS_MS[i] if i < len(METRIC_BUCKETS_MS) else float("inf")
+        return float("inf")
+
+class Metrics:
+    """Zähler + Latenz-Histogramme für die Hot-Paths; Export als Prometheus-Text oder JSON."""
+    def __init__(self):
+        self.counters = {}
+        self.hists = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, ms):
+        with self._lock:
+            h = self.hists.get(name)
+            if h is None:
+                h = self.hists[name] = Histogram()
+            h.observe(ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": {
+                    k: {"count": h.count, "sum_ms": round(h.total, 3),
+                        "p50_ms": h.quantile(0.5), "p99_ms": h.quantile(0.99)}
+                    for k, h in self.hists.items()
+                }
+            }
+
+    def prometheus(self):
+        out = []
+        with self._lock:
+            for k, v in sorted(self.counters.items()):
+                out.append(f"# TYPE vrcspotify_{k}_total counter")
+                out.append(f"vrcspotify_{k}_total {v}")
+            for k, h in sorted(self.hists.items()):
+                name = f"vrcspotify_{k}_ms"
+                out.append(f"# TYPE {name} histogram")
+                acc = 0
+                for le, n in zip(METRIC_BUCKETS_MS, h.counts):
+                    acc += n
+                    out.append(f'{name}_bucket{{le="{le}"}} {acc}')
+                out.append(f'{name}_bucket{{le="+Inf"}} {h.count}')
+                out.append(f"{name}_sum {h.total:.3f}")
+                out.append(f"{name}_count {h.count}")
+        return "\n".join(out) + "\n"
+
+    def summary_lines(self):
+        snap = self.snapshot()
+        lines = [f"{k:<24} {v}" for k, v in sorted(snap["counters"].items())]
+        for k, h in sorted(snap["histograms"].items()):
+            lines.append(f"{k:<24} n={h['count']:<7} p50≤{h['p50_ms']}ms p99≤{h['p99_ms']}ms")
+        return lines
+
+METRICS = Metrics()                 # Einzelbetrieb; mit "sessions" hat jede Session ihre eigene Instanz
+_metrics_local = threading.local()
+
+def current_metrics():
+    # Worker-Thread einer Session → deren Metrics, sonst (GUI, Scheduler, Einzelbetrieb) die globale
+    return getattr(_metrics_local, "metrics", None) or METRICS
+
+def timed(name):
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                current_metrics().observe(name, (time.perf_counter() - t0) * 1000.0)
+        return wrapper
+    return deco
+
+def start_metrics_server(port, host="127.0.0.1"):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            pass
+
+        def do_GET(self):
+            path = urllib.parse.urlparse(self.path).path
+            if path == "/metrics":
+                body = METRICS.prometheus().encode("utf-8"); ctype = "text/plain; version=0.0.4"
+            elif path == "/metrics.json":
+                body = json.dumps(METRICS.snapshot()).encode("utf-8"); ctype = "application/json"
+            else:
+                self.send_response(404); self.end_headers(); return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# ------------------------ Scheduler -----------------------------------
+
+class ScheduledJob:
+    __slots__ = ("when", "fn", "args", "cancelled")
+
+    def __init__(self, when, fn, args):
+        self.when = when
+        self.fn = fn
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class Scheduler:
+    """
+    Ein Thread + ein Heap für alle Timer (statt threading.Timer pro Aufruf). Schläft exakt bis zur
+    nächsten Deadline (time.monotonic); ein früherer neuer Job weckt ihn. Jobs müssen kurz sein –
+    I/O gehört in den Worker, den ein Job nur anstößt.
+    """
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.cond = threading.Condition()
+        self.heap = []
+        self._seq = itertools.count()
+        self.thread = None
+
+    def call_at(self, when, fn, *args):
+        job = ScheduledJob(when, fn, args)
+        with self.cond:
+            heapq.heappush(self.heap, (when, next(self._seq), job))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+                self.thread.start()
+            if self.heap[0][2] is job:
+                self.cond.notify()
+        return job
+
+    def call_later(self, delay, fn, *args):
+        return self.call_at(self.clock() + delay, fn, *args)
+
+    def pending(self):
+        with self.cond:
+            return sum(1 for _, _, job in self.heap if not job.cancelled)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while True:
+                    while self.heap and self.heap[0][2].cancelled:
+                        heapq.heappop(self.heap)
+                    if not self.heap:
+                        self.cond.wait()
+                        continue
+                    delay = self.heap[0][0] - self.clock()
+                    if delay <= 0:
+                        job = heapq.heappop(self.heap)[2]
+                        break
+                    self.cond.wait(delay)
+            try:
+                job.fn(*job.args)
+            except Exception:
+                METRICS.inc("scheduler_errors")
+
+SCHEDULER = Scheduler()
+
 # --------- Robust local callback server (threaded, reusable, logs) ----
 
 class _CodeBox:
@@ -185,7 +528,32 @@ class _CodeBox:
         self.code = None
         self.error = None
 
-def make_handler(store: _CodeBox, ui_log=None):
+class _CallbackRegistry:
+    """Offene Logins nach OAuth-`state` → ein Listener bedient beliebig viele (auch abgebrochene) Flows."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.boxes = {}
+
+    def expect(self, state):
+        box = _CodeBox()
+        with self.lock:
+            self.boxes[state] = box
+        return box
+
+    def forget(self, state):
+        with self.lock:
+            self.boxes.pop(state, None)
+
+    def deliver(self, state, code, error=None):
+        with self.lock:
+            box = self.boxes.pop(state, None)
+        if box is None:
+            return False
+        box.code = code; box.error = error
+        box.event.set()
+        return True
+
+def make_handler(store: _CallbackRegistry, ui_log=None):
     class Handler(BaseHTTPRequestHandler):
         def log_message(self, fmt, *args):
             # optional: log in UI text box
@@ -211,22 +579,23 @@ def make_handler(store: _CodeBox, ui_log=None):
                     return
                 q = urllib.parse.parse_qs(p.query)
                 code = q.get("code", [None])[0]
-                if not code:
+                error = q.get("error", [None])[0]
+                if not code and not error:
                     self._send(400, b"Missing code")
                     return
-                store.code = code
-                store.event.set()
-                self._send(200, b"<html><body><h2>Spotify authorization complete.</h2>You can close this window.</body></html>")
-                # Stop server (async) after response
-                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                if not store.deliver(q.get("state", [""])[0], code, error):
+                    self._send(400, b"<html><body><h2>Unknown or expired login.</h2>Start the sign-in again from the app.</body></html>")
+                    return
+                if error:
+                    self._send(200, b"<html><body><h2>Spotify authorization was declined.</h2>You can close this window.</body></html>")
+                else:
+                    self._send(200, b"<html><body><h2>Spotify authorization complete.</h2>You can close this window.</body></html>")
             except Exception as e:
-                store.error = str(e)
                 if ui_log: ui_log(f"HTTP handler error: {e}")
                 try:
                     self._send(500, b"Internal error")
                 except Exception:
                     pass
-                threading.Thread(target=self.server.shutdown, daemon=True).start()
     return Handler
 
 def start_callback_server(host, port, store, ui_log=None):
@@ -234,51 +603,596 @@ def start_callback_server(host, port, store, ui_log=None):
     ThreadingHTTPServer.allow_reuse_address = True
     server = ThreadingHTTPServer((host, port), make_handler(store, ui_log))
     server.timeout = 1.0
+    server.daemon_threads = True
     t = threading.Thread(target=server.serve_forever, daemon=True)
     t.start()
     return server
 
+class CallbackListener:
+    """Ein einziger, lazy gestarteter Callback-Server für alle Logins (bleibt offen bis close())."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.registry = _CallbackRegistry()
+        self.server = None
+        self.addr = None
+        self.ui_log = None
+
+    def ensure(self, host, port, ui_log=None):
+        self.ui_log = ui_log
+        with self.lock:
+            if self.server is not None and self.addr == (host, port):
+                return self.registry
+            self._close()
+            self.server = start_callback_server(host, port, self.registry, lambda s: self.ui_log and self.ui_log(s))
+            self.addr = (host, port)
+        return self.registry
+
+    def _close(self):
+        server, self.server = self.server, None
+        if server is not None:
+            try:
+                server.shutdown(); server.server_close()
+            except Exception:
+                pass
+
+    def close(self):
+        with self.lock:
+            self._close()
+
+CALLBACKS = CallbackListener()
+
+# ------------------------ Config schema -------------------------------
+
+# Einmal beim Laden (und bei jeder Änderung) prüfen + normalisieren → danach ist die Config ein
+# eingefrorenes Mapping mit gültigen, geklemmten Werten; Render/Loop lesen sie ohne Parsing/Defaults.
+CONFIG_VERSION = 1
+
+def _f_int(lo, hi):
+    def norm(v):
+        if isinstance(v, bool): raise ValueError("expected a number")
+        return max(lo, min(hi, int(float(v))))
+    return norm
+
+def _f_bool(v):
+    if isinstance(v, str):
+        t = v.strip().lower()
+        if t in ("1", "true", "yes", "on"): return True
+        if t in ("0", "false", "no", "off", ""): return False
+        raise ValueError("expected true/false")
+    if not isinstance(v, (bool, int, float)): raise ValueError("expected true/false")
+    return bool(v)
+
+def _f_str(v):
+    if v is None or isinstance(v, (dict, list, types.MappingProxyType, tuple)):
+        raise ValueError("expected text")
+    return str(v)
+
+def _f_enum(*choices):
+    def norm(v):
+        if v not in choices: raise ValueError(f"expected one of {', '.join(choices)}")
+        return v
+    return norm
+
+def _f_str_map(v):
+    if not isinstance(v, (dict, types.MappingProxyType)): raise ValueError("expected an object")
+    return {str(k): str(x) for k, x in v.items()}
+
+def _f_int_map(lo, hi):
+    def norm(v):
+        if not isinstance(v, (dict, types.MappingProxyType)): raise ValueError("expected an object")
+        return {str(k): _f_int(lo, hi)(x) for k, x in v.items()}
+    return norm
+
+def _note(problems, msg):
+    if problems is not None: problems.append(f"config: {msg}")
+
+# Listen/Objekte werden pro Eintrag geprüft: ein kaputtes Feld kostet nur dieses Feld (bzw. den
+# Eintrag), nie die ganze Liste. Diese Normalizer bekommen problems + Pfad fürs Melden.
+def _f_rotation_items(v, problems=None, where="rotation_items"):
+    if not isinstance(v, (list, tuple)): raise ValueError("expected a list")
+    out = []
+    for i, it in enumerate(v):
+        at = f"{where}[{i}]"
+        if isinstance(it, str): it = {"text": it}
+        if not isinstance(it, (dict, types.MappingProxyType)):
+            _note(problems, f"{at}={it!r} ignored (expected an object)")
+            continue
+        item = {"text": str(it.get("text", ""))}
+        for k, norm in (("weight", _f_int(1, ROTATION_MAX_WEIGHT)), ("duration", _f_int(0, 3600))):
+            if k not in it: continue
+            try: item[k] = norm(it[k])
+            except (TypeError, ValueError) as e: _note(problems, f"{at}.{k}={it[k]!r} ignored ({e})")
+        if it.get("window"): item["window"] = str(it["window"])
+        if it.get("when") in ROTATION_WHEN: item["when"] = it["when"]
+        elif it.get("when"): _note(problems, f"{at}.when={it['when']!r} ignored (expected one of {', '.join(ROTATION_WHEN)})")
+        out.append(item)
+    return out
+
+def _f_profiles(v, problems=None, where="profiles"):
+    if not isinstance(v, (dict, types.MappingProxyType)): raise ValueError("expected an object")
+    out = {}
+    for name, over in v.items():
+        if not name or not isinstance(over, (dict, types.MappingProxyType)):
+            _note(problems, f"{where}.{name}={over!r} ignored (expected an object)")
+            continue
+        prof = {}
+        for k in PROFILE_KEYS:
+            if k in over:
+                try: prof[k] = normalize_field(k, over[k], problems, f"{where}.{name}.{k}")
+                except (TypeError, ValueError) as e: _note(problems, f"{where}.{name}.{k}={over[k]!r} ignored ({e})")
+        out[str(name)] = prof
+    return out
+
+SESSION_ONLY_KEYS = ("name", "tokens")
+# Dienste, die pro Session einen eigenen Port brauchen: Port-Key → Schalter, die ihn benutzen
+SESSION_PORTS = {"osc_listen_port": ("osc_listen_enabled",), "control_port": ("control_enabled", "overlay_enabled")}
+
+def session_slug(name):
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", name).strip("_") or "session"
+
+def session_token_path(sess):
+    return sess.get("tokens") or os.path.join(_data_dir(), f"spotify_tokens-{session_slug(sess['name'])}.json")
+
+def _f_sessions(v, problems=None, where="sessions"):
+    if not isinstance(v, (list, tuple)): raise ValueError("expected a list")
+    out, seen, slugs, token_files = [], set(), {}, {}
+    for i, sess in enumerate(v):
+        at = f"{where}[{i}]"
+        if not isinstance(sess, (dict, types.MappingProxyType)):
+            _note(problems, f"{at}={sess!r} ignored (expected an object)")
+            continue
+        name = str(sess.get("name") or "").strip()
+        if not name or name in seen:
+            _note(problems, f"{at} ignored ({'duplicate name ' + repr(name) if name else 'missing name'})")
+            continue
+        # Token-Datei und history/<slug>/ hängen am Slug: "Ann B"/"Ann_B" (oder nur Groß/klein) kollidieren
+        slug = session_slug(name).lower()
+        if slug in slugs:
+            _note(problems, f"{at} ignored (name {name!r} maps to the same files as {slugs[slug]!r})")
+            continue
+        item = {"name": name}
+        if sess.get("tokens"): item["tokens"] = str(sess["tokens"])
+        tfile = os.path.normcase(os.path.abspath(session_token_path(item)))
+        if tfile in token_files:
+            _note(problems, f"{at} ignored (token file {item.get('tokens') or tfile!r} already used by {token_files[tfile]!r})")
+            continue
+        seen.add(name); slugs[slug] = name; token_files[tfile] = name
+        for k, x in sess.items():
+            if k in SESSION_ONLY_KEYS or k == "sessions" or k not in CONFIG_SCHEMA: continue
+            try: item[k] = normalize_field(k, x, problems, f"{at}.{k}")
+            except (TypeError, ValueError) as e: _note(problems, f"{at}.{k}={x!r} ignored ({e})")
+        out.append(item)
+    return out
+
+CONFIG_SCHEMA = {
+    "client_id": _f_str, "save_client_id": _f_bool, "ip": _f_str, "port": _f_int(1, 65535),
+    "update_interval": _f_int(1, 120),
+    "bar_length": _f_int(4, 60), "show_bar": _f_bool, "prefix": _f_bool, "prefix_text": _f_str,
+    "sep_title_artist": _f_str, "progress_style": _f_enum("ascii", "unicode", "hud"),
+    "show_title": _f_bool, "show_artist": _f_bool, "show_time": _f_bool,
+    "time_mode": _f_enum("elapsed", "remaining", "both"), "time_on_second_line": _f_bool,
+    "ascii_only": _f_bool, "only_changes": _f_bool, "template": _f_str,
+    "rotation_enabled": _f_bool, "rotation_interval": _f_int(1, 3600),
+    "rotation_mode": _f_enum("standalone", "prepend", "append", "twoline"),
+    "rotation_items": _f_rotation_items,
+    "show_clock_line": _f_bool, "clock_24h": _f_bool, "clock_prefix": _f_str,
+    "anti_afk_enabled": _f_bool, "anti_afk_interval": _f_int(5, 3600), "anti_afk_mode": _f_enum("jump", "wiggle"),
+    "show_specs_line": _f_bool, "show_specs_cpu": _f_bool, "show_specs_ram": _f_bool,
+    "show_specs_gpu": _f_bool, "ram_in_gb": _f_bool,
+    "prefetch_queue": _f_bool, "clamp_long": _f_bool,
+    "max_title_len": _f_int(6, 80), "max_artist_len": _f_int(6, 80), "line_columns": _f_int(0, 144),
+    "afk_tag_enabled": _f_bool, "afk_tag_after": _f_int(10, 36000), "afk_tag_text": _f_str,
+    "osc_listen_enabled": _f_bool, "osc_listen_port": _f_int(1, 65535), "osc_actions": _f_str_map,
+    "avatar_params_enabled": _f_bool, "avatar_params": _f_str_map,
+    "avatar_params_steps": _f_int(1, 1000), "avatar_params_hz": _f_int(1, 30),
+    "history_enabled": _f_bool, "history_max_mb": _f_int(1, 1024),
+    "metrics_enabled": _f_bool, "metrics_port": _f_int(1, 65535),
+    "control_enabled": _f_bool, "control_port": _f_int(1, 65535), "control_token": _f_str,
+    "overlay_enabled": _f_bool, "overlay_hz": _f_int(1, 30),
+    "chat_sound": _f_bool, "typing_indicator": _f_bool, "typing_lead_ms": _f_int(100, 5000), "hud_transparent": _f_bool, "bar_smooth": _f_bool,
+    "slot_intervals": _f_int_map(0, 3600),
+    "profiles": _f_profiles, "active_profile": _f_str,
+    "sessions": _f_sessions,
+}
+_NESTED_FIELDS = (_f_rotation_items, _f_profiles, _f_sessions)
+
+def normalize_field(key, v, problems=None, where=None):
+    """Einen Wert nach CONFIG_SCHEMA normalisieren; wirft ValueError/TypeError, wenn er ganz ungültig ist."""
+    norm = CONFIG_SCHEMA[key]
+    if norm in _NESTED_FIELDS:
+        return norm(v, problems, where or key)
+    return norm(v)
+
+def _migrate_v0(cfg):
+    # v0 (ohne config_version): Rotator-Einträge konnten reine Strings sein, Zahlen als Strings
+    items = cfg.get("rotation_items")
+    if isinstance(items, list):
+        cfg["rotation_items"] = [{"text": it} if isinstance(it, str) else it for it in items]
+    return cfg
+
+CONFIG_MIGRATIONS = {0: _migrate_v0}     # Version → Funktion, die auf Version+1 hebt
+
+def migrate_config(raw):
+    cfg = dict(raw)
+    try:
+        version = int(cfg.pop("config_version", 0))
+    except (TypeError, ValueError):
+        version = 0
+    while version < CONFIG_VERSION:
+        cfg = CONFIG_MIGRATIONS[version](cfg)
+        version += 1
+    return cfg
+
+def freeze(v):
+    if isinstance(v, (dict, types.MappingProxyType)):
+        return types.MappingProxyType({k: freeze(x) for k, x in v.items()})
+    if isinstance(v, (list, tuple)):
+        return tuple(freeze(x) for x in v)
+    return v
+
+def thaw(v):
+    if isinstance(v, (dict, types.MappingProxyType)):
+        return {k: thaw(x) for k, x in v.items()}
+    if isinstance(v, (list, tuple)):
+        return [thaw(x) for x in v]
+    return v
+
+def validate_config(raw, problems=None):
+    """Rohes Dict → eingefrorene, vollständige Config. Ungültige Werte fallen auf den Default zurück."""
+    if isinstance(raw, types.MappingProxyType) and raw.get("_validated"):
+        return raw
+    out = {}
+    for key, default in APP_DEFAULTS.items():
+        if key not in raw:
+            out[key] = default
+            continue
+        try:
+            out[key] = normalize_field(key, raw[key], problems)
+        except (TypeError, ValueError) as e:
+            _note(problems, f"{key}={raw[key]!r} ignored ({e})")
+            out[key] = default
+    for key, v in raw.items():
+        out.setdefault(key, v)          # unbekannte Keys (neuere Version, Tools) bleiben erhalten
+    out["_validated"] = True
+    return freeze(out)
+
 # ------------------------ Token / Config IO ---------------------------
 
-def token_store_load():
-    if os.path.exists(TOKEN_FILE):
+class TokenStore:
+    """
+    Tokens im Speicher; die Datei wird nur beim Start und bei Fremdänderung (anderer Prozess) gelesen.
+    Schreiben atomar (tmp + fsync + os.replace, 0600) unter einem Lockfile; Abonnenten
+    bekommen jede Änderung als fn(tokens).
+    """
+    LOCK_TIMEOUT = 5.0
+    LOCK_STALE = 90.0       # deutlich über dem HTTP-Timeout des Refreshs (30 s)
+    LOCK_KEEPALIVE = 10.0   # so lange ein Refresh läuft, wird das Lockfile frisch gehalten
+
+    def __init__(self, path=None):
+        self.path = path or TOKEN_FILE
+        self.lock = threading.RLock()       # nur In-Memory-Zustand, nie über Netz/Lockfile-Warten
+        self._io = threading.Lock()         # ein Schreiber (set/clear/refresh) pro Prozess, hält das Lockfile
+        self._tokens = None
+        self._stamp = None
+        self._subs = []
+        self.load_error = None
+
+    def _file_stamp(self):
         try:
-            with open(TOKEN_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def _read(self):
+        self._stamp = self._file_stamp()
+        self.load_error = None
+        if self._stamp is None:
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError) as e:
+            self.load_error = str(e)     # kaputte Datei: nicht still überschreiben, Fehler merken
             return {}
-    return {}
 
-def token_store_save(tokens):
-    with open(TOKEN_FILE, "w", encoding="utf-8") as f:
-        json.dump(tokens, f)
+    @contextlib.contextmanager
+    def _file_lock(self, keepalive=False):
+        lock_path = self.path + ".lock"
+        deadline = time.monotonic() + self.LOCK_TIMEOUT
+        while True:
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_path) > self.LOCK_STALE:
+                        os.remove(lock_path); continue       # Lock eines abgestürzten Prozesses
+                except OSError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Token file locked: {lock_path}")
+                time.sleep(0.05)
+        job = None
+        def touch():
+            nonlocal job
+            try: os.utime(lock_path)
+            except OSError: pass
+            job = SCHEDULER.call_later(self.LOCK_KEEPALIVE, touch)
+        try:
+            os.write(fd, str(os.getpid()).encode())
+            if keepalive:
+                job = SCHEDULER.call_later(self.LOCK_KEEPALIVE, touch)
+            yield
+        finally:
+            if job is not None: job.cancel()
+            os.close(fd)
+            try: os.remove(lock_path)
+            except OSError: pass
+
+    def _write(self, tokens):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(tokens, f)
+            f.flush(); os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._stamp = self._file_stamp()
+
+    def get(self):
+        with self.lock:
+            if self._tokens is None:
+                self._tokens = self._read()
+            return dict(self._tokens)
+
+    @contextlib.contextmanager
+    def _writer(self):
+        # Schreiben nur unter dem Lockfile; läuft gerade ein Refresh, wartet der Schreiber auf dessen Ende
+        with self._io, self._file_lock(), self.lock:
+            yield
+
+    def set(self, tokens):
+        tokens = dict(tokens or {})
+        with self._writer():
+            self._write(tokens)
+            self._tokens = tokens
+        self._notify(tokens)
+        return dict(tokens)
+
+    def clear(self):
+        with self._writer():
+            try: os.remove(self.path)
+            except FileNotFoundError: pass
+            self._tokens = {}; self._stamp = None
+        self._notify({})
+
+    def refresh(self, fn):
+        """
+        fn(tokens) → neue Tokens, unter dem (frisch gehaltenen) Lockfile. Hat ein anderer Prozess die
+        Datei inzwischen erneuert, wird das übernommen statt selbst zu refreshen (Spotify rotiert
+        Refresh-Tokens). fn läuft ohne self.lock: get() blockiert nicht auf das Netz, set/clear warten
+        auf das Ende des Refreshs und gewinnen danach.
+        """
+        with self._io, self._file_lock(keepalive=True):
+            with self.lock:
+                before = self._tokens
+                if self._tokens is None or self._file_stamp() != self._stamp:
+                    self._tokens = self._read()
+                cur = dict(self._tokens)
+            new = cur if cur and not token_expired(cur) else fn(cur)
+            with self.lock:
+                if new != cur:
+                    self._write(new)
+                changed = new != before
+                self._tokens = dict(new)
+        if changed:
+            self._notify(new)
+        return dict(new)
+
+    def subscribe(self, fn):
+        self._subs.append(fn)
+        return lambda: self._subs.remove(fn) if fn in self._subs else None
+
+    def _notify(self, tokens):
+        for fn in list(self._subs):
+            try:
+                fn(dict(tokens))
+            except Exception:
+                pass
+
+TOKENS = TokenStore()
+
+# Digests der zuletzt selbst geschriebenen Dateien → der Watcher meldet eigene Saves nicht zurück
+_CONFIG_OWN_WRITES = collections.deque(maxlen=8)
 
-def config_load():
+def config_parse(raw):
+    """Bytes → geprüfte Config. Wirft ValueError, wenn die Datei kein JSON-Objekt ist."""
+    data = json.loads(raw.decode("utf-8"))
+    if not isinstance(data, dict): raise ValueError("top level is not an object")
+    return data
+
+def config_load(problems=None):
     cfg = {}
     if os.path.exists(CONFIG_FILE):
         try:
-            with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-                cfg = json.load(f)
-        except:
+            with open(CONFIG_FILE, "rb") as f:
+                cfg = config_parse(f.read())
+        except Exception as e:
+            if problems is not None: problems.append(f"config unreadable, using defaults ({e})")
             cfg = {}
-    out = dict(APP_DEFAULTS); out.update(cfg or {})
-    for k, v in APP_DEFAULTS.items():
-        if k not in out:
-            out[k] = v
-    return out
+    return validate_config(migrate_config(cfg), problems)
 
 def config_save(cfg):
-    data = dict(cfg)
+    data = thaw(cfg)
+    data.pop("_validated", None)
+    data["config_version"] = CONFIG_VERSION
     if not data.get("save_client_id", True):
         data["client_id"] = ""
-    with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f)
+    raw = json.dumps(data).encode("utf-8")
+    _CONFIG_OWN_WRITES.append(hashlib.sha1(raw).digest())
+    # atomar, damit der Watcher (oder ein anderer Prozess) nie eine halbe Datei liest
+    tmp = f"{CONFIG_FILE}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(raw)
+    os.replace(tmp, CONFIG_FILE)
+
+class _Inotify:
+    """Minimaler inotify-Wrapper (ctypes, nur Linux): meldet Änderungen an einer Datei im Verzeichnis."""
+    IN_CLOSE_WRITE, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x08, 0x80, 0x100, 0x200
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, path):
+        libc = ctypes.CDLL(None, use_errno=True)
+        self.name = os.fsencode(os.path.basename(path))
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # Verzeichnis beobachten: atomare Saves (tmp + rename) ersetzen die Inode der Datei
+        mask = self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE
+        if libc.inotify_add_watch(self.fd, os.fsencode(os.path.dirname(os.path.abspath(path))), mask) < 0:
+            err = ctypes.get_errno(); os.close(self.fd)
+            raise OSError(err, "inotify_add_watch failed")
+
+    def wait(self, timeout):
+        """True, wenn innerhalb von timeout ein Event für unsere Datei kam."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return False
+        hit = False
+        while True:
+            try:
+                buf = os.read(self.fd, 4096)
+            except BlockingIOError:
+                return hit
+            off = 0
+            while off + self._EVENT.size <= len(buf):
+                _wd, _mask, _cookie, n = self._EVENT.unpack_from(buf, off)
+                off += self._EVENT.size
+                if buf[off:off + n].rstrip(b"\0") == self.name: hit = True
+                off += n
+
+    def close(self):
+        try: os.close(self.fd)
+        except OSError: pass
+
+class ConfigWatcher:
+    """
+    Beobachtet CONFIG_FILE (inotify unter Linux, sonst stat-Polling) und ruft on_change(cfg, problems)
+    mit der neu validierten Config. mtime/size und Inhalts-Hash schließen unveränderte Dateien
+    und eigene Saves aus; kaputtes JSON lässt die aktuelle Config stehen.
+    """
+    POLL_INTERVAL = 0.5
+    SETTLE = 0.05          # Editoren schreiben in mehreren Schritten
+
+    def __init__(self, on_change, path=None, log=None, interval=None, scheduler=None):
+        self.on_change = on_change
+        self.scheduler = scheduler or SCHEDULER
+        self.path = path or CONFIG_FILE
+        self.log = log or (lambda s: None)
+        self.interval = interval or self.POLL_INTERVAL
+        self.running = False
+        self.thread = None
+        self._stamp = self._file_stamp()
+        self._digest = self._file_digest()
+        self.backend = None
+        self._job = None
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def _file_digest(self):
+        try:
+            with open(self.path, "rb") as f:
+                return hashlib.sha1(f.read()).digest()
+        except OSError:
+            return None
+
+    def check(self):
+        """Einmal prüfen; True, wenn eine neue Config übergeben wurde."""
+        stamp = self._file_stamp()
+        if stamp == self._stamp or stamp is None:     # gelöscht: aktuelle Config behalten
+            self._stamp = stamp
+            return False
+        self._stamp = stamp
+        try:
+            with open(self.path, "rb") as f:
+                raw = f.read()
+        except OSError:
+            return False
+        digest = hashlib.sha1(raw).digest()
+        if digest == self._digest or digest in _CONFIG_OWN_WRITES:
+            self._digest = digest
+            return False
+        self._digest = digest
+        try:
+            data = config_parse(raw)
+        except ValueError as e:
+            self.log(f"config.json invalid, keeping current settings ({e})")
+            return False
+        problems = []
+        cfg = validate_config(migrate_config(data), problems)
+        self.on_change(cfg, problems)
+        return True
+
+    def start(self):
+        if self.running: return
+        self.running = True
+        ino = None
+        if sys.platform.startswith("linux"):
+            try:
+                ino = _Inotify(self.path)
+            except (OSError, AttributeError):
+                ino = None
+        if ino is not None:
+            self.backend = "inotify"        # blockiert in select → eigener Thread
+            self.thread = threading.Thread(target=self._run_inotify, args=(ino,), daemon=True)
+            self.thread.start()
+        else:
+            self.backend = "poll"           # ein stat() pro Intervall als Scheduler-Job
+            self._job = self.scheduler.call_later(self.interval, self._poll_tick)
+
+    def stop(self):
+        self.running = False
+        if self._job is not None:
+            self._job.cancel(); self._job = None
+
+    def _safe_check(self):
+        try:
+            self.check()
+        except Exception as e:
+            self.log(f"Config reload error: {e}")
+
+    def _poll_tick(self):
+        if not self.running: return
+        self._safe_check()
+        self._job = self.scheduler.call_later(self.interval, self._poll_tick)
+
+    def _run_inotify(self, ino):
+        try:
+            while self.running:
+                if not ino.wait(1.0): continue
+                time.sleep(self.SETTLE)
+                self._safe_check()
+        finally:
+            ino.close()
 
 def token_expired(tokens):
     if not tokens or "access_token" not in tokens or "expires_in" not in tokens or "obtained_at" not in tokens:
         return True
     return (int(time.time()) - int(tokens["obtained_at"])) >= int(tokens["expires_in"]) - 30
 
+def missing_scopes(tokens):
+    # Spotify liefert die gewährten Scopes mit den Tokens; ältere Token-Dateien ohne "scope" gelten als vollständig
+    granted = (tokens or {}).get("scope")
+    if granted is None:
+        return []
+    have = set(str(granted).split())
+    return [s for s in SCOPE.split() if s not in have]
+
 def raise_for_status_with_body(resp):
     try:
         resp.raise_for_status()
@@ -291,48 +1205,116 @@ def raise_for_status_with_body(resp):
 
 # ------------------------ Spotify OAuth (robust) ----------------------
 
-def authorize_pkce(client_id, redirect_host, redirect_port, ui_log=None):
-    store = _CodeBox()
-    server = start_callback_server(redirect_host, redirect_port, store, ui_log)
-
-    verifier, challenge = gen_pkce()
-    redirect_uri = f"http://{redirect_host}:{redirect_port}/callback"
-    params = {
-        "client_id": client_id, "response_type": "code",
-        "redirect_uri": redirect_uri, "scope": SCOPE,
-        "code_challenge_method": "S256", "code_challenge": challenge,
-        "show_dialog": "true"
-    }
-    url = "https://accounts.spotify.com/authorize?" + urllib.parse.urlencode(params)
-    webbrowser.open(url)
-
-    # bis zu 180s auf den Code warten
-    ok = store.event.wait(timeout=180)
-    try:
-        server.shutdown(); server.server_close()
-    except Exception:
-        pass
-    if not ok or not store.code:
-        raise RuntimeError(f"Auth timeout or no code ({store.error or 'no error text'})")
+# Über SPOTIFY_ACCOUNTS_BASE lässt sich ein lokaler Fake-Accounts-Server nutzen (End-to-End-Test des Logins)
+ACCOUNTS_BASE = os.environ.get("SPOTIFY_ACCOUNTS_BASE", "https://accounts.spotify.com").rstrip("/")
 
-    data = {
-        "grant_type": "authorization_code", "code": store.code,
-        "redirect_uri": redirect_uri, "client_id": client_id,
-        "code_verifier": verifier
-    }
-    r = requests.post("https://accounts.spotify.com/api/token", data=data, timeout=30)
-    raise_for_status_with_body(r)
-    tokens = r.json()
-    tokens["client_id"] = client_id
-    tokens["obtained_at"] = int(time.time())
-    token_store_save(tokens)
-    return tokens
+class AuthCancelled(Exception):
+    pass
 
+class AuthFlow:
+    """
+    PKCE-Login ohne Blockieren: läuft im eigenen Thread, meldet Fortschritt über
+    on_progress(stage, text) und endet mit on_done(tokens, error). cancel() bricht jederzeit ab.
+    Stages: listening, browser, waiting, exchanging, done, failed, cancelled.
+    """
+    def __init__(self, client_id, redirect_host, redirect_port, on_progress=None, on_done=None,
+                 timeout=180, open_browser=None, ui_log=None, store=None):
+        self.client_id = client_id
+        self.store = store or TOKENS
+        self.redirect_host = redirect_host
+        self.redirect_port = redirect_port
+        self.on_progress = on_progress or (lambda stage, text: None)
+        self.on_done = on_done or (lambda tokens, error: None)
+        self.timeout = timeout
+        self.open_browser = open_browser or webbrowser.open
+        self.ui_log = ui_log
+        self.state = secrets.token_urlsafe(16)
+        self.box = None
+        self.cancelled = False
+        self.thread = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self.cancelled = True
+        if self.box is not None:
+            self.box.event.set()
+
+    def _run(self):
+        try:
+            tokens = self.run()
+        except AuthCancelled:
+            self.on_progress("cancelled", "Login cancelled")
+            self.on_done(None, None)
+        except Exception as e:
+            self.on_progress("failed", f"Auth error: {e}")
+            self.on_done(None, e)
+        else:
+            self.on_progress("done", "Spotify authorized")
+            self.on_done(tokens, None)
+
+    def run(self):
+        """Synchron (z.B. headless). Gibt die Tokens zurück oder wirft."""
+        self.on_progress("listening", "Starting local callback server...")
+        registry = CALLBACKS.ensure(self.redirect_host, self.redirect_port, self.ui_log)
+        self.box = registry.expect(self.state)
+        try:
+            verifier, challenge = gen_pkce()
+            redirect_uri = f"http://{self.redirect_host}:{self.redirect_port}/callback"
+            params = {
+                "client_id": self.client_id, "response_type": "code",
+                "redirect_uri": redirect_uri, "scope": SCOPE, "state": self.state,
+                "code_challenge_method": "S256", "code_challenge": challenge,
+                "show_dialog": "true"
+            }
+            self.on_progress("browser", "Opening browser for Spotify sign-in...")
+            self.open_browser(f"{ACCOUNTS_BASE}/authorize?" + urllib.parse.urlencode(params))
+
+            self.on_progress("waiting", "Waiting for Spotify callback...")
+            ok = self.box.event.wait(timeout=self.timeout)
+            if self.cancelled:
+                raise AuthCancelled()
+            if not ok:
+                raise RuntimeError("Auth timeout")
+            if self.box.error or not self.box.code:
+                raise RuntimeError(f"No code ({self.box.error or 'no error text'})")
+
+            self.on_progress("exchanging", "Exchanging code for tokens...")
+            data = {
+                "grant_type": "authorization_code", "code": self.box.code,
+                "redirect_uri": redirect_uri, "client_id": self.client_id,
+                "code_verifier": verifier
+            }
+            r = http_session().post(f"{ACCOUNTS_BASE}/api/token", data=data, timeout=30)
+            if self.cancelled:
+                raise AuthCancelled()
+            raise_for_status_with_body(r)
+        finally:
+            registry.forget(self.state)
+        tokens = r.json()
+        tokens["client_id"] = self.client_id
+        tokens["obtained_at"] = int(time.time())
+        return self.store.set(tokens)
+
+def authorize_pkce(client_id, redirect_host, redirect_port, ui_log=None, store=None):
+    # blockierende Variante für --headless
+    log = ui_log or (lambda s: None)
+    return AuthFlow(client_id, redirect_host, redirect_port, on_progress=lambda _stage, text: log(text),
+                    ui_log=ui_log, store=store).run()
+
+@timed("token_refresh")
 def refresh_token(tokens):
     if not tokens or "refresh_token" not in tokens or "client_id" not in tokens:
         return tokens
     data = {"grant_type": "refresh_token", "refresh_token": tokens["refresh_token"], "client_id": tokens["client_id"]}
-    r = requests.post("https://accounts.spotify.com/api/token", data=data, timeout=30)
+    r = http_session().post(f"{ACCOUNTS_BASE}/api/token", data=data, timeout=30)
     if r.status_code >= 400:
         try: j = r.json()
         except: j = {}
@@ -341,58 +1323,275 @@ def refresh_token(tokens):
             raise RuntimeError(f"Refresh failed: {err}")
         raise_for_status_with_body(r)
     j = r.json()
+    tokens = dict(tokens)
     tokens["access_token"] = j.get("access_token", tokens.get("access_token"))
     if "refresh_token" in j: tokens["refresh_token"] = j["refresh_token"]
     tokens["expires_in"] = j.get("expires_in", tokens.get("expires_in"))
     tokens["obtained_at"] = int(time.time())
-    token_store_save(tokens)
     return tokens
 
-def get_current_playback(access_token):
+# ------------------------ Spotify Web API -----------------------------
+
+# Über SPOTIFY_API_BASE lässt sich ein lokaler Stub statt api.spotify.com nutzen
+API_BASE = os.environ.get("SPOTIFY_API_BASE", "https://api.spotify.com/v1").rstrip("/")
+
+_http = None
+_http_lock = threading.Lock()
+
+def http_session():
+    # Eine gemeinsame Session → Keep-Alive/Connection-Pool statt neuem TLS-Handshake pro Poll
+    global _http
+    if _http is None:
+        with _http_lock:
+            if _http is None:
+                _http = requests.Session()
+                # mehrere Sessions pollen parallel → Pool größer als die 10 Verbindungen des Defaults
+                _http.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=32))
+    return _http
+
+@timed("spotify_poll")
+def get_current_playback(access_token, player=False):
+    # /me/player liefert zusätzlich Device, Volume, Shuffle/Repeat – nur abfragen, wenn ein Feld das braucht
     h = {"Authorization": f"Bearer {access_token}"}
-    r = requests.get("https://api.spotify.com/v1/me/player/currently-playing", headers=h, timeout=15)
+    path = "/me/player" if player else "/me/player/currently-playing"
+    r = http_session().get(f"{API_BASE}{path}", headers=h, timeout=15)
     if r.status_code == 204: return None
     if r.status_code == 200: return r.json()
     if r.status_code == 401: return "unauthorized"
     return None
 
+def get_playlist_name(access_token, playlist_id):
+    h = {"Authorization": f"Bearer {access_token}"}
+    r = http_session().get(f"{API_BASE}/playlists/{playlist_id}", headers=h, params={"fields": "name"}, timeout=15)
+    raise_for_status_with_body(r)
+    return (r.json() or {}).get("name", "")
+
+def get_queue(access_token):
+    h = {"Authorization": f"Bearer {access_token}"}
+    r = http_session().get(f"{API_BASE}/me/player/queue", headers=h, timeout=15)
+    raise_for_status_with_body(r)
+    return (r.json() or {}).get("queue") or []
+
+# ------------------------ Track cache ---------------------------------
+
+class TrackCache:
+    """LRU über gerenderte Titel/Artist-Fragmente, Key = (track id, Anzeige-Einstellungen)."""
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            v = self._data.get(key)
+            if v is not None:
+                self._data.move_to_end(key)
+            return v
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+def track_fragments(item, clamp_long, max_title, max_artist, ascii_only):
+    title = item.get("name","")
+    artist = ", ".join([a.get("name","") for a in item.get("artists",[])])
+    if clamp_long:
+        title, artist = shorten(title, max_title), shorten(artist, max_artist)
+    if ascii_only:
+        title, artist = clamp_ascii(title), clamp_ascii(artist)
+    return title, artist
+
 # ------------------------ Render helpers ------------------------------
 
-def ms_to_clock(ms):
-    s = int(ms // 1000); m = s // 60; s = s % 60
+@functools.lru_cache(maxsize=4096)
+def _secs_to_clock(s):
+    m = s // 60; s = s % 60
     return f"{m}:{s:02d}"
 
-def build_bar(position_ms, duration_ms, length_chars, style="ascii", ascii_only=True, inline_times=True, hud_transparent=False):
+def ms_to_clock(ms):
+    return _secs_to_clock(int(ms // 1000))
+
+# Teilzellen für "smooth" Bars: 1/8 … 7/8 Block
+BAR_EIGHTHS = "▏▎▍▌▋▊▉"
+
+@functools.lru_cache(maxsize=32)
+def bar_frames(style, length_chars, ascii_only, hud_transparent, smooth=False):
+    """Alle Bar-Zustände (ohne Zeiten) für einen Style, Index = gefüllte Schritte."""
+    if style == "hud" and not ascii_only:
+        fill = "▉"; empty = " " if hud_transparent else "░"; left = right = ""
+    elif style == "unicode" and not ascii_only:
+        fill = "█"; empty = "░"; left = right = "│"
+    else:
+        fill = "#"; empty = "-"; left = "["; right = "]"; smooth = False
+    frames = []
+    if not smooth:
+        for filled in range(length_chars + 1):
+            frames.append(left + fill * filled + empty * (length_chars - filled) + right)
+        return tuple(frames)
+    for step in range(length_chars * 8 + 1):
+        full, part = divmod(step, 8)
+        cells = fill * full
+        if part:
+            cells += BAR_EIGHTHS[part - 1]
+        frames.append(left + cells + empty * (length_chars - len(cells)) + right)
+    return tuple(frames)
+
+def build_bar(position_ms, duration_ms, length_chars, style="ascii", ascii_only=True, inline_times=True, hud_transparent=False, smooth=False, frames=None):
     if duration_ms <= 0:
         core = "-" * length_chars
         if style == "hud" and not ascii_only and inline_times:
             return f"0:00 {core} 0:00"
         return "[" + core + "]"
+    if style != "hud" or ascii_only:
+        hud_transparent = False
+    frames = frames or bar_frames(style, length_chars, ascii_only, hud_transparent, smooth)
     f = max(0.0, min(1.0, float(position_ms) / float(duration_ms)))
-    filled = int(round(length_chars * f))
-    if style == "hud":
-        if ascii_only:
-            bar = "#" * filled + "-" * (length_chars - filled)
-            return (f"{ms_to_clock(position_ms)} [{bar}] {ms_to_clock(duration_ms)}") if inline_times else "[" + bar + "]"
-        # Unicode HUD
-        fill = "▉"
-        empty = " " if hud_transparent else "░"
-        bar = fill * filled + empty * (length_chars - filled)
-        return (f"{ms_to_clock(position_ms)} {bar} {ms_to_clock(duration_ms)}") if inline_times else bar
-    if style == "unicode" and not ascii_only:
-        left = "│"; right = "│"; fill = "█"; empty = "░"
-        return left + fill * filled + empty * (length_chars - filled) + right
-    return "[" + "#" * filled + "-" * (length_chars - filled) + "]"
+    bar = frames[int(round((len(frames) - 1) * f))]
+    if style == "hud" and inline_times:
+        return f"{ms_to_clock(position_ms)} {bar} {ms_to_clock(duration_ms)}"
+    return bar
+
+# Transliteration für „Strip non-ASCII“: Tabelle (Zeichen, die NFKD nicht zerlegt, plus
+# Kyrillisch/Griechisch/Kana) + NFKD-Faltung; was dann noch nicht ASCII ist, fällt raus.
+def _translit_table():
+    t = {
+        "ß": "ss", "ẞ": "SS", "æ": "ae", "Æ": "AE", "œ": "oe", "Œ": "OE", "ø": "o", "Ø": "O",
+        "ð": "d", "Ð": "D", "þ": "th", "Þ": "Th", "ł": "l", "Ł": "L", "đ": "d", "Đ": "D",
+        "ı": "i", "ŋ": "ng", "Ŋ": "Ng", "ĸ": "q",
+        "‘": "'", "’": "'", "‚": "'", "‛": "'", "“": '"', "”": '"', "„": '"', "‟": '"',
+        "–": "-", "—": "-", "‐": "-", "‑": "-", "−": "-", "•": "*", "·": ".", "×": "x",
+        "«": "<<", "»": ">>", "‹": "<", "›": ">", "€": "EUR", "£": "GBP", "¥": "JPY",
+        "♪": "~", "♫": "~", "ー": "-", "・": " ", "、": ", ", "。": ". ", "「": '"', "」": '"',
+    }
+    cyr = ("а a б b в v г g д d е e ё yo ж zh з z и i й y к k л l м m н n о o п p р r с s т t "
+           "у u ф f х kh ц ts ч ch ш sh щ shch ъ _ ы y ь _ э e ю yu я ya і i ї yi є ye ґ g")
+    greek = ("α a β v γ g δ d ε e ζ z η i θ th ι i κ k λ l μ m ν n ξ x ο o π p ρ r σ s ς s τ t "
+             "υ y φ f χ ch ψ ps ω o")
+    for pairs in (cyr, greek):
+        it = iter(pairs.split())
+        for ch, lat in zip(it, it):
+            lat = "" if lat == "_" else lat
+            t[ch] = lat
+            if ch.upper() != ch: t[ch.upper()] = lat.capitalize()
+    kana = ("あ a い i う u え e お o か ka き ki く ku け ke こ ko さ sa し shi す su せ se そ so "
+            "た ta ち chi つ tsu て te と to な na に ni ぬ nu ね ne の no は ha ひ hi ふ fu へ he ほ ho "
+            "ま ma み mi む mu め me も mo や ya ゆ yu よ yo ら ra り ri る ru れ re ろ ro わ wa を wo ん n "
+            "が ga ぎ gi ぐ gu げ ge ご go ざ za じ ji ず zu ぜ ze ぞ zo だ da ぢ ji づ zu で de ど do "
+            "ば ba び bi ぶ bu べ be ぼ bo ぱ pa ぴ pi ぷ pu ぺ pe ぽ po ぁ a ぃ i ぅ u ぇ e ぉ o "
+            "ゃ ya ゅ yu ょ yo っ _ ゔ vu")
+    it = iter(kana.split())
+    for ch, lat in zip(it, it):
+        lat = "" if lat == "_" else lat
+        t[ch] = lat
+        t[chr(ord(ch) + 0x60)] = lat        # Katakana liegt 0x60 hinter Hiragana
+    return str.maketrans(t)
+
+_TRANSLIT = _translit_table()
+
+@functools.lru_cache(maxsize=4096)
+def transliterate(s):
+    """Beliebiger Text → lesbares ASCII (memoisiert, Titel/Artists wiederholen sich ständig)."""
+    if unidecode is not None:
+        return unidecode(s)
+    # Tabelle vor NFKD (vorkomponierte Kana wie „が“), danach nochmal für zerlegte Basiszeichen („ί“ → „ι“)
+    s = unicodedata.normalize("NFKD", s.translate(_TRANSLIT)).translate(_TRANSLIT)
+    return "".join(ch for ch in s if not unicodedata.combining(ch)).encode("ascii", "ignore").decode("ascii")
 
 def clamp_ascii(s):
-    try: s.encode("ascii"); return s
-    except: return s.encode("ascii", "ignore").decode("ascii")
-
-def trim_chatbox(s):
-    return s if len(s) <= MAX_MESSAGE_LEN else s[:MAX_MESSAGE_LEN-1] + "…"
+    return s if s.isascii() else transliterate(s)
+
+# ------------------------ Layout --------------------------------------
+
+# Breiten in Chatbox-Spalten (ASCII = 1). Breite Glyphen (CJK, Box/Block-Zeichen der Bars)
+# zählen doppelt, kombinierende Zeichen und Zero-Width-Joiner gar nicht.
+_GLYPH_WIDTH_OVERRIDES = {"\u200d": 0, "\u200b": 0, "\ufeff": 0, "…": 1}
+_GLYPH_WIDTH_RANGES = (
+    (0x2500, 0x259F, 2),    # Box drawing + Block elements (│ █ ▉ ░ ▏…▊)
+    (0xFE00, 0xFE0F, 0),    # Variation selectors
+    (0x1F3FB, 0x1F3FF, 0),  # Skin-tone modifier
+)
+
+@functools.lru_cache(maxsize=8192)
+def glyph_width(ch):
+    w = _GLYPH_WIDTH_OVERRIDES.get(ch)
+    if w is not None:
+        return w
+    cp = ord(ch)
+    for lo, hi, w in _GLYPH_WIDTH_RANGES:
+        if lo <= cp <= hi:
+            return w
+    if unicodedata.combining(ch) or unicodedata.category(ch) in ("Mn", "Me", "Cf"):
+        return 0
+    return 2 if unicodedata.east_asian_width(ch) in ("W", "F") else 1
+
+def _joins_previous(ch, prev):
+    if prev == "\u200d":
+        return True
+    cp = ord(ch)
+    if ch == "\u200d" or 0xFE00 <= cp <= 0xFE0F or 0x1F3FB <= cp <= 0x1F3FF:
+        return True
+    if 0x1F1E6 <= cp <= 0x1F1FF and prev and 0x1F1E6 <= ord(prev) <= 0x1F1FF:
+        return True
+    return bool(unicodedata.combining(ch)) or unicodedata.category(ch) in ("Mn", "Me")
+
+@functools.lru_cache(maxsize=2048)
+def graphemes(s):
+    out = []
+    prev = ""
+    for ch in s:
+        if out and _joins_previous(ch, prev):
+            out[-1] += ch
+            # Regional-Indicator-Paare (Flaggen) nur paarweise verbinden
+            if 0x1F1E6 <= ord(ch) <= 0x1F1FF:
+                prev = ""
+                continue
+        else:
+            out.append(ch)
+        prev = ch
+    return tuple(out)
+
+@functools.lru_cache(maxsize=4096)
+def text_width(s):
+    if s.isascii():
+        return len(s)
+    return sum(glyph_width(ch) for ch in s)
+
+@functools.lru_cache(maxsize=4096)
+def fit_width(s, columns, max_chars=0, ellipsis="…"):
+    # Cluster-sicher kürzen: Spaltenbudget (columns) und/oder harte Zeichengrenze (max_chars)
+    fits_cols = columns <= 0 or text_width(s) <= columns
+    fits_chars = max_chars <= 0 or len(s) <= max_chars
+    if fits_cols and fits_chars:
+        return s
+    budget_cols = columns - text_width(ellipsis) if columns > 0 else None
+    budget_chars = max_chars - len(ellipsis) if max_chars > 0 else None
+    out = []; used_cols = 0; used_chars = 0
+    for g in graphemes(s):
+        gw = text_width(g)
+        if budget_cols is not None and used_cols + gw > budget_cols:
+            break
+        if budget_chars is not None and used_chars + len(g) > budget_chars:
+            break
+        out.append(g); used_cols += gw; used_chars += len(g)
+    return "".join(out).rstrip() + ellipsis
+
+def trim_chatbox(s, columns=0):
+    return fit_width(s, columns, MAX_MESSAGE_LEN)
+
+def trim_each_line(s, columns=0):
+    return "\n".join([trim_chatbox(line, columns) for line in s.splitlines()]).strip()
 
-def trim_each_line(s):
-    return "\n".join([trim_chatbox(line) for line in s.splitlines()]).strip()
+def shorten(s, limit):
+    s = s or ""
+    if limit <= 1: return s
+    return fit_width(s, limit)
 
 def normalize_spaces_keep_newlines(s):
     return "\n".join(" ".join(line.split()) for line in s.splitlines())
@@ -469,6 +1668,22 @@ def read_specs():
     gpu = _gpu_from_nvidia_smi()
     return cpu, ram, gpu
 
+class SharedSpecs:
+    """read_specs für mehrere Renderer: höchstens einmal pro ttl (cpu_percent misst seit dem letzten Aufruf)."""
+    def __init__(self, reader=None, ttl=1.0):
+        self.reader = reader or read_specs
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self._value = (None, None, None)
+        self._at = -1e9
+
+    def __call__(self):
+        with self.lock:
+            now = time.monotonic()
+            if now - self._at >= self.ttl:
+                self._value = self.reader(); self._at = now
+            return self._value
+
 def fmt_specs(cpu, ram, gpu, show_cpu, show_ram, show_gpu, ram_in_gb=True, ascii_only=True):
     parts = []
     try:
@@ -491,12 +1706,2326 @@ def fmt_specs(cpu, ram, gpu, show_cpu, show_ram, show_gpu, ram_in_gb=True, ascii
     s = " | ".join(parts)
     return clamp_ascii(s) if ascii_only else s
 
-def shorten(s, limit):
-    s = s or ""
-    if limit <= 1 or len(s) <= limit: return s
-    return s[:max(1, limit-1)] + "…"
+# ------------------------ Chatbox slots -------------------------------
+
+# Jede Chatbox-Zeile ist ein Slot. High-Priority-Slots senden sofort bei Änderung,
+# Low-Priority-Slots (Bar/Zeit/Specs/Uhr) erst wenn ihr Mindestintervall abgelaufen ist.
+SLOT_HIGH = 0
+SLOT_LOW = 1
+
+CHATBOX_SLOTS = (
+    ("track", SLOT_HIGH),
+    ("rotation", SLOT_HIGH),
+    ("main", SLOT_LOW),
+    ("time", SLOT_LOW),
+    ("specs", SLOT_LOW),
+    ("clock", SLOT_LOW),
+)
+
+_UNSENT = object()
+
+class ChatboxSlots:
+    def __init__(self, intervals=None):
+        self.priority = dict(CHATBOX_SLOTS)
+        self.intervals = dict(intervals or {})
+        self.current = {}
+        self.sent = {}
+        self.sent_at = {}
+
+    def reset(self):
+        self.current.clear(); self.sent.clear(); self.sent_at.clear()
+
+    def update(self, name, value):
+        self.current[name] = value
+
+    def changed(self):
+        return [n for n, v in self.current.items() if self.sent.get(n, _UNSENT) != v]
+
+    def due(self, now):
+        for name in self.changed():
+            if self.priority.get(name, SLOT_HIGH) == SLOT_HIGH:
+                return True
+            if now - self.sent_at.get(name, float("-inf")) >= self.intervals.get(name, 0):
+                return True
+        return False
+
+    def mark_sent(self, now):
+        for name in self.changed():
+            self.sent[name] = self.current[name]
+            self.sent_at[name] = now
+
+# ------------------------ Display profiles ----------------------------
+
+# Keys, die ein Profil überschreiben darf (Rest kommt immer aus den Basis-Settings)
+PROFILE_KEYS = (
+    "template", "prefix", "prefix_text", "sep_title_artist",
+    "progress_style", "bar_length", "show_bar", "bar_smooth", "hud_transparent",
+    "show_title", "show_artist", "show_time", "time_mode", "time_on_second_line",
+    "ascii_only", "clamp_long", "max_title_len", "max_artist_len", "line_columns",
+    "rotation_enabled", "rotation_interval", "rotation_mode", "rotation_items",
+    "show_clock_line", "clock_24h", "clock_prefix",
+    "show_specs_line", "show_specs_cpu", "show_specs_ram", "show_specs_gpu", "ram_in_gb",
+    "afk_tag_enabled", "afk_tag_after", "afk_tag_text",
+)
+TEMPLATE_FIELDS = ("prefix", "title", "artist", "sep", "bar", "position", "duration", "elapsed", "remaining")
+_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+class CompiledTemplate:
+    """Template als Segmentliste: (True, feldname) oder (False, literal)."""
+    __slots__ = ("source", "segments", "fields", "extras", "stable", "sources")
+
+    def __init__(self, source, segments):
+        self.source = source
+        self.segments = segments
+        self.fields = frozenset(t for f, t in segments if f)
+        # Provider-Felder: nur die, die hier vorkommen, werden beim Rendern berechnet
+        self.extras = tuple(sorted(n for n in self.fields if n in FIELD_PROVIDERS))
+        self.stable = tuple(n for n in self.extras if FIELD_PROVIDERS[n].stable)
+        self.sources = frozenset(FIELD_PROVIDERS[n].source for n in self.extras) - {None}
+
+    def render(self, values):
+        return "".join(values.get(t, "") if f else t for f, t in self.segments)
+
+@functools.lru_cache(maxsize=256)
+def compile_template(tpl):
+    tpl = tpl.replace("{newline}", "\n")
+    segs = []; pos = 0
+    for m in _PLACEHOLDER.finditer(tpl):
+        if m.group(1) not in TEMPLATE_FIELDS and m.group(1) not in FIELD_PROVIDERS:
+            continue                                         # unbekannte Platzhalter bleiben Text
+        if m.start() > pos: segs.append((False, tpl[pos:m.start()]))
+        segs.append((True, m.group(1)))
+        pos = m.end()
+    if pos < len(tpl): segs.append((False, tpl[pos:]))
+    return CompiledTemplate(tpl, tuple(segs))
+
+class CompiledProfile:
+    """Effektive Settings eines Profils plus vorkompilierte Templates/Bar-Tabelle."""
+    __slots__ = ("name", "cfg", "template", "rotation", "bar", "sources")
+
+    def __init__(self, name, cfg):
+        self.name = name
+        self.cfg = cfg
+        self.template = compile_template(str(cfg.get("template", "")).strip() or APP_DEFAULTS["template"])
+        self.rotation = RotationSchedule(cfg.get("rotation_items") or [])
+        # Datenquellen, die dieses Profil braucht (z.B. /me/player für {device})
+        self.sources = self.template.sources.union(
+            *(e.template.sources for e in self.rotation.entries if e.template is not None))
+        self.bar = None
+        if cfg.get("show_bar"):
+            # Bar-Tabelle jetzt bauen, damit der erste Frame nach dem Umschalten nichts rechnet
+            style = cfg.get("progress_style", "hud"); ascii_only = bool(cfg.get("ascii_only"))
+            transparent = bool(cfg.get("hud_transparent")) and style == "hud" and not ascii_only
+            self.bar = bar_frames(style, cfg["bar_length"], ascii_only,
+                                  transparent, bool(cfg.get("bar_smooth")))
+
+PROFILE_BASE = "(base)"    # Anzeigename der Basis-Settings in GUI-Menüs
+
+def profile_names(cfg):
+    return [n for n in (cfg.get("profiles") or {}) if n]
+
+def profile_settings(cfg, name):
+    """Basis-Settings mit den Overrides von Profil `name` (leer = Basis)."""
+    over = ((cfg.get("profiles") or {}).get(name) or {}) if name else {}
+    eff = dict(cfg)
+    eff.update({k: v for k, v in over.items() if k in PROFILE_KEYS})
+    return types.MappingProxyType(eff)
+
+def compile_profiles(cfg):
+    out = {"": CompiledProfile("", cfg)}
+    for name in profile_names(cfg):
+        out[name] = CompiledProfile(name, profile_settings(cfg, name))
+    return out
+
+# ------------------------ Rotation schedule ---------------------------
+
+# Bedingungen für Rotator-Einträge: always | playing | paused | afk | active (= nicht AFK)
+ROTATION_WHEN = ("always", "playing", "paused", "afk", "active")
+ROTATION_MAX_WEIGHT = 10
+
+def parse_time_window(s):
+    """"HH:MM-HH:MM" → (Startminute, Endminute), darf über Mitternacht gehen. Leer/ungültig → None."""
+    try:
+        a, b = str(s or "").split("-")
+        def minute(x):
+            h, m = x.strip().split(":")
+            return (int(h) % 24) * 60 + int(m) % 60
+        w = (minute(a), minute(b))
+    except ValueError:
+        return None
+    return w if w[0] != w[1] else None
+
+class RotationEntry:
+    __slots__ = ("index", "template", "weight", "duration", "window", "when", "static")
+
+    def __init__(self, index, it):
+        text = str(it.get("text", "")).strip()
+        self.index = index
+        self.template = compile_template(text) if text else None
+        self.weight = it.get("weight", 1)
+        self.duration = it.get("duration", 0)     # 0 = rotation_interval
+        self.window = parse_time_window(it.get("window"))
+        self.when = it.get("when") if it.get("when") in ROTATION_WHEN else "always"
+        self.static = None      # fertiger Text, wenn das Template keine Platzhalter hat
+
+    def eligible(self, minute, playing, afk):
+        w = self.when
+        if (w == "playing" and not playing) or (w == "paused" and playing): return False
+        if (w == "afk" and not afk) or (w == "active" and afk): return False
+        if self.window is None: return True
+        a, b = self.window
+        return a <= minute < b if a < b else (minute >= a or minute < b)
+
+class RotationSchedule:
+    """Abspielfolgen je (Zeitfenster-Segment, playing, afk), einmalig gebaut – pro Tick nur ein Lookup."""
+    def __init__(self, items):
+        self.entries = tuple(RotationEntry(i, it or {}) for i, it in enumerate(items))
+        self.needs_afk = any(e.when in ("afk", "active") for e in self.entries)
+        bounds = {0}
+        for e in self.entries:
+            if e.window: bounds.update(e.window)
+        self.bounds = sorted(bounds)        # innerhalb eines Segments ändert sich kein Fenster
+        self.needs_clock = len(self.bounds) > 1
+        self._seqs = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def sequence(self, minute, playing, afk):
+        seg = bisect.bisect_right(self.bounds, minute) - 1 if self.needs_clock else 0
+        key = (seg, bool(playing), bool(afk))
+        seq = self._seqs.get(key)
+        if seq is None:
+            start = self.bounds[seg]
+            eligible = [e for e in self.entries if e.eligible(start, playing, afk)]
+            # Gewicht w → w Auftritte, gleichmäßig über die Runde verteilt
+            order = sorted(((k + 0.5) / e.weight, e.index, e) for e in eligible for k in range(e.weight))
+            seq = self._seqs[key] = tuple(o[2] for o in order)
+        return seq
+
+# ------------------------ Field providers -----------------------------
+
+# Zusatz-Platzhalter. Ein Provider läuft nur, wenn sein Feld im aktiven Template/Rotator vorkommt.
+# source: None = steckt schon im Poll, "player" = braucht /me/player statt currently-playing,
+#         "context" = Playlist-Name per Extra-Request (einmal pro Playlist).
+# stable: Wertwechsel wird sofort gesendet (wie ein Trackwechsel), sonst zählt er als Low-Priority.
+FIELD_PROVIDERS = {}
+
+class FieldProvider:
+    __slots__ = ("name", "fn", "source", "stable")
+
+    def __init__(self, name, fn, source=None, stable=False):
+        self.name = name; self.fn = fn; self.source = source; self.stable = stable
+
+def field_provider(name, source=None, stable=False):
+    def deco(fn):
+        FIELD_PROVIDERS[name] = FieldProvider(name, fn, source, stable)
+        return fn
+    return deco
+
+class BpmCache:
+    """Lokale BPM-Tabelle bpm.json ({track_id | "artist - title": bpm}), neu geladen wenn sich die Datei ändert."""
+    def __init__(self, path=None):
+        self.path = path
+        self.table = {}
+        self._stamp = None
+        self._checked = -1e9
+
+    def _reload(self):
+        path = self.path or os.path.join(_data_dir(), "bpm.json")
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.table = {}; self._stamp = None
+            return
+        if (st.st_mtime, st.st_size) == self._stamp: return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            self.table = {str(k).lower(): v for k, v in raw.items()}
+        except Exception:
+            self.table = {}
+        self._stamp = (st.st_mtime, st.st_size)
+
+    def lookup(self, item):
+        now = time.monotonic()
+        if now - self._checked > 10.0:
+            self._checked = now
+            self._reload()
+        if not self.table or not item: return None
+        bpm = self.table.get(str(item.get("id", "")).lower())
+        if bpm is None:
+            artists = ", ".join(a.get("name", "") for a in item.get("artists", []))
+            bpm = self.table.get(f"{artists} - {item.get('name', '')}".lower())
+        return bpm
+
+BPM_CACHE = BpmCache()
+
+@field_provider("album", stable=True)
+def _field_album(r, item, pb):
+    return ((item or {}).get("album") or {}).get("name", "")
+
+@field_provider("context", source="context", stable=True)
+def _field_context(r, item, pb):
+    ctx = pb.get("context") or {}
+    kind = ctx.get("type")
+    if kind == "playlist":
+        return r.context_names.get(ctx.get("uri", ""), "") or "Playlist"
+    if kind == "album":
+        return _field_album(r, item, pb)
+    if kind == "artist":
+        return ((item or {}).get("artists") or [{}])[0].get("name", "")
+    if kind == "collection":
+        return "Liked Songs"
+    return ""
+
+@field_provider("device", source="player", stable=True)
+def _field_device(r, item, pb):
+    return (pb.get("device") or {}).get("name", "")
+
+@field_provider("volume", source="player")
+def _field_volume(r, item, pb):
+    v = (pb.get("device") or {}).get("volume_percent")
+    return f"{v}%" if v is not None else ""
+
+@field_provider("shuffle", source="player", stable=True)
+def _field_shuffle(r, item, pb):
+    if not pb.get("shuffle_state"): return ""
+    return "shuffle" if r.cfg.get("ascii_only") else "🔀"
+
+@field_provider("repeat", source="player", stable=True)
+def _field_repeat(r, item, pb):
+    state = pb.get("repeat_state", "off")
+    if state == "track": return "repeat 1" if r.cfg.get("ascii_only") else "🔂"
+    if state == "context": return "repeat" if r.cfg.get("ascii_only") else "🔁"
+    return ""
+
+@field_provider("bpm", stable=True)
+def _field_bpm(r, item, pb):
+    bpm = BPM_CACHE.lookup(item)
+    try: return f"{float(bpm):.0f}" if bpm is not None else ""
+    except (TypeError, ValueError): return ""
+
+@field_provider("cpu")
+def _field_cpu(r, item, pb):
+    cpu = r.specs_values()[0]
+    return f"{cpu:.0f}%" if cpu is not None else ""
+
+@field_provider("ram")
+def _field_ram(r, item, pb):
+    ram = r.specs_values()[1]
+    return f"{ram['percent']:.0f}%" if ram else ""
+
+@field_provider("gpu")
+def _field_gpu(r, item, pb):
+    gpu = r.specs_values()[2]
+    return f"{gpu['util']:.0f}%" if gpu and gpu.get("util") is not None else "n/a"
+
+@field_provider("clock")
+def _field_clock(r, item, pb):
+    return r.now().strftime("%H:%M" if r.cfg.get("clock_24h") else "%I:%M %p")
+
+# ------------------------ Lyrics --------------------------------------
+
+_LRC_TIME = re.compile(r"\[(\d+):(\d+(?:[.:]\d+)?)\]")
+_LRC_WORD_TIME = re.compile(r"<\d+:\d+(?:[.:]\d+)?>")
+_LRC_OFFSET = re.compile(r"\[offset:\s*([+-]?\d+)\s*\]", re.I)
+_FILENAME_BAD = re.compile(r'[<>:"/\\|?*]')
+
+class Lyrics:
+    """Synchronisierte Zeilen, Zeitstempel sortiert → Lookup per bisect."""
+    __slots__ = ("times", "lines")
+
+    def __init__(self, pairs):
+        pairs.sort(key=lambda p: p[0])
+        self.times = [t for t, _ in pairs]
+        self.lines = [l for _, l in pairs]
+
+    def at(self, ms):
+        """(aktuelle Zeile, Zeitpunkt der nächsten Zeile in ms oder None)."""
+        i = bisect.bisect_right(self.times, ms)
+        line = self.lines[i - 1] if i > 0 else ""
+        return line, (self.times[i] if i < len(self.times) else None)
+
+def parse_lrc(text):
+    m = _LRC_OFFSET.search(text)
+    offset = int(m.group(1)) if m else 0      # positiver Offset = Zeilen erscheinen früher
+    pairs = []
+    for raw in text.splitlines():
+        stamps = list(_LRC_TIME.finditer(raw))
+        if not stamps: continue
+        line = _LRC_WORD_TIME.sub("", raw[stamps[-1].end():]).strip()
+        for st in stamps:
+            secs = int(st.group(1)) * 60 + float(st.group(2).replace(":", "."))
+            pairs.append((max(0, int(secs * 1000) - offset), line))
+    return Lyrics(pairs) if pairs else None
+
+class LyricsStore:
+    """.lrc-Dateien aus lyrics/ neben der Config: "<track_id>.lrc" oder "<Artist> - <Titel>.lrc"."""
+    def __init__(self, folder=None):
+        self.folder = folder
+        self.cache = TrackCache(64)     # Track-Key → Lyrics oder False (keine Datei)
+        self._index = {}                # kleingeschriebener Dateiname → Pfad
+        self._stamp = None
+        self._checked = -1e9
+
+    def _refresh_index(self):
+        folder = self.folder or os.path.join(_data_dir(), "lyrics")
+        try:
+            stamp = os.stat(folder).st_mtime
+        except OSError:
+            stamp = None
+        if stamp == self._stamp: return
+        self._stamp = stamp
+        self._index = {}
+        if stamp is not None:
+            for name in os.listdir(folder):
+                if name.lower().endswith(".lrc"):
+                    self._index[name.lower()] = os.path.join(folder, name)
+        self.cache.clear()              # neue/entfernte Dateien → auch "nicht gefunden" neu prüfen
+
+    def candidates(self, item):
+        title = item.get("name", "")
+        artists = [a.get("name", "") for a in item.get("artists", [])]
+        names = [item.get("id") or ""]
+        if artists:
+            names += [f"{', '.join(artists)} - {title}", f"{artists[0]} - {title}"]
+        return [_FILENAME_BAD.sub("", n).strip().lower() + ".lrc" for n in names if n]
+
+    def get(self, item):
+        now = time.monotonic()
+        if now - self._checked > 10.0:
+            self._checked = now
+            self._refresh_index()
+        key = item.get("id") or (item.get("name", ""), tuple(a.get("name", "") for a in item.get("artists", [])))
+        hit = self.cache.get(key)
+        if hit is not None:
+            return hit or None
+        lyr = None
+        for name in self.candidates(item):
+            path = self._index.get(name)
+            if not path: continue
+            try:
+                with open(path, "r", encoding="utf-8-sig") as f:
+                    lyr = parse_lrc(f.read())
+            except Exception:
+                lyr = None
+            if lyr is not None: break
+        self.cache.put(key, lyr if lyr is not None else False)
+        return lyr
+
+LYRICS = LyricsStore()
+
+@field_provider("lyric", stable=True)
+def _field_lyric(r, item, pb):
+    lyr = LYRICS.get(item) if item else None
+    if lyr is None:
+        r.lyric_next_ms = None
+        return ""
+    ms = r.progress_now() if r.progress_now else pb.get("progress_ms", 0)
+    line, r.lyric_next_ms = lyr.at(ms)
+    return line
+
+# ------------------------ History -------------------------------------
+
+# history.bin: Header (Magic + Erstellzeit als Datei-ID), danach Zeilen
+#   <H Länge> <d Unix-Zeit> <I Dauer ms> + 3× (<H Länge> UTF-8): Track-ID, Titel, Haupt-Artist
+# history.idx.json: Aggregate + bis zu welchem Byte sie reichen → Kaltstart liest nur den Rest.
+HISTORY_MAGIC = b"VSH1"
+_HIST_HEADER = struct.Struct("<4sd")
+_HIST_LEN = struct.Struct("<H")
+_HIST_ROW = struct.Struct("<dI")
+HISTORY_FIELD_MAX = 1024        # Bytes pro Textfeld
+HISTORY_DAYS_KEEP = 400         # Tageszähler im Index: ältere Tage fallen beim Snapshot raus
+
+class HistoryStore:
+    """Append-only Wiedergabe-Log mit inkrementellen Aggregaten (Session, Tage, Artists)."""
+    def __init__(self, folder=None, max_bytes=4 * 1024 * 1024, snapshot_every=20):
+        self.folder = folder or os.path.join(_data_dir(), "history")
+        self.path = os.path.join(self.folder, "history.bin")
+        self.index_path = os.path.join(self.folder, "history.idx.json")
+        self.max_bytes = max_bytes
+        self.snapshot_every = snapshot_every
+        self.lock = threading.Lock()
+        self.total = 0
+        self.days = {}                          # "YYYY-MM-DD" → Tracks
+        self.artists = collections.Counter()    # gesamt
+        self.session_tracks = 0
+        self.session_artists = collections.Counter()
+        self.top_artist = ""
+        self._file_id = 0.0
+        self._offset = 0
+        self._pending = 0
+        self._load()
+
+    @staticmethod
+    def _day(ts):
+        return time.strftime("%Y-%m-%d", time.localtime(ts))
+
+    def _new_file(self):
+        self._file_id = time.time()
+        with open(self.path, "wb") as f:
+            f.write(_HIST_HEADER.pack(HISTORY_MAGIC, self._file_id))
+        self._offset = _HIST_HEADER.size
+
+    def _load(self):
+        os.makedirs(self.folder, exist_ok=True)
+        try:
+            with open(self.path, "rb") as f:
+                magic, file_id = _HIST_HEADER.unpack(f.read(_HIST_HEADER.size))
+            if magic != HISTORY_MAGIC: raise ValueError("bad magic")
+        except (OSError, struct.error, ValueError):
+            self._new_file()
+            file_id = self._file_id
+        self._file_id = file_id
+        start = _HIST_HEADER.size
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                idx = json.load(f)
+            if idx.get("file_id") == file_id and idx.get("offset", 0) <= os.path.getsize(self.path):
+                self.total = int(idx.get("total", 0))
+                self.days = dict(idx.get("days") or {})
+                self.artists = collections.Counter(idx.get("artists") or {})
+                start = int(idx["offset"])
+        except (OSError, ValueError, KeyError):
+            pass
+        self._scan(start)
+
+    def _scan(self, start):
+        # nur der Teil hinter dem Snapshot; eine abgeschnittene letzte Zeile wird entfernt
+        with open(self.path, "r+b") as f:
+            f.seek(start)
+            data = f.read()
+            pos = 0
+            while pos + _HIST_LEN.size <= len(data):
+                (n,) = _HIST_LEN.unpack_from(data, pos)
+                if pos + _HIST_LEN.size + n > len(data): break
+                ts, _dur, _tid, _title, artist = self._decode(data, pos + _HIST_LEN.size)
+                self._count(ts, artist)
+                pos += _HIST_LEN.size + n
+            if pos < len(data):
+                f.truncate(start + pos)
+        self._offset = start + pos
+
+    @staticmethod
+    def _encode(ts, item):
+        artists = item.get("artists") or [{}]
+        fields = (item.get("id") or "", item.get("name", ""), artists[0].get("name", ""))
+        body = _HIST_ROW.pack(ts, int(item.get("duration_ms", 0)) & 0xFFFFFFFF)
+        for text in fields:
+            b = text.encode("utf-8")
+            if len(b) > HISTORY_FIELD_MAX:
+                # an einer Zeichengrenze kürzen, sonst landet ein halbes Zeichen dauerhaft als U+FFFD im Log
+                b = b[:HISTORY_FIELD_MAX].decode("utf-8", "ignore").encode("utf-8")
+            body += _HIST_LEN.pack(len(b)) + b
+        return _HIST_LEN.pack(len(body)) + body
+
+    @staticmethod
+    def _decode(data, pos):
+        ts, dur = _HIST_ROW.unpack_from(data, pos)
+        pos += _HIST_ROW.size
+        out = []
+        for _ in range(3):
+            (n,) = _HIST_LEN.unpack_from(data, pos); pos += _HIST_LEN.size
+            out.append(data[pos:pos + n].decode("utf-8", "replace")); pos += n
+        return (ts, dur, *out)
+
+    def _count(self, ts, artist):
+        self.total += 1
+        day = self._day(ts)
+        self.days[day] = self.days.get(day, 0) + 1
+        if artist:
+            self.artists[artist] += 1
+
+    def add(self, item, ts=None):
+        ts = time.time() if ts is None else ts
+        row = self._encode(ts, item)
+        artist = ((item.get("artists") or [{}])[0]).get("name", "")
+        with self.lock:
+            if self._offset + len(row) > self.max_bytes:
+                self._rotate()
+            with open(self.path, "ab") as f:
+                f.write(row)
+            self._offset += len(row)
+            self._count(ts, artist)
+            self.session_tracks += 1
+            if artist:
+                self.session_artists[artist] += 1
+                if artist == self.top_artist or self.session_artists[artist] > self.session_artists[self.top_artist]:
+                    self.top_artist = artist
+            self._pending += 1
+            if self._pending >= self.snapshot_every:
+                self._snapshot()
+
+    def _rotate(self):
+        stem = os.path.join(self.folder, time.strftime("history-%Y%m%d-%H%M%S"))
+        archive, n = stem + ".bin", 1
+        while os.path.exists(archive):
+            archive = f"{stem}-{n}.bin"; n += 1
+        try:
+            os.replace(self.path, archive)
+        except OSError:
+            pass
+        self._new_file()
+        self._snapshot()       # Aggregate der archivierten Datei bleiben im Index
+
+    def _prune_days(self, now=None):
+        cutoff = self._day((now if now is not None else time.time()) - HISTORY_DAYS_KEEP * 86400)
+        if self.days and min(self.days) < cutoff:
+            self.days = {d: n for d, n in self.days.items() if d >= cutoff}
+
+    def _snapshot(self):
+        self._prune_days()
+        idx = {"file_id": self._file_id, "offset": self._offset, "total": self.total,
+               "days": self.days, "artists": dict(self.artists)}
+        tmp = self.index_path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(idx, f)
+            os.replace(tmp, self.index_path)
+            self._pending = 0
+        except OSError:
+            pass
+
+    def close(self):
+        with self.lock:
+            if self._pending: self._snapshot()
+
+    def today(self, now=None):
+        return self.days.get(self._day(now if now is not None else time.time()), 0)
+
+@field_provider("top_artist", stable=True)
+def _field_top_artist(r, item, pb):
+    return r.history.top_artist if r.history else ""
+
+@field_provider("session_tracks", stable=True)
+def _field_session_tracks(r, item, pb):
+    return str(r.history.session_tracks) if r.history else ""
+
+@field_provider("today_tracks", stable=True)
+def _field_today_tracks(r, item, pb):
+    return str(r.history.today(r.now().timestamp())) if r.history else ""
+
+@field_provider("total_tracks", stable=True)
+def _field_total_tracks(r, item, pb):
+    return str(r.history.total) if r.history else ""
+
+# ------------------------ Renderer ------------------------------------
+
+class RenderState:
+    """Vorkompilierte Profile + aktives Profil. Unveränderlich; der Renderer tauscht sie als Ganzes."""
+    __slots__ = ("profiles", "profile", "cfg")
+
+    def __init__(self, profiles, profile):
+        self.profiles = profiles
+        self.profile = profile
+        self.cfg = profile.cfg
+
+    @classmethod
+    def compile(cls, cfg, active=None):
+        # active: Profil, das aktiv bleiben soll (falls es noch existiert), sonst cfg["active_profile"]
+        profiles = compile_profiles(cfg)
+        profile = profiles.get(active) if active is not None else None
+        return cls(profiles, profile or profiles.get(cfg.get("active_profile") or "") or profiles[""])
+
+    def with_profile(self, name):
+        p = self.profiles.get(name or "")
+        return None if p is None else RenderState(self.profiles, p)
+
+class Renderer:
+    """Tk-freie Render-Pipeline: baut die Chatbox-Zeilen aus einem Settings-Dict."""
+    def __init__(self, cfg, track_cache=None, specs_reader=None, idle_reader=None, now=None, clock=time.monotonic):
+        self.set_config(cfg)
+        self.clock = clock
+        self.track_cache = track_cache or TrackCache()
+        self.specs_reader = specs_reader or read_specs
+        self.idle_reader = idle_reader or get_idle_seconds
+        self.now = now or datetime.datetime.now
+        self.current_rot_text = ""
+        self._last_specs = ("", 0.0)
+        self._specs_values = ((None, None, None), -1e9)
+        self.playback = {}          # letzter Poll (für Provider-Felder wie {device})
+        self.context_names = {}     # Playlist-URI → Name
+        self.stable_values = ()     # Werte der stable-Felder im Haupt-Template
+        self.progress_now = None    # optional: interpolierte Position (ms) für {lyric}
+        self.lyric_next_ms = None   # nächster Lyrics-Zeitstempel, gesetzt vom {lyric}-Provider
+        self.history = None         # HistoryStore für {top_artist}, {session_tracks}, ...
+
+    # Profile/aktives Profil/Settings kommen immer aus demselben RenderState → ein Render sieht nie
+    # ein neues Profil mit alten Settings
+    @property
+    def profiles(self):
+        return self.state.profiles
+
+    @property
+    def profile(self):
+        return self.state.profile
+
+    @property
+    def cfg(self):
+        return self.state.cfg
+
+    def set_config(self, cfg, active=None):
+        self.install(RenderState.compile(validate_config(cfg), active))
+
+    def install(self, state):
+        self.state = state
+        self.lyric_next_ms = None
+
+    def switch_profile(self, name):
+        """Aktives Profil tauschen (nur Pointer, alles ist vorkompiliert)."""
+        state = self.state.with_profile(name)
+        if state is None: return False
+        self.install(state)
+        return True
+
+    def needs_source(self, source):
+        return source in self.profile.sources
+
+    def line_cols(self):
+        return self.cfg["line_columns"]
+
+    def extra_fields(self, tpl, item, values):
+        pb = self.playback or {}
+        for name in tpl.extras:
+            try:
+                values[name] = FIELD_PROVIDERS[name].fn(self, item, pb)
+            except Exception:
+                values[name] = ""
+        if tpl is self.profile.template:
+            self.stable_values = tuple(values[n] for n in tpl.stable)
+        return values
+
+    def fragment_key(self):
+        c = self.cfg
+        return (
+            bool(c["clamp_long"]),
+            c["max_title_len"],
+            c["max_artist_len"],
+            bool(c["ascii_only"])
+        )
+
+    def track_fragments(self, item, display=None):
+        display = display or self.fragment_key()
+        tid = item.get("id")
+        if not tid:
+            return track_fragments(item, *display)
+        key = (tid, display)
+        frag = self.track_cache.get(key)
+        if frag is None:
+            frag = track_fragments(item, *display)
+            self.track_cache.put(key, frag)
+        return frag
+
+    @timed("render")
+    def render_spotify_lines(self, item, progress_ms, duration_ms, template=None):
+        c = self.cfg
+        tpl = template if template is not None else self.profile.template
+        prefix_text = (c["prefix_text"] if c["prefix"] else "").strip()
+        sep = c["sep_title_artist"]
+        ascii_only = bool(c["ascii_only"])
+        cols = self.line_cols()
+        if item is None:
+            values = {"prefix": prefix_text, "sep": sep}
+            if tpl.extras: self.extra_fields(tpl, None, values)
+            main = tpl.render(values)
+            main = normalize_spaces_keep_newlines(main)
+            main = clamp_ascii(main) if ascii_only else main
+            return trim_each_line(main, cols), ""
+        title, artist = self.track_fragments(item)
+        ps = c["progress_style"]
+        show_title = bool(c["show_title"]); show_artist = bool(c["show_artist"])
+        show_time = bool(c["show_time"]); second_line = bool(c["time_on_second_line"])
+        time_mode = c["time_mode"]
+        inline_times_requested = (ps == "hud") and show_time
+        if c["show_bar"] and "bar" in tpl.fields:
+            bar = build_bar(
+                progress_ms, duration_ms,
+                c["bar_length"],
+                ps, ascii_only,
+                inline_times=inline_times_requested,
+                hud_transparent=bool(c["hud_transparent"]),
+                smooth=bool(c["bar_smooth"]),
+                frames=self.profile.bar
+            )
+        else:
+            bar = ""
+        position = ms_to_clock(progress_ms); duration = ms_to_clock(duration_ms)
+        elapsed = position; remaining = ms_to_clock(max(0, duration_ms - progress_ms))
+        values = {
+            "prefix": prefix_text,
+            "title": title if show_title else "",
+            "artist": artist if show_artist else "",
+            "sep": sep if (show_title and show_artist) else "",
+            "bar": bar,
+        }
+        if show_time and not second_line and not inline_times_requested:
+            values["position"] = position; values["duration"] = duration
+            values["elapsed"] = elapsed if time_mode in ("elapsed","both") else ""
+            values["remaining"] = ("-" + remaining) if time_mode in ("remaining","both") else ""
+        if tpl.extras: self.extra_fields(tpl, item, values)
+        main = tpl.render(values)
+        main = normalize_spaces_keep_newlines(main)
+        main = clamp_ascii(main) if ascii_only else main
+        main = trim_each_line(main, cols)
+        time_line = ""
+        if show_time and second_line and not inline_times_requested:
+            if time_mode == "elapsed":
+                time_line = elapsed
+            elif time_mode == "remaining":
+                time_line = "-" + remaining
+            else:
+                time_line = f"{elapsed} / {duration}"
+            time_line = clamp_ascii(time_line) if ascii_only else time_line
+            time_line = trim_chatbox(time_line, cols)
+        return main, time_line
+
+    def render_rotation_item(self, txt, item, progress_ms, duration_ms):
+        if isinstance(txt, RotationEntry):
+            e = txt
+            if e.template is not None and not e.template.fields:
+                if e.static is None:
+                    e.static = self.render_spotify_lines(None, 0, 0, template=e.template)[0]
+                return e.static
+            txt = e.template
+        elif not isinstance(txt, CompiledTemplate):
+            t = (txt or "").strip()
+            txt = compile_template(t) if t else None
+        if txt is None: return ""
+        m, _ = self.render_spotify_lines(item, progress_ms, duration_ms, template=txt)
+        return m
+
+    def clock_line(self):
+        c = self.cfg
+        if not c["show_clock_line"]: return ""
+        now = self.now()
+        fmt = "%H:%M:%S" if c["clock_24h"] else "%I:%M:%S %p"
+        prefix = (c["clock_prefix"] or "").strip()
+        s = f"{prefix} {now.strftime(fmt)}".strip() if prefix else now.strftime(fmt)
+        s = clamp_ascii(s) if c["ascii_only"] else s
+        return trim_chatbox(s, self.line_cols())
+
+    @timed("specs")
+    def specs_line(self):
+        c = self.cfg
+        if not c["show_specs_line"]:
+            return ""
+        now = self.clock()
+        cached, ts = self._last_specs
+        if now - ts < 1.0 and cached:
+            return cached
+        cpu, ram, gpu = self.specs_values()
+        line = fmt_specs(cpu, ram, gpu,
+                         c["show_specs_cpu"], c["show_specs_ram"], c["show_specs_gpu"],
+                         c["ram_in_gb"], c["ascii_only"])
+        line = trim_chatbox(line, self.line_cols())
+        self._last_specs = (line, now)
+        return line
+
+    def specs_values(self):
+        # von Specs-Zeile und {cpu}/{ram}/{gpu} gemeinsam genutzt, max. 1× pro Sekunde gelesen
+        now = self.clock()
+        vals, ts = self._specs_values
+        if now - ts >= 1.0:
+            vals = self.specs_reader()
+            self._specs_values = (vals, now)
+        return vals
+
+    def is_afk(self):
+        try:
+            return self.idle_reader() >= self.cfg["afk_tag_after"]
+        except Exception:
+            return False
+
+    def afk_tag_if_needed(self, text):
+        c = self.cfg
+        if not c["afk_tag_enabled"]:
+            return text
+        if self.is_afk():
+            tag = str(c["afk_tag_text"]).strip() or "[AFK]"
+            candidate = (text + " " + tag).strip()
+            return trim_chatbox(candidate, self.line_cols())
+        return text
+
+    def rotation_sequence(self, playing):
+        sched = self.profile.rotation
+        minute = 0
+        if sched.needs_clock:
+            n = self.now(); minute = n.hour * 60 + n.minute
+        return sched.sequence(minute, playing, sched.needs_afk and self.is_afk())
+
+    def frame_parts(self, spotify_main, spotify_time_line):
+        c = self.cfg
+        base_line = self.afk_tag_if_needed(spotify_main)
+        return {
+            "rotation": self.current_rot_text if c["rotation_enabled"] else "",
+            "main": base_line,
+            "afk": base_line != spotify_main,
+            "time": spotify_time_line if c["time_on_second_line"] else "",
+            "specs": self.specs_line(),
+            "clock": self.clock_line()
+        }
+
+    def compose_parts(self, parts):
+        rot_mode = self.cfg["rotation_mode"]
+        rot_text = parts["rotation"]
+        base_line = parts["main"]
+        txts = []
+
+        if rot_text:
+            if rot_mode == "standalone":
+                txts.append(rot_text)
+            elif rot_mode == "prepend":
+                line = f"{rot_text} {base_line}".strip()
+                txts.append(trim_chatbox(line, self.line_cols()))
+            elif rot_mode == "append":
+                line = f"{base_line} {rot_text}".strip()
+                txts.append(trim_chatbox(line, self.line_cols()))
+            else:
+                txts.append(rot_text)
+                txts.append(base_line)
+        else:
+            txts.append(base_line)
+
+        for key in ("time", "specs", "clock"):
+            if parts[key]:
+                txts.append(parts[key])
+        return "\n".join([t for t in txts if t]).strip()
+
+    @timed("compose")
+    def compose_full(self, spotify_main, spotify_time_line):
+        return self.compose_parts(self.frame_parts(spotify_main, spotify_time_line))
+
+# ------------------------ Record / Replay -----------------------------
+
+# Aufnahme: eine JSON-Zeile pro Event ({"t": s seit Start, "k": hdr|pb|step|osc|specs, ...}).
+# pb/step tragen die Uhrzeit, mit der der Updater gerechnet hat (µs), damit das Replay dieselben
+# Deadlines trifft wie der Live-Loop.
+class Recorder:
+    def __init__(self, path=None, clock=time.monotonic):
+        if path is None:
+            d = os.path.join(_data_dir(), "recordings")
+            os.makedirs(d, exist_ok=True)
+            path = os.path.join(d, time.strftime("rec-%Y%m%d-%H%M%S.jsonl"))
+        self.path = path
+        self.clock = clock
+        self.t0 = clock()
+        self._f = open(path, "w", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, kind, at=None, **fields):
+        rec = {"t": round((self.clock() if at is None else at) - self.t0, 6), "k": kind}
+        rec.update(fields)
+        line = json.dumps(rec, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            if self._f is not None:
+                self._f.write(line + "\n")
+
+    def header(self, cfg):
+        snap = thaw(cfg); snap.pop("client_id", None); snap.pop("_validated", None)
+        self.write("hdr", w=time.time(), cfg=snap)
+
+    def close(self):
+        with self._lock:
+            if self._f is not None:
+                self._f.close(); self._f = None
+
+class RecordingOSC:
+    def __init__(self, inner, recorder):
+        self.inner = inner
+        self.recorder = recorder
+
+    def send_message(self, address, value):
+        self.inner.send_message(address, value)
+        self.recorder.write("osc", a=address, v=value)
+
+class CaptureOSC:
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, address, value):
+        self.sent.append((address, value))
+
+class ReplayClock:
+    def __init__(self, t=0.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+def load_recording(path):
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                out.append(json.loads(line))
+    return out
+
+class ReplaySource:
+    """
+    Spielt aufgezeichnete Polls und Steps zu ihrer Aufnahmezeit ab. Ältere Aufnahmen ohne
+    step-Records: ein Step pro Poll.
+    """
+    def __init__(self, records, clock, speed=1.0):
+        self.polls = [r for r in records if r.get("k") == "pb"]
+        self.stepped = any(r.get("k") == "step" for r in records)
+        self.events = [r for r in records if r.get("k") in ("pb", "step")] if self.stepped else self.polls
+        self.specs_queue = collections.deque(r.get("d") for r in records if r.get("k") == "specs")
+        self.clock = clock
+        self.speed = speed
+        self.idx = 0
+        self._last_specs = (None, None, None)
+
+    def exhausted(self):
+        return self.idx >= len(self.events)
+
+    def next_event(self):
+        rec = self.events[self.idx]
+        if self.idx and self.speed > 0:
+            time.sleep(max(0.0, rec["t"] - self.events[self.idx - 1]["t"]) / self.speed)
+        self.idx += 1
+        self.clock.t = rec["t"]
+        return rec
+
+    def playback(self):
+        return self.next_event().get("d")
+
+    def specs(self):
+        if self.specs_queue:
+            v = self.specs_queue.popleft()
+            self._last_specs = tuple(v) if v else (None, None, None)
+        return self._last_specs
+
+def replay(path, speed=1.0, check=False, log=print):
+    records = load_recording(path)
+    hdr = next((r for r in records if r.get("k") == "hdr"), {})
+    cfg = dict(APP_DEFAULTS); cfg.update(hdr.get("cfg") or {})
+    cfg["prefetch_queue"] = False
+    w0 = float(hdr.get("w", time.time()))
+    vclock = ReplayClock()
+    source = ReplaySource(records, vclock, speed)
+    sink = CaptureOSC()
+    renderer = Renderer(cfg, specs_reader=source.specs, idle_reader=lambda: 0.0,
+                        now=lambda: datetime.datetime.fromtimestamp(w0 + vclock.t), clock=vclock)
+    u = Updater(cfg, {}, renderer=renderer, log=log, clock=vclock, sleep=lambda s: None, osc=sink)
+    u.source = source
+    u.running = True
+    u.reset_state()
+    t0 = time.perf_counter()
+    u.run()
+    wall = time.perf_counter() - t0
+
+    expected = [r["v"][0] for r in records if r.get("k") == "osc" and r.get("a") == CHATBOX_INPUT]
+    got = [v[0] for a, v in sink.sent if a == CHATBOX_INPUT]
+    log(f"Replayed {len(source.polls)} polls in {wall:.2f}s → {len(got)} chatbox messages (recorded: {len(expected)})")
+    for line in u.metrics.summary_lines():
+        log("  " + line)
+    if not check:
+        return 0
+    mismatches = [(i, e, g) for i, (e, g) in enumerate(zip(expected, got)) if e != g]
+    for i, e, g in mismatches[:10]:
+        log(f"Mismatch #{i}: expected {e!r} got {g!r}")
+    if mismatches or len(expected) != len(got):
+        log("Replay check FAILED")
+        return 1
+    log("Replay check OK")
+    return 0
+
+# ------------------------ OSC input -----------------------------------
+
+# show/hide folgen dem Parameterwert, alle anderen Aktionen feuern auf der steigenden Flanke
+OSC_FOLLOW_ACTIONS = ("show", "hide")
+
+class OSCListener:
+    """Empfängt Avatar-Parameter von VRChat und reicht nur Wertwechsel gemappter Adressen weiter."""
+    def __init__(self, port, actions, on_action, host="127.0.0.1"):
+        self.host = host
+        self.port = port
+        self.actions = dict(actions or {})
+        self.on_action = on_action
+        self.server = None
+        self._last = {}
+
+    def start(self):
+        d = Dispatcher()
+        for address in self.actions:
+            d.map(address, self._handle)
+        d.set_default_handler(lambda *_args: None)   # restlicher Parameter-Stream wird verworfen
+        self.server = BlockingOSCUDPServer((self.host, self.port), d)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        server, self.server = self.server, None
+        if server is not None:
+            try:
+                server.shutdown(); server.server_close()
+            except Exception:
+                pass
+
+    def _handle(self, address, *args):
+        on = bool(args[0]) if args else True
+        if self._last.get(address) == on:
+            return
+        self._last[address] = on
+        action = self.actions.get(address)
+        if action and (on or action in OSC_FOLLOW_ACTIONS):
+            self.on_action(action, on)
+
+# ------------------------ Avatar parameters ---------------------------
+
+TRACK_PULSE_SECONDS = 0.5
+
+class ParamPublisher:
+    """Sendet Progress/Playing/Track-Change als Avatar-Parameter – nur wenn sich der quantisierte Wert ändert."""
+    def __init__(self, addresses, steps=100):
+        self.addresses = dict(addresses or {})
+        self.steps = max(1, int(steps))
+        self._sent = {}
+        self._track_id = None
+        self._pulse_until = 0.0
+
+    def reset(self):
+        self._sent.clear(); self._track_id = None; self._pulse_until = 0.0
+
+    def _send(self, osc, key, value):
+        addr = self.addresses.get(key)
+        if not addr or self._sent.get(key) == value:
+            return 0
+        osc.send_message(addr, value)
+        self._sent[key] = value
+        return 1
+
+    def publish(self, osc, now, progress, playing, track_id):
+        sent = 0
+        q = round(max(0.0, min(1.0, progress)) * self.steps) / self.steps
+        sent += self._send(osc, "progress", float(q))
+        sent += self._send(osc, "playing", bool(playing))
+        if track_id != self._track_id:
+            if self._track_id is not None and track_id:
+                self._pulse_until = now + TRACK_PULSE_SECONDS
+            self._track_id = track_id
+        sent += self._send(osc, "track_change", now < self._pulse_until)
+        return sent
+
+# ------------------------ Control API ---------------------------------
+
+# Lokale HTTP/WebSocket-Schnittstelle für Stream-Tools. Der Worker legt nur den neuen Frame in den
+# FrameHub (Lock + notify); jeder Client wartet in seinem eigenen Server-Thread auf die nächste Nummer.
+
+CONTROL_COMMANDS = ("force_send", "show", "hide", "toggle_hide", "next_rotation", "next_profile", "pause", "resume")
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+class FrameHub:
+    """Letzter Frame + Sequenznummer; Clients warten per Condition auf die nächste Änderung."""
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.seq = 0
+        self.frame = {}
+        self._msg = (0, b"")
+
+    def publish(self, frame):
+        with self.cond:
+            self.seq += 1
+            self.frame = frame
+            self.cond.notify_all()
+
+    def current(self):
+        with self.cond:
+            return self.seq, self.frame
+
+    def wait(self, seq, timeout=None):
+        """(seq, frame), sobald es etwas Neueres als seq gibt – sonst nach timeout der aktuelle Stand."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq != seq, timeout)
+            return self.seq, self.frame
+
+    def encoded(self):
+        # JSON einmal pro Frame, egal wie viele Clients zuhören
+        with self.cond:
+            if self._msg[0] != self.seq:
+                body = json.dumps({"seq": self.seq, "frame": self.frame}, ensure_ascii=False)
+                self._msg = (self.seq, body.encode("utf-8"))
+            return self._msg
+
+def ws_accept_key(key):
+    return base64.b64encode(hashlib.sha1((key + WS_GUID).encode("ascii")).digest()).decode("ascii")
+
+def ws_frame(payload, opcode=0x1):
+    # Server → Client: unmaskiert, ein Fragment
+    n = len(payload)
+    if n < 126: head = struct.pack("!BB", 0x80 | opcode, n)
+    elif n < 65536: head = struct.pack("!BBH", 0x80 | opcode, 126, n)
+    else: head = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+    return head + payload
+
+WS_MAX_CLIENT_FRAME = 65536
+
+def ws_read_frame(sock):
+    """Client → Server: ein (maskiertes) Frame vom Socket → (opcode, payload); None bei EOF."""
+    def exact(n):
+        buf = b""
+        while len(buf) < n:
+            chunk = sock.recv(n - len(buf))
+            if not chunk: raise EOFError
+            buf += chunk
+        return buf
+    try:
+        b0, b1 = exact(2)
+        n = b1 & 0x7F
+        if n == 126: n = struct.unpack("!H", exact(2))[0]
+        elif n == 127: n = struct.unpack("!Q", exact(8))[0]
+        if n > WS_MAX_CLIENT_FRAME:
+            return 0x8, struct.pack("!H", 1009)      # zu groß → wie ein Close (Message Too Big) behandeln
+        mask = exact(4) if b1 & 0x80 else b""
+        data = exact(n)
+    except EOFError:
+        return None
+    if mask:
+        data = bytes(b ^ mask[i & 3] for i, b in enumerate(data))
+    return b0 & 0x0F, data
+
+def is_local_host(host):
+    # Host-Header prüfen (DNS-Rebinding): nur localhost-Namen annehmen
+    h = (host or "").strip().lower()
+    h = h[:h.find("]") + 1] if h.startswith("[") else h.split(":")[0]
+    return h in ("127.0.0.1", "localhost", "[::1]")
+
+def public_config(cfg):
+    data = thaw(cfg)
+    for k in ("client_id", "control_token", "_validated"):
+        data.pop(k, None)
+    return data
+
+class ControlServer:
+    """
+    GET /status /frame /metrics /metrics.json /config, POST /command {"command": ..., "value": ...},
+    WebSocket /ws (Push bei jedem neuen Frame). Nur 127.0.0.1; Befehle landen in Updater.request_action.
+    """
+    PING_INTERVAL = 20.0
+    WS_POLL = 0.25          # so schnell werden Close/Ping vom Client beantwortet
+    MAX_BODY = 64 * 1024
+
+    def __init__(self, updater, port, host="127.0.0.1", token="", log=None, metrics=None):
+        self.updater = updater
+        self.metrics = metrics or updater.metrics
+        self.port = port
+        self.host = host
+        self.token = token or ""
+        self.log = log or (lambda s: None)
+        self.routes = {}        # zusätzliche GET-Routen: Pfad → fn(handler, query)
+        self.server = None
+        self.running = False
+
+    def start(self):
+        self.server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self.server.daemon_threads = True
+        self.running = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        server, self.server = self.server, None
+        if server is not None:
+            server.shutdown(); server.server_close()
+
+    def command(self, cmd, value=True):
+        if cmd == "pause":
+            self.updater.request_action("hide", True)
+        elif cmd == "resume":
+            self.updater.request_action("hide", False)
+        elif cmd in CONTROL_COMMANDS or cmd.startswith("profile:"):
+            self.updater.request_action(cmd, value)
+        else:
+            return False
+        self.metrics.inc("control_commands")
+        return True
+
+    def serve_ws(self, h):
+        key = h.headers.get("Sec-WebSocket-Key")
+        if not key:
+            return h.reply(400, {"error": "missing Sec-WebSocket-Key"})
+        h.send_response(101)
+        h.send_header("Upgrade", "websocket")
+        h.send_header("Connection", "Upgrade")
+        h.send_header("Sec-WebSocket-Accept", ws_accept_key(key))
+        h.end_headers()
+        h.close_connection = True
+        sock = h.connection
+        sock.settimeout(self.PING_INTERVAL)     # halbe Frames vom Client blockieren nicht ewig
+        hub = self.updater.hub
+        seq = -1
+        last_ping = time.monotonic()
+        try:
+            while self.running:
+                new, _frame = hub.wait(seq, self.WS_POLL)
+                if new != seq:
+                    seq, msg = hub.encoded()
+                    h.wfile.write(ws_frame(msg))
+                if not self._ws_drain(h, sock):
+                    break
+                now = time.monotonic()
+                if now - last_ping >= self.PING_INTERVAL:
+                    h.wfile.write(ws_frame(b"", 0x9))     # Ping: halb offene Verbindungen fallen hier auf
+                    last_ping = now
+        except OSError:
+            pass
+
+    def _ws_drain(self, h, sock):
+        """Alle anstehenden Client-Frames lesen; False, wenn die Verbindung zu ist."""
+        while select.select([sock], [], [], 0)[0]:
+            fr = ws_read_frame(sock)
+            if fr is None:
+                return False                            # Client weg
+            op, data = fr
+            if op == 0x8:
+                h.wfile.write(ws_frame(data[:2], 0x8))  # Close zurückspiegeln, dann Schluss
+                return False
+            if op == 0x9:
+                h.wfile.write(ws_frame(data, 0xA))
+            # Pong und Text/Binary vom Client: gelesen und ignoriert
+        return True
 
-class App(ctk.CTk):
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, fmt, *args):
+                pass
+
+            def reply(self, code, body, ctype="application/json"):
+                if not isinstance(body, bytes):
+                    body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _request(self):
+                url = urllib.parse.urlparse(self.path)
+                query = urllib.parse.parse_qs(url.query, keep_blank_values=True)
+                if not is_local_host(self.headers.get("Host")):
+                    self.reply(403, {"error": "forbidden host"}); return None, None
+                if api.token:
+                    auth = self.headers.get("Authorization", "")
+                    given = auth[7:] if auth.startswith("Bearer ") else (query.get("token") or [""])[0]
+                    if not secrets.compare_digest(given, api.token):
+                        self.reply(401, {"error": "bad token"}); return None, None
+                return url.path, query
+
+            def do_GET(self):
+                path, query = self._request()
+                if path is None: return
+                u = api.updater
+                if path == "/ws" and self.headers.get("Upgrade", "").lower() == "websocket":
+                    api.serve_ws(self)
+                elif path == "/status":
+                    self.reply(200, u.status())
+                elif path == "/frame":
+                    seq, frame = u.hub.current()
+                    if "text" in query:
+                        self.reply(200, frame.get("text", "").encode("utf-8"), "text/plain; charset=utf-8")
+                    else:
+                        self.reply(200, {"seq": seq, "frame": frame})
+                elif path == "/metrics":
+                    self.reply(200, api.metrics.prometheus().encode("utf-8"), "text/plain; version=0.0.4")
+                elif path == "/metrics.json":
+                    self.reply(200, api.metrics.snapshot())
+                elif path == "/config":
+                    self.reply(200, public_config(u.cfg))
+                elif path in api.routes:
+                    api.routes[path](self, query)
+                else:
+                    self.reply(404, {"error": "not found"})
+
+            def do_POST(self):
+                path, _query = self._request()
+                if path is None: return
+                if path != "/command":
+                    return self.reply(404, {"error": "not found"})
+                # Nur JSON: Browser können das cross-origin nicht ohne (unbeantworteten) Preflight senden
+                if not self.headers.get("Content-Type", "").startswith("application/json"):
+                    self.close_connection = True
+                    return self.reply(415, {"error": "expected application/json"})
+                try:
+                    n = int(self.headers.get("Content-Length") or 0)
+                    if n > api.MAX_BODY: raise ValueError("body too large")
+                    req = json.loads(self.rfile.read(n) or b"{}")
+                    cmd = str(req["command"])
+                except (ValueError, KeyError, TypeError):
+                    self.close_connection = True
+                    return self.reply(400, {"error": 'expected {"command": ...}'})
+                if not api.command(cmd, req.get("value", True)):
+                    return self.reply(400, {"error": f"unknown command: {cmd}", "commands": list(CONTROL_COMMANDS) + ["profile:NAME"]})
+                self.reply(202, {"ok": True, "command": cmd})
+
+        return Handler
+
+# ------------------------ Overlay -------------------------------------
+
+# OBS-Browser-Source: dieselben Frames wie die Chatbox, per Server-Sent Events. Die erste Nachricht
+# enthält alle Felder, danach nur geänderte (meist nur "p" = interpolierte Position in ms).
+
+OVERLAY_PING = 15.0
+
+OVERLAY_HTML = """<!doctype html>
+<html><head><meta charset="utf-8"><title>Spotify overlay</title>
+<style>
+html,body{margin:0;background:transparent;font:600 22px/1.3 system-ui,sans-serif;color:#fff;text-shadow:0 1px 3px #000}
+#o{padding:12px;max-width:640px}#o.h{display:none}
+#t{font-size:1.15em}#a,#r{opacity:.8}#x{white-space:pre-wrap;display:none}
+#b{height:6px;background:rgba(255,255,255,.25);border-radius:3px;margin:6px 0 2px}
+#f{height:100%;width:0;background:#1db954;border-radius:3px;transition:width .1s linear}
+#tm{font-size:.7em;opacity:.8}
+body.chatbox #t,body.chatbox #a,body.chatbox #b,body.chatbox #tm{display:none}body.chatbox #x{display:block}
+</style></head><body>
+<div id="o"><div id="r"></div><div id="t"></div><div id="a"></div><div id="x"></div>
+<div id="b"><div id="f"></div></div><div id="tm"></div></div>
+<script>
+var s={},q=new URLSearchParams(location.search);
+if(q.get("mode")==="chatbox")document.body.className="chatbox";
+function $(i){return document.getElementById(i)}
+function mmss(ms){var t=Math.floor(ms/1000);return Math.floor(t/60)+":"+("0"+t%60).slice(-2)}
+function draw(){
+ $("t").textContent=s.t||"";$("a").textContent=s.a||"";$("r").textContent=s.r||"";$("x").textContent=s.x||"";
+ $("f").style.width=(s.d?Math.min(100,100*s.p/s.d):0)+"%";
+ $("tm").textContent=s.d?mmss(s.p)+" / "+mmss(s.d):"";
+ $("o").className=(s.h||!s.x)?"h":"";
+}
+var es=new EventSource("/overlay/events"+location.search);
+es.onmessage=function(e){var d=JSON.parse(e.data);if(d.full)s={};for(var k in d)s[k]=d[k];draw()};
+</script></body></html>
+"""
+
+def overlay_state(frame, now):
+    """Frame → kompakte Overlay-Felder; die Position wird bis now (Wall-Clock) weitergezählt."""
+    track = frame.get("track") or {}
+    parts = frame.get("parts") or {}
+    dur = frame.get("duration_ms", 0)
+    pos = frame.get("progress_ms", 0)
+    if frame.get("playing"):
+        pos = min(dur, pos + int((now - frame.get("at", now)) * 1000))
+    return {
+        "t": track.get("title", ""), "a": track.get("artist", ""), "al": track.get("album", ""),
+        "r": parts.get("rotation", ""), "x": frame.get("text", ""),
+        "pl": bool(frame.get("playing")), "h": bool(frame.get("hidden")),
+        "d": dur, "p": pos // 100 * 100,
+    }
+
+def overlay_diff(prev, cur):
+    return {k: v for k, v in cur.items() if prev.get(k) != v}
+
+def serve_overlay_page(h, query):
+    h.reply(200, OVERLAY_HTML.encode("utf-8"), "text/html; charset=utf-8")
+
+def serve_overlay_events(api, h, query):
+    h.send_response(200)
+    h.send_header("Content-Type", "text/event-stream")
+    h.send_header("Cache-Control", "no-store")
+    h.end_headers()
+    h.close_connection = True
+    hub = api.updater.hub
+    seq, prev = -1, None
+    last_write = time.monotonic()
+    try:
+        h.wfile.write(b"retry: 2000\n\n")
+        while api.running:
+            playing = bool(prev and prev["pl"])
+            tick = 1.0 / api.updater.cfg["overlay_hz"] if playing else OVERLAY_PING
+            seq, frame = hub.wait(seq, tick)
+            cur = overlay_state(frame, time.time())
+            if prev is None:
+                msg = dict(cur, full=1)
+            else:
+                msg = overlay_diff(prev, cur)
+            prev = cur
+            if msg:
+                h.wfile.write(b"data: " + json.dumps(msg, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n\n")
+                last_write = time.monotonic()
+            elif time.monotonic() - last_write >= OVERLAY_PING:
+                h.wfile.write(b": ping\n\n")      # hält Proxies/OBS offen, erkennt tote Clients
+                last_write = time.monotonic()
+    except OSError:
+        pass
+
+def install_overlay(api):
+    api.routes["/overlay"] = serve_overlay_page
+    api.routes["/overlay/events"] = functools.partial(serve_overlay_events, api)
+
+# ------------------------ Updater -------------------------------------
+
+class Updater:
+    """Poll → Render → Send ohne Tk. Die GUI und --headless nutzen dieselbe Instanz-Logik."""
+    def __init__(self, cfg, tokens=None, renderer=None, log=None, on_status=None, on_frame=None,
+                 clock=time.monotonic, sleep=None, osc=None, scheduler=None, name="", metrics=None):
+        cfg = self.cfg = validate_config(cfg)
+        self.name = name                # Session-Name ("" = Einzelbetrieb)
+        self.metrics = metrics or METRICS
+        # TokenStore (Datei + Benachrichtigung) oder einfach ein Dict (Benchmark/Replay)
+        self.token_store = tokens if isinstance(tokens, TokenStore) else None
+        self.tokens = self.token_store.get() if self.token_store else (tokens or {})
+        if self.token_store is not None:
+            self.token_store.subscribe(self._tokens_changed)
+        self.renderer = renderer or Renderer(cfg)
+        self.log = log or (lambda s: None)
+        self.on_status = on_status or (lambda kind, text: None)
+        self.on_frame = on_frame or (lambda text: None)
+        self.clock = clock
+        self.wake = threading.Event()
+        self.sleep = sleep                  # nur Replay/Benchmark; live taktet der Scheduler
+        self._live_sleep = sleep is None     # Zwischen-Steps für {lyric} nur mit echtem Warten
+        self.renderer.progress_now = lambda: self.interpolated_progress(self.clock())
+        self.osc = osc
+        self._osc_target = None
+        self._osc_injected = osc is not None     # z.B. Fake-Sink im Benchmark
+        self.running = False
+        self.worker = None
+        self.last_message = ""
+        self.last_track_id = ""
+        self.last_item = None
+        self.last_progress = 0
+        self.last_duration = 0
+        self.rot_idx = 0
+        self.next_rotate_at = clock()
+        self.next_afk_at = clock()
+        self.slots = ChatboxSlots(cfg.get("slot_intervals"))
+        self.cfg_epoch = 0
+        self._prefetch_lock = threading.Lock()
+        self._prefetch_want = None      # (track id, Token, Anzeige-Key) für den Prefetch-Worker
+        self._prefetched_for = ""
+        self._prefetch_error = ""
+        self._context_error_logged = False
+        self._prefetch_wake = threading.Event()
+        self._prefetch_thread = None
+        self.source = None       # ReplaySource statt Spotify-API
+        self.recorder = None
+        self._specs_reader_live = None
+        self.listener = None
+        self.history = None
+        self._history_id = ""
+        self.params = None
+        self.is_playing = False
+        self.last_poll_at = clock()
+        self.hidden = False
+        self._cleared = False
+        self._actions = collections.deque()
+        self.hub = FrameHub()           # letzter Frame für Control-API/Overlay
+        self._hub_key = None
+        self.scheduler = scheduler or SCHEDULER
+        self._typing_on = False
+        self._typing_at = None          # geplanter Einschaltzeitpunkt (clock)
+        self._typing_job = None
+        self._typing_off_job = None
+        self._typing_lock = threading.Lock()
+        self._pending_state = collections.deque(maxlen=1)   # RenderState aus set_config (anderer Thread)
+        self._jobs = {}                 # Art → ScheduledJob (poll, rotation, afk, lyric, specs, clock)
+        self._param_job = None
+        self._due = set()               # vom Scheduler gemeldete, noch nicht bearbeitete Arten
+        self._due_lock = threading.Lock()
+
+    def set_config(self, cfg):
+        old = self.cfg
+        cfg = validate_config(cfg)
+        # Ein per OSC/API umgeschaltetes Profil bleibt aktiv, solange active_profile selbst gleich bleibt
+        keep = self.renderer.profile.name if cfg.get("active_profile") == old.get("active_profile") else None
+        state = RenderState.compile(cfg, keep)
+        self.cfg = cfg
+        if self.running and threading.current_thread() is not self.worker:
+            self._pending_state.append(state)   # Worker tauscht zu Beginn des nächsten Steps
+        else:
+            self._install_state(state)
+        if self.running and any(old.get(k) != cfg.get(k) for k in ("osc_listen_enabled", "osc_listen_port", "osc_actions")):
+            self.stop_listener(); self.start_listener()
+        if old.get("avatar_params") != cfg.get("avatar_params") or old.get("avatar_params_steps") != cfg.get("avatar_params_steps"):
+            self.params = None
+        if self.running and cfg.get("avatar_params_enabled") and not old.get("avatar_params_enabled"):
+            self._start_params()
+        if self.running:
+            self.wake.set()             # Termine (Rotation, AFK, ...) mit den neuen Intervallen neu setzen
+
+    def _install_state(self, state):
+        self.renderer.install(state)
+        self.cfg_epoch += 1
+        self.slots.intervals = dict(self.cfg.get("slot_intervals") or {})
+
+    def update_interval(self):
+        return self.cfg["update_interval"]
+
+    def _tokens_changed(self, tokens):
+        # vom TokenStore: Login, Refresh (auch aus anderem Prozess), Clear
+        was_empty = not self.tokens
+        self.tokens = tokens
+        self.on_status("auth", "Auth: ok" if tokens else "Auth: required")
+        if tokens and was_empty:
+            self.poll_now()          # nach Login sofort pollen statt bis zum nächsten Intervall zu warten
+
+    # ------------------- OSC ---------------------------
+
+    def ensure_osc(self):
+        if self._osc_injected: return
+        target = (str(self.cfg["ip"]).strip(), self.cfg["port"])
+        if self.osc is None or target != self._osc_target:
+            self.osc = SimpleUDPClient(*target)
+            self._osc_target = target
+            if self.recorder is not None:
+                self.osc = RecordingOSC(self.osc, self.recorder)
+
+    # ------------------- Recording ---------------------
+
+    def start_recording(self, path=None):
+        if self.recorder is not None: return self.recorder.path
+        rec = Recorder(path, self.clock)
+        rec.header(self.cfg)
+        self.recorder = rec
+        if self.osc is not None:
+            self.osc = RecordingOSC(self.osc, rec)
+        live = self._specs_reader_live = self.renderer.specs_reader
+        def specs():
+            v = live(); rec.write("specs", d=v); return v
+        self.renderer.specs_reader = specs
+        return rec.path
+
+    def stop_recording(self):
+        rec, self.recorder = self.recorder, None
+        if rec is None: return None
+        if isinstance(self.osc, RecordingOSC):
+            self.osc = self.osc.inner
+        if self._specs_reader_live is not None:
+            self.renderer.specs_reader = self._specs_reader_live
+            self._specs_reader_live = None
+        rec.close()
+        return rec.path
+
+    def _send_all(self, osc, messages):
+        for path, value in messages:
+            try: osc.send_message(path, value)
+            except Exception: pass
+
+    def send_jump(self):
+        try:
+            self.ensure_osc()
+            self.osc.send_message(INPUT_JUMP, [True])
+            # Loslassen über den Scheduler, statt den Worker 100 ms schlafen zu lassen
+            self.scheduler.call_later(0.1, self._send_all, self.osc, ((INPUT_JUMP, [False]),))
+            return True
+        except Exception as e:
+            self.log(f"Jump error: {e}"); return False
+
+    def send_wiggle(self):
+        try:
+            self.ensure_osc()
+            axes = ("/input/Vertical", "/input/MoveForward")
+            self._send_all(self.osc, [(path, 1.0) for path in axes])
+            self.scheduler.call_later(0.12, self._send_all, self.osc, [(path, 0.0) for path in axes])
+            return True
+        except Exception as e:
+            self.log(f"Wiggle error: {e}"); return False
+
+    def send_chatbox_raw(self, text):
+        self.ensure_osc()
+        try:
+            play_sound = bool(self.cfg["chat_sound"])
+            self.osc.send_message(CHATBOX_INPUT, [text, True, play_sound])
+        except:
+            self.osc.send_message(CHATBOX_INPUT, [text, True])
+
+    @timed("send")
+    def send_chatbox(self, text):
+        try:
+            self.send_chatbox_raw(text)
+            self.metrics.inc("messages_sent")
+            return True
+        except Exception as e:
+            self.metrics.inc("send_errors")
+            self.log(f"Send error: {e}"); return False
+
+    def send_typing(self, value):
+        try:
+            self.ensure_osc(); self.osc.send_message(CHATBOX_TYPING, [bool(value)]); return True
+        except Exception as e:
+            self.log(f"Typing error: {e}"); return False
+
+    def plan_typing(self, now):
+        # Nächsten vorhersehbaren Send (Rotation, Trackende) bestimmen und „tippt…“ davor einplanen
+        d = self.renderer.cfg
+        due = []
+        if d["rotation_enabled"] and self.renderer.profile.rotation.entries:
+            due.append(self.next_rotate_at)
+        if self.is_playing and self.last_duration:
+            due.append(now + (self.last_duration - self.interpolated_progress(now)) / 1000.0)
+        if not due or self.hidden:
+            self.cancel_typing(); return
+        at = min(due) - self.cfg["typing_lead_ms"] / 1000.0
+        if self._typing_at is not None and abs(at - self._typing_at) < 0.25:
+            return                      # Trackende wandert pro Poll nur um ms – nicht neu einplanen
+        if at <= now:
+            return                      # Send steht unmittelbar an – kein Flackern
+        if self._typing_job is not None: self._typing_job.cancel()
+        self._typing_at = at
+        self._typing_job = self.scheduler.call_at(at, self._set_typing, True)
+
+    def _set_typing(self, on):
+        # Aufrufer: Scheduler-Thread (an, Sicherheits-Aus) und Worker (aus nach dem Send)
+        with self._typing_lock:
+            if on == self._typing_on or (on and (not self.running or self.hidden)):
+                return
+            self._typing_on = on
+            self.send_typing(on)
+            if self._typing_off_job is not None:
+                self._typing_off_job.cancel(); self._typing_off_job = None
+            if on:
+                # Sicherheitsnetz: kommt der Send nicht (Pause, Skip), nicht ewig „tippen“
+                grace = self.cfg["typing_lead_ms"] / 1000.0 + self.update_interval() + 1.0
+                self._typing_off_job = self.scheduler.call_later(grace, self._set_typing, False)
+            else:
+                self._typing_at = None
+
+    def cancel_typing(self):
+        if self._typing_job is not None:
+            self._typing_job.cancel(); self._typing_job = None
+        self._typing_at = None
+        if self._typing_on:
+            self._set_typing(False)
+
+    # ------------------- Render ------------------------
+
+    def render_lines(self):
+        return self.renderer.render_spotify_lines(self.last_item, self.last_progress, self.last_duration)
+
+    def render_rotation_item(self, txt):
+        return self.renderer.render_rotation_item(txt, self.last_item, self.last_progress, self.last_duration)
+
+    def preview(self):
+        m, tline = self.render_lines()
+        return self.renderer.compose_full(m, tline)
+
+    def _prefetch_next(self, track_id):
+        # Ein langlebiger Worker holt die Queue, damit der nächste Trackwechsel direkt aus dem Cache rendert.
+        # Neuere Aufträge ersetzen ältere; gemerkt wird ein Track erst nach Erfolg (sonst nächster Poll).
+        with self._prefetch_lock:
+            if track_id == self._prefetched_for:
+                return
+            self._prefetch_want = (track_id, self.tokens.get("access_token",""), self.renderer.fragment_key())
+            if self._prefetch_thread is None:
+                self._prefetch_thread = threading.Thread(target=self._prefetch_worker, name="prefetch", daemon=True)
+                self._prefetch_thread.start()
+        self._prefetch_wake.set()
+
+    def _prefetch_worker(self):
+        while True:
+            self._prefetch_wake.wait()
+            self._prefetch_wake.clear()
+            with self._prefetch_lock:
+                job, self._prefetch_want = self._prefetch_want, None
+            if job is None:
+                continue
+            track_id, token, display = job
+            try:
+                queue = get_queue(token)
+                if queue and queue[0].get("id"):
+                    self.renderer.track_fragments(queue[0], display)
+                    with self._prefetch_lock:
+                        self._prefetched_for = track_id
+                err = ""
+            except Exception as e:
+                self.metrics.inc("api_errors")
+                err = str(e)
+            if err != self._prefetch_error:     # jeden neuen Fehler einmal loggen, nicht pro Poll
+                self._prefetch_error = err
+                if err:
+                    hint = " – sign in again to grant the queue scope" if missing_scopes(self.tokens) else ""
+                    self.log(f"Prefetch error: {err}{hint}")
+
+    # ------------------- Loop --------------------------
+
+    def reset_state(self):
+        self.last_message = ""; self.last_track_id = ""; self.rot_idx = 0
+        self.slots.reset()
+        now = self.clock()
+        self.next_rotate_at = now; self.renderer.current_rot_text = ""
+        afk_iv = self.cfg["anti_afk_interval"]
+        self.next_afk_at = now + afk_iv if self.cfg["anti_afk_enabled"] else now + 10**9
+
+    def start(self):
+        if self.running: return
+        self.ensure_osc()
+        self.running = True
+        self.reset_state()
+        if self.source is None:
+            self.open_history()
+        self.start_listener()
+        missing = missing_scopes(self.tokens)
+        if missing:
+            self.log(f"Token lacks scope {', '.join(missing)} – sign in again for all features")
+        self.worker = threading.Thread(target=self.run, daemon=True); self.worker.start()
+        if self.cfg["avatar_params_enabled"]:
+            self._start_params()
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
+        self.cancel_typing()
+        for job in self._jobs.values():
+            job.cancel()
+        self._jobs.clear()
+        if self._param_job is not None:
+            self._param_job.cancel(); self._param_job = None
+        self.stop_listener()
+        if self.history is not None:
+            self.history.close()
+
+    def open_history(self):
+        if self.history is not None or not self.cfg["history_enabled"]:
+            return self.history
+        try:
+            folder = os.path.join(_data_dir(), "history", session_slug(self.name)) if self.name else None
+            self.history = HistoryStore(folder, max_bytes=self.cfg["history_max_mb"] * 1024 * 1024)
+        except Exception as e:
+            self.log(f"History disabled: {e}")
+            return None
+        self.renderer.history = self.history
+        return self.history
+
+    # ------------------- Timer -------------------------
+
+    def _arm(self, kind, when, keep=False):
+        # Eine Deadline pro Art; ein neuer Termin ersetzt den alten (keep: offenen Termin behalten).
+        # Nur der Worker verwaltet _jobs; ein Job mit Deadline in der Vergangenheit gilt als erledigt.
+        job = self._jobs.get(kind)
+        if job is not None and not job.cancelled and job.when > self.scheduler.clock():
+            if keep or abs(job.when - when) < 0.001:
+                return
+            job.cancel()
+        self._jobs[kind] = self.scheduler.call_at(when, self._fire, kind, when)
+
+    def _disarm(self, kind):
+        job = self._jobs.pop(kind, None)
+        if job is not None:
+            job.cancel()
+
+    def _fire(self, kind, when=None):
+        # Scheduler-Thread: nur vormerken und den Worker wecken
+        if when is not None:
+            self.metrics.observe("timer_lag", max(0.0, self.scheduler.clock() - when) * 1000.0)
+        with self._due_lock:
+            self._due.add(kind)
+        self.wake.set()
+
+    def poll_now(self):
+        self._fire("poll")
+
+    def _take_due(self):
+        with self._due_lock:
+            due, self._due = self._due, set()
+        return due
+
+    def _arm_timers(self, now):
+        # Nach jedem Step: nächste Deadlines aus dem Zustand ableiten
+        c, d = self.cfg, self.renderer.cfg
+        if d["rotation_enabled"] and self.renderer.profile.rotation.entries:
+            self._arm("rotation", self.next_rotate_at)
+        else:
+            self._disarm("rotation")
+        if c["anti_afk_enabled"]:
+            if self.next_afk_at - now > c["anti_afk_interval"]:      # gerade eingeschaltet/verkürzt
+                self.next_afk_at = now + c["anti_afk_interval"]
+            self._arm("afk", self.next_afk_at)
+        else:
+            self._disarm("afk")
+        lyric = self.lyric_wait()
+        if lyric is not None:
+            self._arm("lyric", now + lyric)
+        else:
+            self._disarm("lyric")
+        # Specs/Uhr sind Low-Priority-Slots: spätestens nach ihrem Mindestintervall neu rendern
+        for kind, key in (("specs", "show_specs_line"), ("clock", "show_clock_line")):
+            if d[key]:
+                self._arm(kind, now + max(1, self.slots.intervals.get(kind, 0)), keep=True)
+            else:
+                self._disarm(kind)
+
+    def interpolated_progress(self, now):
+        # Zwischen zwei Polls weiterzählen, damit Bar/Parameter flüssig laufen
+        if not self.last_item:
+            return 0
+        if not self.is_playing:
+            return self.last_progress
+        return min(self.last_duration, self.last_progress + int((now - self.last_poll_at) * 1000))
+
+    def publish_params(self, now):
+        c = self.cfg
+        if self.params is None:
+            self.params = ParamPublisher(c["avatar_params"], c["avatar_params_steps"])
+        dur = self.last_duration
+        frac = self.interpolated_progress(now) / dur if dur > 0 else 0.0
+        try:
+            self.ensure_osc()
+            self.params.publish(self.osc, now, frac, self.is_playing, (self.last_item or {}).get("id", ""))
+        except Exception as e:
+            self.log(f"Avatar param error: {e}")
+
+    def _start_params(self):
+        if self._param_job is not None:
+            self._param_job.cancel()
+        self._param_tick()
+
+    def _param_tick(self):
+        # läuft direkt im Scheduler-Thread (nur UDP-Sends), plant sich selbst neu
+        if not (self.running and self.cfg["avatar_params_enabled"]):
+            self._param_job = None
+            self.params = None
+            return
+        self.publish_params(self.clock())
+        self._param_job = self.scheduler.call_later(1.0 / self.cfg["avatar_params_hz"], self._param_tick)
+
+    # ------------------- Actions -----------------------
+
+    def start_listener(self):
+        if self.listener is not None or not self.cfg["osc_listen_enabled"]:
+            return
+        try:
+            self.listener = OSCListener(self.cfg["osc_listen_port"],
+                                        self.cfg["osc_actions"], self.request_action)
+            self.listener.start()
+            self.log(f"OSC input on port {self.listener.port}")
+        except Exception as e:
+            self.listener = None
+            self.log(f"OSC input error: {e}")
+
+    def stop_listener(self):
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.stop()
+
+    def request_action(self, action, value=True):
+        # Thread-sicher: nur einreihen, ausgeführt wird im Worker beim nächsten step()
+        self._actions.append((action, value))
+        self.wake.set()
+
+    def _apply_actions(self, now):
+        while self._actions:
+            action, value = self._actions.popleft()
+            if action == "force_send":
+                self.slots.reset()
+            elif action == "show":
+                self.set_hidden(not value)
+            elif action == "hide":
+                self.set_hidden(bool(value))
+            elif action == "toggle_hide":
+                self.set_hidden(not self.hidden)
+            elif action == "next_rotation":
+                self.next_rotate_at = now
+            elif action == "next_profile":
+                names = [""] + profile_names(self.cfg)
+                cur = self.renderer.profile.name
+                self.switch_profile(names[(names.index(cur) + 1) % len(names)] if cur in names else "")
+            elif action.startswith("profile:"):
+                self.switch_profile(action[len("profile:"):])
+            else:
+                self.log(f"Unknown action: {action}")
+
+    def switch_profile(self, name):
+        name = name or ""
+        if name not in self.renderer.profiles:
+            self.log(f"Unknown profile: {name}")
+            return False
+        if self.running and threading.current_thread() is not self.worker:
+            self.request_action("profile:" + name)    # andere Threads (GUI): im Worker umschalten
+            return True
+        if name == self.renderer.profile.name:
+            return True
+        self.renderer.switch_profile(name)
+        self.cfg_epoch += 1               # neuer Look → sofort senden
+        self.rot_idx = 0; self.next_rotate_at = self.clock()
+        self.renderer.current_rot_text = ""
+        return True
+
+    def set_hidden(self, hidden):
+        if hidden == self.hidden: return
+        self.hidden = hidden; self._cleared = False
+        if not hidden:
+            self.slots.reset()
+
+    def run(self):
+        _metrics_local.metrics = self.metrics     # @timed (Poll, Refresh, Render, Send) zählt für diese Session
+        if self.source is not None and self.source.stepped:
+            return self._run_replay()
+        if not self._live_sleep:
+            return self._run_stepped()
+        # Live: der Scheduler weckt zu jeder Deadline (Poll, Rotation, AFK, Lyrics, Specs, Uhr);
+        # dazwischen schläft der Worker ohne Timeout. Aktionen/Config wecken für einen Step.
+        self._take_due()
+        self.poll_now()
+        while self.running:
+            self.wake.wait()
+            self.wake.clear()
+            if not self.running:
+                break
+            due = self._take_due()
+            now = self.clock()
+            polled = "poll" in due
+            t0 = time.perf_counter()
+            try:
+                if polled:
+                    self._arm("poll", now + self.update_interval())    # fixe Rate ab Deadline, nicht ab Ende
+                    self.tick(due)
+                else:
+                    self._step(now, due)
+            except Exception as e:
+                self.metrics.inc("loop_errors")
+                self.log(f"Loop error: {e}")
+            dt = time.perf_counter() - t0
+            if polled:
+                self.metrics.observe("tick", dt * 1000.0)
+                if dt > self.update_interval():
+                    self.metrics.inc("loop_overruns")
+            if self.running:
+                self._arm_timers(self.clock())
+
+    def _run_replay(self):
+        # Replay: Polls und Zwischen-Steps (Rotation, Lyrics, Specs, Uhr, Aktionen) zur Aufnahmezeit
+        src = self.source
+        while self.running and not src.exhausted():
+            rec = src.next_event()
+            t0 = time.perf_counter()
+            try:
+                if rec["k"] == "pb":
+                    if rec.get("d") != "unauthorized":
+                        self.apply_playback(rec.get("d"))
+                    continue
+                self.step(self.clock())
+            except Exception as e:
+                self.metrics.inc("loop_errors")
+                self.log(f"Loop error: {e}")
+            self.metrics.observe("tick", (time.perf_counter() - t0) * 1000.0)
+        self.running = False
+
+    def _run_stepped(self):
+        # Benchmark/ältere Aufnahmen: Uhr und Schlaf sind injiziert, getaktet wird nur über die Polls
+        while self.running:
+            t0 = time.perf_counter()
+            try:
+                self.tick()
+            except Exception as e:
+                self.metrics.inc("loop_errors")
+                self.log(f"Loop error: {e}")
+            dt = time.perf_counter() - t0
+            self.metrics.observe("tick", dt * 1000.0)
+            interval = self.update_interval()
+            if dt > interval:
+                self.metrics.inc("loop_overruns")
+            self.sleep(interval)
+
+    def lyric_wait(self):
+        nxt = self.renderer.lyric_next_ms
+        if nxt is None or not self.is_playing or not self._live_sleep or self.source is not None:
+            return None
+        delta = nxt - self.interpolated_progress(self.clock())
+        return delta / 1000.0 if delta > 0 else None
+
+    def tick(self, due=("poll",)):
+        if self.poll():
+            self._step(self.clock(), due)
+
+    def _step(self, now, due=()):
+        # Aufnahme: jeden Step mit seiner Uhrzeit festhalten, das Replay wiederholt genau diese
+        if self.recorder is not None:
+            self.recorder.write("step", at=now, d=sorted(due))
+        return self.step(now)
+
+    def poll(self):
+        if self.source is not None:
+            if self.source.exhausted():
+                self.running = False
+                return False
+            self.apply_playback(self.source.playback())
+            return True
+
+        if not self.tokens or token_expired(self.tokens):
+            try:
+                if self.token_store is not None:
+                    self.token_store.refresh(refresh_token)
+                    self.tokens = self.token_store.get()    # neuester Stand, auch wenn ein set() direkt folgte
+                else:
+                    self.tokens = refresh_token(self.tokens)
+            except Exception as e:
+                self.on_status("auth", "Auth: required"); self.log(f"Token refresh failed: {e}")
+                return False
+
+        try:
+            pb = get_current_playback(self.tokens.get("access_token",""),
+                                      player=self.renderer.needs_source("player"))
+        except Exception:
+            self.metrics.inc("api_errors")
+            raise
+        at = self.clock()
+        if self.recorder is not None:
+            self.recorder.write("pb", at=at, d=pb)
+        if pb == "unauthorized":
+            self.on_status("auth", "Auth: required"); self.log("Access revoked or expired")
+            return False
+        if pb and self.renderer.needs_source("context"):
+            self._resolve_context(pb)
+        self.apply_playback(pb, at)
+        return True
+
+    def _resolve_context(self, pb):
+        ctx = pb.get("context") or {}
+        uri = ctx.get("uri", "")
+        if ctx.get("type") != "playlist" or uri in self.renderer.context_names:
+            return
+        try:
+            name = get_playlist_name(self.tokens.get("access_token",""), uri.rsplit(":", 1)[-1])
+        except Exception as e:
+            self.metrics.inc("api_errors"); name = ""
+            if not self._context_error_logged:      # einmal melden, danach zeigt {context} still "Playlist"
+                self._context_error_logged = True
+                hint = " – sign in again to grant the playlist scopes" if missing_scopes(self.tokens) else ""
+                self.log(f"Playlist name unavailable ({e}){hint}")
+        self.renderer.context_names[uri] = name
+
+    def apply_playback(self, pb, at=None):
+        self.last_poll_at = self.clock() if at is None else at
+        self.renderer.playback = pb or {}
+        if not pb or not pb.get("item"):
+            self.on_status("playback", "Playback: none")
+            self.last_item = None; self.last_progress = 0; self.last_duration = 0
+            self.is_playing = False
+            return
+        item = pb["item"]
+        self.last_item = item
+        tid = item.get("id") or item.get("name", "")
+        if self.history is not None and tid != self._history_id:
+            self._history_id = tid
+            try:
+                self.history.add(item, self.renderer.now().timestamp())
+            except Exception as e:
+                self.log(f"History write failed: {e}")
+        self.last_progress = pb.get("progress_ms", 0)
+        self.last_duration = item.get("duration_ms", 0)
+        self.is_playing = bool(pb.get("is_playing", False))
+        self.on_status("playback", "Playback: playing" if pb.get("is_playing", False) else "Playback: paused")
+        if self.cfg["prefetch_queue"] and item.get("id"):
+            self._prefetch_next(item["id"])
+
+    def step(self, now):
+        if self._pending_state:
+            self._install_state(self._pending_state.popleft())
+        c = self.cfg
+        if self._actions:
+            self._apply_actions(now)
+        spotify_main, time_line = self.render_lines()
+
+        d = self.renderer.cfg                # Display-Settings des aktiven Profils
+        items = self.renderer.profile.rotation
+        if d["rotation_enabled"] and len(items) > 0 and now >= self.next_rotate_at:
+            rot_iv = d["rotation_interval"]
+            late = now - self.next_rotate_at
+            if self.rot_idx and late >= rot_iv:
+                self.metrics.inc("rotations_skipped", int(late // rot_iv))
+            seq = self.renderer.rotation_sequence(self.is_playing)
+            if seq:
+                it = seq[self.rot_idx % len(seq)]
+                self.rot_idx += 1
+                self.renderer.current_rot_text = self.render_rotation_item(it)
+                self.next_rotate_at = now + (it.duration or rot_iv)
+            else:
+                self.renderer.current_rot_text = ""
+                self.next_rotate_at = now + rot_iv
+
+        track_id = (self.last_item or {}).get("id","")
+        parts = self.renderer.frame_parts(spotify_main, time_line)
+        combined = self.renderer.compose_parts(parts)
+        slots = self.slots
+        slots.update("track", (track_id, parts["afk"], self.cfg_epoch, self.renderer.stable_values))
+        for name in ("rotation", "main", "time", "specs", "clock"):
+            slots.update(name, parts[name])
+        if self.hidden:
+            if not self._cleared and self.send_chatbox(""):
+                self._cleared = True; self.last_message = ""
+        elif combined and (not c["only_changes"] or slots.due(now)):
+            if self.send_chatbox(combined):
+                slots.mark_sent(now)
+                self.last_message = combined; self.last_track_id = track_id
+                if self._typing_on: self._set_typing(False)
+        elif combined and slots.changed():
+            self.metrics.inc("messages_suppressed")
+        if c["typing_indicator"] and self._live_sleep and self.source is None:
+            self.plan_typing(now)
+        elif self._typing_at is not None or self._typing_on:
+            self.cancel_typing()
+
+        # Anti-AFK
+        if c["anti_afk_enabled"] and now >= self.next_afk_at:
+            mode = c["anti_afk_mode"]
+            ok = self.send_jump() if mode == "jump" else self.send_wiggle()
+            if ok:
+                self.log(f"Anti-AFK pulse ({mode})")
+            self.next_afk_at = now + c["anti_afk_interval"]
+
+        key = (combined, track_id, self.is_playing, self.hidden, self.last_progress, self.renderer.profile.name)
+        if key != self._hub_key:
+            self._hub_key = key
+            self.hub.publish(self.frame_state(combined, parts))
+        self.on_frame(combined)
+        return combined
+
+    def track_info(self):
+        item = self.last_item or {}
+        return {
+            "id": item.get("id") or "",
+            "title": item.get("name") or "",
+            "artist": ", ".join(a.get("name", "") for a in item.get("artists") or ()),
+            "album": (item.get("album") or {}).get("name") or "",
+        }
+
+    def frame_state(self, combined, parts):
+        # Für Control-API/Overlay: Text + Einzelteile + Zustand zum Interpolieren (at = Wall-Clock des Polls)
+        return {
+            "text": combined, "parts": parts, "track": self.track_info(),
+            "playing": self.is_playing, "progress_ms": self.last_progress, "duration_ms": self.last_duration,
+            "at": round(time.time() - (self.clock() - self.last_poll_at), 3),
+            "hidden": self.hidden, "profile": self.renderer.profile.name,
+        }
+
+    def status(self):
+        return {
+            "running": self.running, "auth": bool(self.tokens), "hidden": self.hidden,
+            "profile": self.renderer.profile.name, "playing": self.is_playing, "track": self.track_info(),
+            "progress_ms": self.interpolated_progress(self.clock()), "duration_ms": self.last_duration,
+            "last_message": self.last_message, "recording": self.recorder is not None,
+        }
+
+# ------------------------ Sessions ------------------------------------
+
+# Mehrere Personen in einem Prozess: je Session eigene Tokens, Settings, Quelle und OSC-Ziel.
+# Geteilt werden HTTP-Pool (http_session), SCHEDULER, Track-Cache, Specs-Reader sowie die
+# Modul-Caches (Templates, Bars, Transliteration, Lyrics).
+
+def session_configs(cfg, problems=None):
+    """
+    Basis-Config + Overrides je Session → [(name, validierte Config, Token-Datei)]. Geerbte Ports
+    (osc_listen_port, control_port) würden ab der zweiten Session nicht binden: doppelt belegte
+    Ports schalten den Dienst für die spätere Session ab und werden gemeldet.
+    """
+    base = thaw(cfg)
+    base.pop("_validated", None)
+    base["sessions"] = []
+    out, used = [], {}
+    for sess in cfg["sessions"]:
+        over = {k: v for k, v in thaw(sess).items() if k not in SESSION_ONLY_KEYS}
+        for port_key, switches in SESSION_PORTS.items():
+            if not any(over.get(k, base[k]) for k in switches):
+                continue
+            port = over.get(port_key, base[port_key])
+            owner = used.setdefault((port_key, port), sess["name"])
+            if owner != sess["name"]:
+                over.update(dict.fromkeys(switches, False))
+                _note(problems, f"sessions: {sess['name']!r} {port_key}={port} already used by {owner!r} "
+                                f"({', '.join(switches)} off – give the session its own {port_key})")
+        out.append((sess["name"], validate_config(dict(base, **over)), session_token_path(sess)))
+    return out
+
+class Session:
+    __slots__ = ("name", "tokens", "metrics", "updater", "control")
+
+    def __init__(self, name, cfg, token_path, track_cache, specs_reader, log=None, on_status=None):
+        self.name = name
+        self.tokens = TokenStore(token_path)
+        renderer = Renderer(cfg, track_cache=track_cache, specs_reader=specs_reader)
+        self.metrics = Metrics()
+        self.updater = Updater(cfg, self.tokens, renderer=renderer, log=log, on_status=on_status, name=name,
+                               metrics=self.metrics)
+        self.control = None
+
+    def start_control(self, log):
+        cfg = self.updater.cfg
+        if not (cfg["control_enabled"] or cfg["overlay_enabled"]):
+            return
+        try:
+            self.control = ControlServer(self.updater, cfg["control_port"], token=cfg["control_token"], log=log,
+                                         metrics=self.metrics)
+            if cfg["overlay_enabled"]: install_overlay(self.control)
+            self.control.start()
+            log(f"Control API on http://127.0.0.1:{cfg['control_port']}/status")
+        except Exception as e:
+            self.control = None
+            log(f"Control API error: {e}")
+
+    def stop(self):
+        self.updater.stop()
+        self.updater.stop_recording()
+        if self.control is not None:
+            self.control.stop(); self.control = None
+
+def run_sessions(cfg, record=False, log=print):
+    def prefixed(name):
+        return lambda s: log(f"[{name}] {s}")
+    def status_logger(slog):
+        last = {}
+        def on_status(kind, text):
+            if last.get(kind) != text:
+                last[kind] = text; slog(text)
+        return on_status
+    shared_cache = TrackCache(1024)
+    shared_specs = SharedSpecs()
+    sessions = []
+    problems = []
+    configs = session_configs(cfg, problems)
+    for p in problems: log(p)
+    for name, scfg, token_path in configs:
+        slog = prefixed(name)
+        sess = Session(name, scfg, token_path, shared_cache, shared_specs, log=slog, on_status=status_logger(slog))
+        if sess.tokens.load_error:
+            slog(f"Token file unreadable: {sess.tokens.load_error}")
+        if not sess.tokens.get().get("refresh_token"):
+            cid = str(scfg["client_id"]).strip()
+            if not cid:
+                slog("No tokens and no client_id – skipped"); continue
+            slog("Sign in with this session's Spotify account in the browser")
+            try:
+                authorize_pkce(cid, DEFAULT_REDIRECT_HOST, DEFAULT_REDIRECT_PORT, ui_log=slog, store=sess.tokens)
+            except Exception as e:
+                slog(f"Sign-in failed: {e}"); continue
+        sessions.append(sess)
+    CALLBACKS.close()
+    if not sessions:
+        log("No session could be started")
+        return 1
+    for sess in sessions:
+        sess.start_control(sess.updater.log)
+        if record:
+            sess.updater.log(f"Recording to {sess.updater.start_recording()}")
+        sess.updater.start()
+    by_name = {sess.name: sess for sess in sessions}
+    def reload(new, problems):
+        fresh = session_configs(new, problems)
+        for p in problems: log(p)
+        if {n for n, _, _ in fresh} != set(by_name):
+            log("Session list changed – restart to add or remove sessions")
+        for name, scfg, _path in fresh:
+            if name in by_name:
+                by_name[name].updater.set_config(scfg)
+        log("Config reloaded from disk")
+    watcher = ConfigWatcher(reload, log=log)
+    watcher.start()
+    log(f"{len(sessions)} sessions started (headless, Ctrl+C to stop)")
+    try:
+        while any(sess.updater.running for sess in sessions):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    watcher.stop()
+    for sess in sessions:
+        sess.stop()
+    log("Sessions stopped")
+    return 0
+
+class App(ctk.CTk if ctk else object):
     def __init__(self):
         super().__init__()
         ctk.set_appearance_mode("system")
@@ -509,28 +4038,37 @@ class App(ctk.CTk):
         self.redirect_host = DEFAULT_REDIRECT_HOST
         self.redirect_port = DEFAULT_REDIRECT_PORT
 
-        self.cfg = config_load()
-        self.tokens = token_store_load()
-        self.osc = None
-        self.running = False
-        self.worker = None
-        self.last_message = ""
-        self.last_track_id = ""
-        self.last_item = None
-        self.last_progress = 0
-        self.last_duration = 0
-        self.rot_idx = 0
-        self.next_rotate_at = time.monotonic()
-        self.current_rot_text = ""
-        self.next_afk_at = time.monotonic()
-        self._last_specs = ("", 0.0)
+        cfg_problems = []
+        self.cfg = config_load(cfg_problems)
+        self.updater = Updater(
+            self.cfg, TOKENS,
+            log=self._log_async, on_status=self._status_async, on_frame=self._frame_async
+        )
+        self.updater.open_history()     # damit {session_tracks} & Co. schon in der Vorschau stehen
+        self._auth_flow = None
+        self._save_job = None           # Tk-after-Job des verzögerten Autosaves
 
         try:
             if psutil: psutil.cpu_percent(interval=None)
         except Exception:
             pass
         self._build_ui()
+        self.lbl_auth.configure(text="Auth: ok" if self.updater.tokens else "Auth: required")
+        if TOKENS.load_error:
+            self._log(f"Token file unreadable ({TOKENS.load_error}) – sign in again")
+        for p in cfg_problems: self._log(p)
+        if self.cfg["sessions"]:
+            self._log(f"{len(self.cfg['sessions'])} sessions configured – the GUI drives the base settings; "
+                      "run with --headless to host all sessions")
         self._bind_autosave()
+        self.cfg_watcher = ConfigWatcher(self._config_changed_async, log=self._log_async)
+        self.cfg_watcher.start()
+        self._start_metrics()
+        self.control = None
+        self._start_control()
+        self._status_job = None
+        self._proc_state = collections.deque(maxlen=1)   # (spotify, vrchat) vom Scan-Thread
+        self._proc_scanning = False
         self._update_status_loop()
 
     def get_int(self, var, default, lo=None, hi=None):
@@ -562,7 +4100,8 @@ class App(ctk.CTk):
         ctk.CTkLabel(left, text="Spotify Client ID").pack(anchor="w", padx=12)
         ctk.CTkEntry(left, textvariable=self.var_client_id).pack(fill="x", padx=12, pady=(0,6))
         top_row = ctk.CTkFrame(left); top_row.pack(fill="x", padx=12)
-        ctk.CTkButton(top_row, text="Sign in to Spotify", command=self._on_spotify_login).pack(side="left")
+        self.btn_login = ctk.CTkButton(top_row, text="Sign in to Spotify", command=self._on_spotify_login)
+        self.btn_login.pack(side="left")
         ctk.CTkCheckBox(top_row, text="Save ID", variable=self.var_save_cid).pack(side="left", padx=(8,0))
 
         # Redirect URI Anzeige + Firewall Fix
@@ -575,6 +4114,13 @@ class App(ctk.CTk):
         ctk.CTkEntry(net, width=190, textvariable=self.var_ip).grid(row=0, column=1, padx=(6,12))
         ctk.CTkLabel(net, text="Port").grid(row=0, column=2)
         ctk.CTkEntry(net, width=120, textvariable=self.var_port).grid(row=0, column=3, padx=(6,0))
+        self.var_osc_listen = ctk.BooleanVar(value=self.cfg.get("osc_listen_enabled", False))
+        self.var_osc_listen_port = ctk.StringVar(value=str(self.cfg.get("osc_listen_port", 9001)))
+        ctk.CTkCheckBox(net, text="OSC input", variable=self.var_osc_listen).grid(row=1, column=0, columnspan=2, sticky="w", pady=(6,0))
+        ctk.CTkLabel(net, text="Listen").grid(row=1, column=2, pady=(6,0))
+        ctk.CTkEntry(net, width=120, textvariable=self.var_osc_listen_port).grid(row=1, column=3, padx=(6,0), pady=(6,0))
+        self.var_avatar_params = ctk.BooleanVar(value=self.cfg.get("avatar_params_enabled", False))
+        ctk.CTkCheckBox(net, text="Avatar params (progress/playing)", variable=self.var_avatar_params).grid(row=2, column=0, columnspan=4, sticky="w", pady=(6,0))
 
         upd_row = ctk.CTkFrame(left); upd_row.pack(fill="x", padx=12, pady=(6,10))
         ctk.CTkLabel(upd_row, text="Update interval (s)").pack(side="left")
@@ -604,7 +4150,7 @@ class App(ctk.CTk):
 
         tabs = ctk.CTkTabview(grid, width=820, height=710, corner_radius=12)
         tabs.grid(row=0, column=1, sticky="nsew", padx=(8,12), pady=(12,8))
-        tab_display = tabs.add("Display"); tab_rotate = tabs.add("Rotator"); tab_help = tabs.add("Help")
+        tab_display = tabs.add("Display"); tab_rotate = tabs.add("Rotator"); tab_stats = tabs.add("Stats"); tab_help = tabs.add("Help")
 
         # Display Vars
         self.var_prefix = ctk.BooleanVar(value=self.cfg["prefix"])
@@ -625,8 +4171,10 @@ class App(ctk.CTk):
         self.var_preview = ctk.StringVar(value="")
 
         self.var_clamp_long = ctk.BooleanVar(value=self.cfg["clamp_long"])
+        self.var_prefetch = ctk.BooleanVar(value=self.cfg.get("prefetch_queue", False))
         self.var_max_title = ctk.StringVar(value=str(self.cfg["max_title_len"]))
         self.var_max_artist = ctk.StringVar(value=str(self.cfg["max_artist_len"]))
+        self.var_line_cols = ctk.StringVar(value=str(self.cfg.get("line_columns", 0)))
 
         self.var_clock_line = ctk.BooleanVar(value=self.cfg["show_clock_line"])
         self.var_clock_24h = ctk.BooleanVar(value=self.cfg["clock_24h"])
@@ -644,8 +4192,18 @@ class App(ctk.CTk):
 
         self.var_chat_sound = ctk.BooleanVar(value=self.cfg.get("chat_sound", True))
         self.var_hud_transparent = ctk.BooleanVar(value=self.cfg.get("hud_transparent", True))
+        self.var_bar_smooth = ctk.BooleanVar(value=self.cfg.get("bar_smooth", False))
 
         # --- Display UI ---
+        self.var_profile = ctk.StringVar(value=self.cfg.get("active_profile") or PROFILE_BASE)
+        proff = ctk.CTkFrame(tab_display); proff.pack(fill="x", padx=12, pady=(12,0))
+        ctk.CTkLabel(proff, text="Profile").pack(side="left", padx=(6,6))
+        self.profile_menu = ctk.CTkOptionMenu(proff, values=[PROFILE_BASE] + profile_names(self.cfg),
+                                              variable=self.var_profile, command=self._on_profile_select, width=180)
+        self.profile_menu.pack(side="left")
+        ctk.CTkButton(proff, text="Save as…", command=self._profile_save_as, width=110).pack(side="left", padx=(8,0))
+        ctk.CTkButton(proff, text="Delete", command=self._profile_delete, width=90).pack(side="left", padx=(8,0))
+
         look = ctk.CTkFrame(tab_display); look.pack(fill="x", padx=12, pady=(12,8))
         ctk.CTkCheckBox(look, text='Show prefix', variable=self.var_prefix).grid(row=0, column=0, padx=6, pady=4, sticky="w")
         ctk.CTkLabel(look, text="Prefix text").grid(row=0, column=1, sticky="e", padx=(18,6))
@@ -667,13 +4225,17 @@ class App(ctk.CTk):
         ctk.CTkEntry(opt, width=110, textvariable=self.var_bar_len).grid(row=1, column=3, sticky="w")
         ctk.CTkCheckBox(opt, text="Chat sound", variable=self.var_chat_sound).grid(row=1, column=4, padx=6, pady=4, sticky="w")
         ctk.CTkCheckBox(opt, text="HUD transparent", variable=self.var_hud_transparent).grid(row=1, column=5, padx=6, pady=4, sticky="w")
+        ctk.CTkCheckBox(opt, text="Smooth bar", variable=self.var_bar_smooth).grid(row=0, column=5, padx=6, pady=4, sticky="w")
 
         clampf = ctk.CTkFrame(tab_display); clampf.pack(fill="x", padx=12, pady=(6,8))
         ctk.CTkCheckBox(clampf, text="Clamp long title/artist", variable=self.var_clamp_long).grid(row=0, column=0, padx=6, pady=4, sticky="w")
+        ctk.CTkCheckBox(clampf, text="Prefetch next track", variable=self.var_prefetch).grid(row=1, column=0, padx=6, pady=4, sticky="w")
         ctk.CTkLabel(clampf, text="Max title").grid(row=0, column=1, sticky="e", padx=(18,6))
         ctk.CTkEntry(clampf, width=110, textvariable=self.var_max_title).grid(row=0, column=2, sticky="w")
         ctk.CTkLabel(clampf, text="Max artist").grid(row=0, column=3, sticky="e", padx=(18,6))
         ctk.CTkEntry(clampf, width=110, textvariable=self.var_max_artist).grid(row=0, column=4, sticky="w")
+        ctk.CTkLabel(clampf, text="Line width (cols)").grid(row=0, column=5, sticky="e", padx=(18,6))
+        ctk.CTkEntry(clampf, width=90, textvariable=self.var_line_cols).grid(row=0, column=6, sticky="w")
 
         clockf = ctk.CTkFrame(tab_display); clockf.pack(fill="x", padx=12, pady=(6,8))
         ctk.CTkCheckBox(clockf, text="Show current time (extra line)", variable=self.var_clock_line).grid(row=0, column=0, padx=6, pady=4, sticky="w")
@@ -728,6 +4290,22 @@ class App(ctk.CTk):
         self.entry_item_text.pack(fill="x")
         self.entry_item_text.bind("<KeyRelease>", self._on_rot_text_edit)
 
+        self.var_item_weight = ctk.StringVar(value="1"); self.var_item_duration = ctk.StringVar(value="0")
+        self.var_item_window = ctk.StringVar(value=""); self.var_item_when = ctk.StringVar(value="always")
+        meta = ctk.CTkFrame(ctled); meta.pack(fill="x", pady=(6,0))
+        ctk.CTkLabel(meta, text="Weight").grid(row=0, column=0, sticky="e", padx=(0,6))
+        e = ctk.CTkEntry(meta, width=60, textvariable=self.var_item_weight); e.grid(row=0, column=1, sticky="w")
+        e.bind("<KeyRelease>", self._on_rot_text_edit)
+        ctk.CTkLabel(meta, text="Duration (s)").grid(row=0, column=2, sticky="e", padx=(12,6))
+        e = ctk.CTkEntry(meta, width=60, textvariable=self.var_item_duration); e.grid(row=0, column=3, sticky="w")
+        e.bind("<KeyRelease>", self._on_rot_text_edit)
+        ctk.CTkLabel(meta, text="Window").grid(row=1, column=0, sticky="e", padx=(0,6), pady=(4,0))
+        e = ctk.CTkEntry(meta, width=110, placeholder_text="22:00-02:00", textvariable=self.var_item_window)
+        e.grid(row=1, column=1, columnspan=2, sticky="w", pady=(4,0))
+        e.bind("<KeyRelease>", self._on_rot_text_edit)
+        ctk.CTkOptionMenu(meta, values=list(ROTATION_WHEN), variable=self.var_item_when, width=100,
+                          command=lambda _v: self._on_rot_text_edit()).grid(row=1, column=3, sticky="w", pady=(4,0))
+
         btns = ctk.CTkFrame(ctled); btns.pack(fill="x", pady=6)
         ctk.CTkButton(btns, text="Add", command=self._rot_add).pack(side="left", padx=(0,6))
         ctk.CTkButton(btns, text="Delete", command=self._rot_delete).pack(side="left")
@@ -737,6 +4315,7 @@ class App(ctk.CTk):
         ctk.CTkButton(order, text="↓ Move Down", command=self._rot_down).pack(fill="x", pady=3)
 
         self._build_help_tab(tab_help)
+        self._build_stats_tab(tab_stats)
 
         bottom = ctk.CTkFrame(grid, height=180, corner_radius=12)
         bottom.grid(row=1, column=1, sticky="nsew", padx=(8,12), pady=(8,12))
@@ -745,13 +4324,62 @@ class App(ctk.CTk):
         ctk.CTkButton(control, text="Stop", command=self._on_stop, width=120).pack(side="left", padx=(8,0))
         ctk.CTkButton(control, text="Clear Tokens", command=self._clear_tokens).pack(side="left", padx=(16,0))
         ctk.CTkButton(control, text="Reset Config", command=self._reset_config).pack(side="left", padx=(8,0))
+        self.var_record = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(control, text="Record", variable=self.var_record,
+                        command=lambda: self._toggle_recording(self.var_record.get())).pack(side="left", padx=(16,0))
 
         self.txt_log = tk.Text(bottom, height=10); self.txt_log.pack(fill="both", expand=True, padx=12, pady=(4,10))
 
-        self.rotation_items = list(self.cfg.get("rotation_items", []))
+        # Display-Keys → GUI-Variablen (für Profilwechsel)
+        self._display_vars = {
+            "template": self.var_template, "prefix": self.var_prefix, "prefix_text": self.var_prefix_text,
+            "sep_title_artist": self.var_sep, "progress_style": self.var_progress_style,
+            "bar_length": self.var_bar_len, "show_bar": self.var_show_bar, "bar_smooth": self.var_bar_smooth,
+            "hud_transparent": self.var_hud_transparent, "show_title": self.var_title,
+            "show_artist": self.var_artist, "show_time": self.var_time, "time_mode": self.var_time_mode,
+            "time_on_second_line": self.var_time_second_line, "ascii_only": self.var_ascii,
+            "clamp_long": self.var_clamp_long, "max_title_len": self.var_max_title,
+            "max_artist_len": self.var_max_artist, "line_columns": self.var_line_cols,
+            "rotation_enabled": self.var_rot_enabled, "rotation_interval": self.var_rot_interval,
+            "rotation_mode": self.var_rot_mode, "show_clock_line": self.var_clock_line,
+            "clock_24h": self.var_clock_24h, "clock_prefix": self.var_clock_prefix,
+            "show_specs_line": self.var_specs_line, "show_specs_cpu": self.var_specs_cpu,
+            "show_specs_ram": self.var_specs_ram, "show_specs_gpu": self.var_specs_gpu,
+            "ram_in_gb": self.var_specs_ram_gb, "afk_tag_enabled": self.var_afk_tag_enabled,
+            "afk_tag_after": self.var_afk_tag_after, "afk_tag_text": self.var_afk_tag_text,
+        }
+        self._loading_profile = False
+        self.rotation_items = [dict(it) for it in self.cfg["rotation_items"]]
+        if self.cfg.get("active_profile"):
+            self._load_display_vars(self.updater.renderer.cfg)
         self._refresh_rot_list()
         self._update_preview()
 
+    def _start_metrics(self):
+        if not self.cfg.get("metrics_enabled"):
+            return
+        try:
+            port = int(self.cfg.get("metrics_port", 9105))
+            start_metrics_server(port)
+            self._log(f"Metrics on http://127.0.0.1:{port}/metrics")
+        except Exception as e:
+            self._log(f"Metrics server error: {e}")
+
+    def _start_control(self):
+        if not (self.cfg["control_enabled"] or self.cfg["overlay_enabled"]):
+            return
+        try:
+            self.control = ControlServer(self.updater, self.cfg["control_port"],
+                                         token=self.cfg["control_token"], log=self._log_async)
+            if self.cfg["overlay_enabled"]: install_overlay(self.control)
+            self.control.start()
+            self._log(f"Control API on http://127.0.0.1:{self.cfg['control_port']}/status")
+            if self.cfg["overlay_enabled"]:
+                self._log(f"Overlay on http://127.0.0.1:{self.cfg['control_port']}/overlay")
+        except Exception as e:
+            self.control = None
+            self._log(f"Control API error: {e}")
+
     def _redirect_text(self):
         return f"Redirect URI\nhttp://{self.redirect_host}:{self.redirect_port}/callback"
 
@@ -798,33 +4426,45 @@ class App(ctk.CTk):
 
     def _bind_autosave(self):
         def save(*_):
-            self._save_config()
-            self._update_preview()
+            # nicht pro Tastendruck speichern + alle Profile neu kompilieren, sondern nach einer Tipp-Pause
+            if self._loading_profile: return
+            if self._save_job is not None: self.after_cancel(self._save_job)
+            self._save_job = self.after(SAVE_DEBOUNCE_MS, self._autosave)
         for v in (
             self.var_client_id, self.var_ip, self.var_time_mode, self.var_template,
-            self.var_rot_mode, self.var_port, self.var_update, self.var_bar_len,
+            self.var_rot_mode, self.var_port, self.var_osc_listen_port, self.var_update, self.var_bar_len,
             self.var_rot_interval, self.var_prefix_text, self.var_sep,
             self.var_progress_style, self.var_clock_prefix, self.var_afk_interval,
-            self.var_max_title, self.var_max_artist, self.var_afk_tag_after,
+            self.var_max_title, self.var_max_artist, self.var_line_cols, self.var_afk_tag_after,
             self.var_afk_tag_text, self.var_afk_mode
         ):
             v.trace_add("write", save)
         for v in (
-            self.var_save_cid, self.var_prefix, self.var_title, self.var_artist, self.var_time,
+            self.var_save_cid, self.var_osc_listen, self.var_avatar_params, self.var_prefix, self.var_title, self.var_artist, self.var_time,
             self.var_time_second_line, self.var_ascii, self.var_only_changes, self.var_rot_enabled,
             self.var_clock_line, self.var_clock_24h, self.var_afk_enabled, self.var_show_bar,
             self.var_specs_line, self.var_specs_cpu, self.var_specs_ram, self.var_specs_gpu,
-            self.var_specs_ram_gb, self.var_clamp_long, self.var_afk_tag_enabled,
-            self.var_chat_sound, self.var_hud_transparent
+            self.var_specs_ram_gb, self.var_clamp_long, self.var_prefetch, self.var_afk_tag_enabled,
+            self.var_chat_sound, self.var_hud_transparent, self.var_bar_smooth
         ):
             v.trace_add("write", save)
 
+    def _autosave(self):
+        self._save_job = None
+        self._save_config()
+        self._update_preview()
+
     def _save_config(self):
+        if self._save_job is not None:
+            self.after_cancel(self._save_job); self._save_job = None
         cfg = {
             "client_id": self.var_client_id.get().strip(),
             "save_client_id": bool(self.var_save_cid.get()),
             "ip": self.var_ip.get().strip(),
             "port": self.get_int(self.var_port, self.cfg.get("port", 9000), 1, 65535),
+            "osc_listen_enabled": bool(self.var_osc_listen.get()),
+            "avatar_params_enabled": bool(self.var_avatar_params.get()),
+            "osc_listen_port": self.get_int(self.var_osc_listen_port, self.cfg.get("osc_listen_port", 9001), 1, 65535),
             "update_interval": self.get_int(self.var_update, self.cfg.get("update_interval", 3), 1, 120),
 
             "bar_length": self.get_int(self.var_bar_len, self.cfg.get("bar_length", 20), 4, 60),
@@ -861,60 +4501,167 @@ class App(ctk.CTk):
             "show_specs_gpu": bool(self.var_specs_gpu.get()),
             "ram_in_gb": bool(self.var_specs_ram_gb.get()),
 
+            "prefetch_queue": bool(self.var_prefetch.get()),
             "clamp_long": bool(self.var_clamp_long.get()),
             "max_title_len": self.get_int(self.var_max_title, self.cfg.get("max_title_len", 28), 6, 80),
             "max_artist_len": self.get_int(self.var_max_artist, self.cfg.get("max_artist_len", 28), 6, 80),
+            "line_columns": self.get_int(self.var_line_cols, self.cfg.get("line_columns", 0), 0, 144),
 
             "afk_tag_enabled": bool(self.var_afk_tag_enabled.get()),
             "afk_tag_after": self.get_int(self.var_afk_tag_after, self.cfg.get("afk_tag_after", 120), 10, 36000),
             "afk_tag_text": self.var_afk_tag_text.get().strip() or "[AFK]",
 
             "chat_sound": bool(self.var_chat_sound.get()),
-            "hud_transparent": bool(self.var_hud_transparent.get())
+            "hud_transparent": bool(self.var_hud_transparent.get()),
+            "bar_smooth": bool(self.var_bar_smooth.get())
         }
+        # Aktives Profil: Display-Felder gehören dem Profil, die Basis-Werte bleiben wie sie sind
+        active = self.cfg.get("active_profile") or ""
+        profiles = dict(self.cfg.get("profiles") or {})
+        if active in profiles:
+            profiles[active] = {k: cfg[k] for k in PROFILE_KEYS}
+            profiles[active]["rotation_items"] = list(self.rotation_items)
+            for k in PROFILE_KEYS:
+                cfg[k] = self.cfg.get(k, APP_DEFAULTS.get(k))
+        cfg["profiles"] = profiles
+        cfg["active_profile"] = active if active in profiles else ""
+        # Keys ohne GUI-Feld (z.B. slot_intervals) beibehalten
+        for k, v in self.cfg.items():
+            cfg.setdefault(k, v)
+        cfg = validate_config(cfg)
+        config_save(cfg); self.cfg = cfg
+        self.updater.set_config(cfg)
+
+    # ------------------- Profiles -------------------
+
+    def _load_display_vars(self, values):
+        self._loading_profile = True
+        try:
+            for k, var in self._display_vars.items():
+                if k not in values: continue
+                var.set(bool(values[k]) if isinstance(var, tk.BooleanVar) else str(values[k]))
+            self.rotation_items = [dict(it) for it in values.get("rotation_items") or ()]
+        finally:
+            self._loading_profile = False
+
+    def _show_profile(self, name):
+        # Umschalten über den Updater (No-op, wenn per OSC schon aktiv), Config persistieren, Formular nachziehen
+        self.updater.switch_profile(name)
+        cfg = validate_config(dict(self.cfg, active_profile=name))
+        config_save(cfg); self.cfg = cfg
+        self.var_profile.set(name or PROFILE_BASE)
+        self._load_display_vars(profile_settings(cfg, name))
+        self._refresh_rot_list(); self._update_preview()
+
+    def _on_profile_select(self, choice):
+        name = "" if choice == PROFILE_BASE else choice
+        if name == (self.cfg.get("active_profile") or ""): return
+        if name in self.updater.renderer.profiles:
+            self._show_profile(name); self._log(f"Profile: {choice}")
+        else:
+            self.var_profile.set(self.cfg.get("active_profile") or PROFILE_BASE)
+
+    def _profile_save_as(self):
+        name = (ctk.CTkInputDialog(text="Profile name", title="Save profile").get_input() or "").strip()
+        if not name or name == PROFILE_BASE: return
+        self._save_config()
+        cfg = dict(self.cfg)
+        eff = profile_settings(cfg, cfg.get("active_profile") or "")
+        cfg["profiles"] = dict(cfg.get("profiles") or {})
+        cfg["profiles"][name] = {k: eff.get(k) for k in PROFILE_KEYS}
+        cfg["active_profile"] = name
+        cfg = validate_config(cfg)
+        config_save(cfg); self.cfg = cfg
+        self.updater.set_config(cfg)
+        self.profile_menu.configure(values=[PROFILE_BASE] + profile_names(cfg))
+        self.var_profile.set(name)
+        self._log(f"Profile saved: {name}")
+
+    def _profile_delete(self):
+        name = self.cfg.get("active_profile") or ""
+        if not name:
+            self._log("Base settings can't be deleted"); return
+        cfg = dict(self.cfg)
+        cfg["profiles"] = {k: v for k, v in (cfg.get("profiles") or {}).items() if k != name}
+        cfg["active_profile"] = ""
+        cfg = validate_config(cfg)
         config_save(cfg); self.cfg = cfg
+        self.updater.set_config(cfg)
+        self.profile_menu.configure(values=[PROFILE_BASE] + profile_names(cfg))
+        self.var_profile.set(PROFILE_BASE)
+        self._load_display_vars(cfg)
+        self._refresh_rot_list(); self._update_preview()
+        self._log(f"Profile deleted: {name}")
 
     def _reset_config(self):
         try:
             if os.path.exists(CONFIG_FILE): os.remove(CONFIG_FILE)
             self.cfg = config_load()
-            self.var_client_id.set(self.cfg["client_id"]); self.var_save_cid.set(self.cfg["save_client_id"])
-            self.var_ip.set(self.cfg["ip"]); self.var_port.set(str(self.cfg["port"]))
-            self.var_update.set(str(self.cfg["update_interval"])); self.var_bar_len.set(str(self.cfg["bar_length"]))
-            self.var_show_bar.set(self.cfg["show_bar"])
-            self.var_prefix.set(self.cfg["prefix"]); self.var_prefix_text.set(self.cfg["prefix_text"])
-            self.var_sep.set(self.cfg["sep_title_artist"]); self.var_progress_style.set(self.cfg["progress_style"])
-            self.var_title.set(self.cfg["show_title"]); self.var_artist.set(self.cfg["show_artist"])
-            self.var_time.set(self.cfg["show_time"]); self.var_time_mode.set(self.cfg["time_mode"])
-            self.var_time_second_line.set(self.cfg["time_on_second_line"])
-            self.var_ascii.set(self.cfg["ascii_only"]); self.var_only_changes.set(self.cfg["only_changes"])
-            self.var_template.set(self.cfg["template"])
-            self.var_rot_enabled.set(self.cfg["rotation_enabled"]); self.var_rot_interval.set(str(self.cfg["rotation_interval"]))
-            self.var_rot_mode.set(self.cfg["rotation_mode"])
-            self.var_clock_line.set(self.cfg["show_clock_line"])
-            self.var_clock_24h.set(self.cfg["clock_24h"]); self.var_clock_prefix.set(self.cfg["clock_prefix"])
-            self.var_afk_enabled.set(self.cfg["anti_afk_enabled"]); self.var_afk_interval.set(str(self.cfg["anti_afk_interval"]))
-            self.var_afk_mode.set(self.cfg["anti_afk_mode"])
-            self.var_specs_line.set(self.cfg["show_specs_line"])
-            self.var_specs_cpu.set(self.cfg["show_specs_cpu"]); self.var_specs_ram.set(self.cfg["show_specs_ram"]); self.var_specs_gpu.set(self.cfg["show_specs_gpu"])
-            self.var_specs_ram_gb.set(self.cfg["ram_in_gb"])
-            self.var_clamp_long.set(self.cfg["clamp_long"])
-            self.var_max_title.set(str(self.cfg["max_title_len"])); self.var_max_artist.set(str(self.cfg["max_artist_len"]))
-            self.var_afk_tag_enabled.set(self.cfg["afk_tag_enabled"])
-            self.var_afk_tag_after.set(str(self.cfg["afk_tag_after"]))
-            self.var_afk_tag_text.set(self.cfg["afk_tag_text"])
-            self.var_chat_sound.set(self.cfg["chat_sound"])
-            self.var_hud_transparent.set(self.cfg["hud_transparent"])
-            self.rotation_items = list(self.cfg["rotation_items"])
-            self._refresh_rot_list(); self._update_preview(); self._save_config()
+            self._load_form(self.cfg); self._save_config()
             self._log("Config reset")
         except Exception as e:
             self._log(f"Reset config error: {e}")
 
+    def _load_form(self, cfg):
+        # Formular komplett aus einer Config füllen, ohne Autosave auszulösen
+        self._loading_profile = True
+        try:
+            self.var_client_id.set(cfg["client_id"]); self.var_save_cid.set(cfg["save_client_id"])
+            self.var_ip.set(cfg["ip"]); self.var_port.set(str(cfg["port"]))
+            self.var_osc_listen.set(cfg["osc_listen_enabled"]); self.var_osc_listen_port.set(str(cfg["osc_listen_port"]))
+            self.var_avatar_params.set(cfg["avatar_params_enabled"])
+            self.var_update.set(str(cfg["update_interval"])); self.var_bar_len.set(str(cfg["bar_length"]))
+            self.var_show_bar.set(cfg["show_bar"])
+            self.var_prefix.set(cfg["prefix"]); self.var_prefix_text.set(cfg["prefix_text"])
+            self.var_sep.set(cfg["sep_title_artist"]); self.var_progress_style.set(cfg["progress_style"])
+            self.var_title.set(cfg["show_title"]); self.var_artist.set(cfg["show_artist"])
+            self.var_time.set(cfg["show_time"]); self.var_time_mode.set(cfg["time_mode"])
+            self.var_time_second_line.set(cfg["time_on_second_line"])
+            self.var_ascii.set(cfg["ascii_only"]); self.var_only_changes.set(cfg["only_changes"])
+            self.var_template.set(cfg["template"])
+            self.var_rot_enabled.set(cfg["rotation_enabled"]); self.var_rot_interval.set(str(cfg["rotation_interval"]))
+            self.var_rot_mode.set(cfg["rotation_mode"])
+            self.var_clock_line.set(cfg["show_clock_line"])
+            self.var_clock_24h.set(cfg["clock_24h"]); self.var_clock_prefix.set(cfg["clock_prefix"])
+            self.var_afk_enabled.set(cfg["anti_afk_enabled"]); self.var_afk_interval.set(str(cfg["anti_afk_interval"]))
+            self.var_afk_mode.set(cfg["anti_afk_mode"])
+            self.var_specs_line.set(cfg["show_specs_line"])
+            self.var_specs_cpu.set(cfg["show_specs_cpu"]); self.var_specs_ram.set(cfg["show_specs_ram"]); self.var_specs_gpu.set(cfg["show_specs_gpu"])
+            self.var_specs_ram_gb.set(cfg["ram_in_gb"])
+            self.var_clamp_long.set(cfg["clamp_long"]); self.var_prefetch.set(cfg["prefetch_queue"])
+            self.var_max_title.set(str(cfg["max_title_len"])); self.var_max_artist.set(str(cfg["max_artist_len"]))
+            self.var_line_cols.set(str(cfg["line_columns"]))
+            self.var_afk_tag_enabled.set(cfg["afk_tag_enabled"])
+            self.var_afk_tag_after.set(str(cfg["afk_tag_after"]))
+            self.var_afk_tag_text.set(cfg["afk_tag_text"])
+            self.var_chat_sound.set(cfg["chat_sound"])
+            self.var_hud_transparent.set(cfg["hud_transparent"])
+            self.var_bar_smooth.set(cfg["bar_smooth"])
+            self.rotation_items = [dict(it) for it in cfg["rotation_items"]]
+            self.profile_menu.configure(values=[PROFILE_BASE] + profile_names(cfg))
+            self.var_profile.set(cfg["active_profile"] or PROFILE_BASE)
+        finally:
+            self._loading_profile = False
+        if cfg["active_profile"]:
+            self._load_display_vars(self.updater.renderer.cfg)
+        self._refresh_rot_list(); self._update_preview()
+
+    def _config_changed_async(self, cfg, problems):
+        self.after(0, self._apply_external_config, cfg, problems)
+
+    def _apply_external_config(self, cfg, problems):
+        # config.json wurde von außen geändert (Editor, Deploy-Skript)
+        if not cfg["client_id"] and self.cfg["client_id"] and not cfg["save_client_id"]:
+            cfg = validate_config(dict(cfg, client_id=self.cfg["client_id"]))   # ID steht dann nicht in der Datei
+        self.cfg = cfg
+        self.updater.set_config(cfg)
+        self._load_form(cfg)
+        for p in problems: self._log(p)
+        self._log("Config reloaded from disk")
+
     def _clear_tokens(self):
         try:
-            if os.path.exists(TOKEN_FILE): os.remove(TOKEN_FILE)
-            self.tokens = {}; self.lbl_auth.configure(text="Auth: required")
+            TOKENS.clear()       # Updater und Auth-Label hängen am Store
             self._log("Tokens cleared")
         except Exception as e:
             self._log(f"Clear tokens error: {e}")
@@ -922,321 +4669,88 @@ class App(ctk.CTk):
     # ------------------- Spotify login -------------------
 
     def _on_spotify_login(self):
-        try:
-            cid = self.var_client_id.get().strip()
-            if not cid:
-                self._log("Client ID missing"); return
-            self._log("Starting local callback server...")
-            self.tokens = authorize_pkce(cid, self.redirect_host, self.redirect_port, ui_log=self._log)
-            self.lbl_auth.configure(text="Auth: ok")
-            self._log("Spotify authorized")
-        except Exception as e:
-            self.lbl_auth.configure(text="Auth: failed"); self._log(f"Auth error: {e}")
-
-    # ------------------- OSC helpers ---------------------
-
-    def _ensure_osc(self):
-        if self.osc is None:
-            port = self.get_int(self.var_port, self.cfg.get("port", 9000), 1, 65535)
-            self.osc = SimpleUDPClient(self.var_ip.get().strip(), port)
-
-    def _send_jump(self):
-        try:
-            self._ensure_osc()
-            self.osc.send_message(INPUT_JUMP, [True])
-            time.sleep(0.1)
-            self.osc.send_message(INPUT_JUMP, [False])
-            return True
-        except Exception as e:
-            self._log(f"Jump error: {e}"); return False
-
-    def _send_wiggle(self):
-        try:
-            self._ensure_osc()
-            for path in ("/input/Vertical", "/input/MoveForward"):
-                try: self.osc.send_message(path, 1.0)
-                except Exception: pass
-            time.sleep(0.12)
-            for path in ("/input/Vertical", "/input/MoveForward"):
-                try: self.osc.send_message(path, 0.0)
-                except Exception: pass
-            return True
-        except Exception as e:
-            self._log(f"Wiggle error: {e}"); return False
-
-    def _send_chatbox_raw(self, text):
-        self._ensure_osc()
-        try:
-            play_sound = bool(self.var_chat_sound.get())
-            self.osc.send_message(CHATBOX_INPUT, [text, True, play_sound])
-        except:
-            self.osc.send_message(CHATBOX_INPUT, [text, True])
-
-    def _send_chatbox(self, text):
-        try:
-            self._send_chatbox_raw(text); return True
-        except Exception as e:
-            self._log(f"Send error: {e}"); return False
-
-    def _send_typing(self, value):
-        try:
-            self._ensure_osc(); self.osc.send_message(CHATBOX_TYPING, [bool(value)]); return True
-        except Exception as e:
-            self._log(f"Typing error: {e}"); return False
+        # Läuft ein Login, wirkt der Button als Abbrechen
+        if self._auth_flow is not None and self._auth_flow.running:
+            self._auth_flow.cancel(); return
+        cid = self.var_client_id.get().strip()
+        if not cid:
+            self._log("Client ID missing"); return
+        self._auth_flow = AuthFlow(cid, self.redirect_host, self.redirect_port,
+                                   on_progress=self._auth_progress_async, on_done=self._auth_done_async,
+                                   ui_log=self._log_async).start()
+        self.btn_login.configure(text="Cancel sign-in")
+
+    def _auth_progress_async(self, stage, text):
+        self._log_async(text)
+        label = {"waiting": "Auth: waiting…", "exchanging": "Auth: exchanging…", "failed": "Auth: failed"}.get(stage)
+        if label: self._status_async("auth", label)
+
+    def _auth_done_async(self, tokens, error):
+        def done():
+            # neue Tokens kommen über den TokenStore beim Updater an
+            self.btn_login.configure(text="Sign in to Spotify")
+            if not tokens and error is None:
+                self.lbl_auth.configure(text="Auth: required" if not self.updater.tokens else "Auth: ok")
+        self.after(0, done)
 
     # ---- UI test buttons ----
     def _on_test(self):
-        main, time_line = self._render_spotify_lines(self.last_item, self.last_progress, self.last_duration)
-        final = self._compose_full(main, time_line)
+        final = self.updater.preview()
         if not final: final = "Test"
-        if self._send_chatbox(final): self._log("Test sent")
+        if self.updater.send_chatbox(final): self._log("Test sent")
 
     def _on_typing_test(self):
-        if self._send_typing(True):
+        if self.updater.send_typing(True):
             self._log("Typing on")
             def off():
-                self._send_typing(False)
-                self._log("Typing off")
-            threading.Timer(3.0, off).start()
+                self.updater.send_typing(False)
+                self._log_async("Typing off")
+            self.updater.scheduler.call_later(3.0, off)
 
     def _on_jump_test(self):
-        if self._send_jump(): self._log("Jump sent")
+        if self.updater.send_jump(): self._log("Jump sent")
 
     def _reset_template(self):
         self.var_template.set(APP_DEFAULTS["template"]); self._save_config(); self._update_preview()
 
-    # ------------------- Renderers -----------------------
-
-    def _apply_clamp(self, title, artist):
-        if not self.var_clamp_long.get():
-            return title, artist
-        mt = self.get_int(self.var_max_title, self.cfg.get("max_title_len", 28), 6, 80)
-        ma = self.get_int(self.var_max_artist, self.cfg.get("max_artist_len", 28), 6, 80)
-        return shorten(title, mt), shorten(artist, ma)
-
-    def _render_spotify_lines(self, item, progress_ms, duration_ms):
-        tpl = (self.var_template.get().strip() or APP_DEFAULTS["template"]).replace("{newline}", "\n")
-        prefix_text = (self.var_prefix_text.get() if self.var_prefix.get() else "").strip()
-        sep = self.var_sep.get()
-        if item is None:
-            main = tpl
-            main = main.replace("{prefix}", prefix_text)
-            main = main.replace("{title}","").replace("{artist}","")
-            main = main.replace("{sep}", "" if not sep else sep)
-            main = main.replace("{bar}","")
-            main = main.replace("{position}","").replace("{duration}","").replace("{elapsed}","").replace("{remaining}","")
-            main = normalize_spaces_keep_newlines(main)
-            main = clamp_ascii(main) if self.var_ascii.get() else main
-            return trim_each_line(main), ""
-        raw_title = item.get("name","")
-        raw_artist = ", ".join([a.get("name","") for a in item.get("artists",[])])
-        title, artist = self._apply_clamp(raw_title, raw_artist)
-        ps = self.var_progress_style.get()
-        show_bar = self.var_show_bar.get()
-        inline_times_requested = (ps == "hud") and self.var_time.get()
-        if show_bar:
-            bar = build_bar(
-                progress_ms, duration_ms,
-                self.get_int(self.var_bar_len, 20, 4, 60),
-                ps, self.var_ascii.get(),
-                inline_times=inline_times_requested,
-                hud_transparent=self.var_hud_transparent.get()
-            )
-        else:
-            bar = ""
-        position = ms_to_clock(progress_ms); duration = ms_to_clock(duration_ms)
-        elapsed = position; remaining = ms_to_clock(max(0, duration_ms - progress_ms))
-        main = tpl
-        main = main.replace("{prefix}", prefix_text)
-        main = main.replace("{title}", title if self.var_title.get() else "")
-        main = main.replace("{artist}", artist if self.var_artist.get() else "")
-        main = main.replace("{sep}", sep if (self.var_title.get() and self.var_artist.get()) else "")
-        main = main.replace("{bar}", bar)
-        if self.var_time.get() and not self.var_time_second_line.get() and not inline_times_requested:
-            main = main.replace("{position}", position).replace("{duration}", duration)
-            main = main.replace("{elapsed}", elapsed if self.var_time_mode.get() in ("elapsed","both") else "")
-            main = main.replace("{remaining}", ("-" + remaining) if self.var_time_mode.get() in ("remaining","both") else "")
-        else:
-            main = main.replace("{position}","").replace("{duration}","").replace("{elapsed}","").replace("{remaining}","")
-        main = normalize_spaces_keep_newlines(main)
-        main = clamp_ascii(main) if self.var_ascii.get() else main
-        main = trim_each_line(main)
-        time_line = ""
-        if self.var_time.get() and self.var_time_second_line.get() and not inline_times_requested:
-            if self.var_time_mode.get() == "elapsed":
-                time_line = elapsed
-            elif self.var_time_mode.get() == "remaining":
-                time_line = "-" + remaining
-            else:
-                time_line = f"{elapsed} / {duration}"
-            time_line = clamp_ascii(time_line) if self.var_ascii.get() else time_line
-            time_line = trim_chatbox(time_line)
-        return main, time_line
-
-    def _render_rotation_item(self, txt):
-        t = (txt or "").strip()
-        if not t: return ""
-        t = t.replace("{newline}", "\n")
-        backup = self.var_template.get()
-        try:
-            self.var_template.set(t)
-            m, _ = self._render_spotify_lines(self.last_item, self.last_progress, self.last_duration)
-            return m
-        finally:
-            self.var_template.set(backup)
-
-    def _clock_line(self):
-        if not self.var_clock_line.get(): return ""
-        now = datetime.datetime.now()
-        fmt = "%H:%M:%S" if self.var_clock_24h.get() else "%I:%M:%S %p"
-        prefix = (self.var_clock_prefix.get() or "").strip()
-        s = f"{prefix} {now.strftime(fmt)}".strip() if prefix else now.strftime(fmt)
-        s = clamp_ascii(s) if self.var_ascii.get() else s
-        return trim_chatbox(s)
-
-    def _specs_line(self):
-        if not self.var_specs_line.get():
-            return ""
-        now = time.monotonic()
-        cached, ts = self._last_specs
-        if now - ts < 1.0 and cached:
-            return cached
-        cpu, ram, gpu = read_specs()
-        line = fmt_specs(cpu, ram, gpu,
-                         self.var_specs_cpu.get(), self.var_specs_ram.get(), self.var_specs_gpu.get(),
-                         self.var_specs_ram_gb.get(), self.var_ascii.get())
-        line = trim_chatbox(line)
-        self._last_specs = (line, now)
-        return line
-
-    def _afk_tag_if_needed(self, text):
-        if not self.var_afk_tag_enabled.get():
-            return text
-        try:
-            idle_s = get_idle_seconds()
-            if idle_s >= self.get_int(self.var_afk_tag_after, self.cfg.get("afk_tag_after", 120), 10, 36000):
-                tag = self.var_afk_tag_text.get().strip() or "[AFK]"
-                candidate = (text + " " + tag).strip()
-                return trim_chatbox(candidate)
-        except Exception:
-            pass
-        return text
-
-    def _compose_full(self, spotify_main, spotify_time_line):
-        rot_mode = self.var_rot_mode.get()
-        txts = []
-        base_line = spotify_main
-        base_line = self._afk_tag_if_needed(base_line)
-
-        if self.var_rot_enabled.get() and self.current_rot_text:
-            if rot_mode == "standalone":
-                txts.append(self.current_rot_text)
-            elif rot_mode == "prepend":
-                line = f"{self.current_rot_text} {base_line}".strip()
-                txts.append(trim_chatbox(line))
-            elif rot_mode == "append":
-                line = f"{base_line} {self.current_rot_text}".strip()
-                txts.append(trim_chatbox(line))
-            else:
-                txts.append(self.current_rot_text)
-                txts.append(base_line)
-        else:
-            txts.append(base_line)
-
-        if self.var_time_second_line.get() and spotify_time_line:
-            txts.append(spotify_time_line)
-
-        specs = self._specs_line()
-        if specs:
-            txts.append(specs)
-
-        clock = self._clock_line()
-        if clock:
-            txts.append(clock)
-        return "\n".join([t for t in txts if t]).strip()
-
     def _update_preview(self):
-        m, tline = self._render_spotify_lines(self.last_item, self.last_progress, self.last_duration)
-        self.var_preview.set(self._compose_full(m, tline))
+        self.var_preview.set(self.updater.preview())
 
     # ------------------- Loop ----------------------------
 
     def _on_start(self):
-        if self.running: return
+        if self.updater.running: return
         try:
-            self._ensure_osc()
-            self.running = True
-            self.last_message = ""; self.last_track_id = ""; self.rot_idx = 0
-            self.next_rotate_at = time.monotonic(); self.current_rot_text = ""
-            now = time.monotonic()
-            afk_iv = max(5, self.get_int(self.var_afk_interval, self.cfg.get("anti_afk_interval", 240), 5, 3600))
-            self.next_afk_at = now + afk_iv if self.var_afk_enabled.get() else now + 10**9
-            self.worker = threading.Thread(target=self._loop, daemon=True); self.worker.start()
+            self.updater.start()
             self._log("Updater started")
         except Exception as e:
             self._log(f"Start error: {e}")
 
     def _on_stop(self):
-        self.running = False; self._log("Updater stopped")
+        self.updater.stop(); self._log("Updater stopped")
 
-    def _loop(self):
-        while self.running:
-            try:
-                if not self.tokens or token_expired(self.tokens):
-                    try:
-                        self.tokens = refresh_token(self.tokens)
-                    except Exception as e:
-                        self.lbl_auth.configure(text="Auth: required"); self._log(f"Token refresh failed: {e}")
-                        time.sleep(max(1, self.get_int(self.var_update, 3, 1, 120))); continue
-
-                pb = get_current_playback(self.tokens.get("access_token",""))
-                if pb == "unauthorized":
-                    self.lbl_auth.configure(text="Auth: required"); self._log("Access revoked or expired")
-                    time.sleep(max(1, self.get_int(self.var_update, 3, 1, 120))); continue
-
-                if not pb or not pb.get("item"):
-                    self.lbl_pb.configure(text="Playback: none")
-                    self.last_item = None; self.last_progress = 0; self.last_duration = 0
-                else:
-                    item = pb["item"]
-                    self.last_item = item
-                    self.last_progress = pb.get("progress_ms", 0)
-                    self.last_duration = item.get("duration_ms", 0)
-                    self.lbl_pb.configure(text="Playback: playing" if pb.get("is_playing", False) else "Playback: paused")
-
-                spotify_main, time_line = self._render_spotify_lines(self.last_item, self.last_progress, self.last_duration)
+    def _toggle_recording(self, on):
+        try:
+            if on:
+                self._log(f"Recording to {self.updater.start_recording()}")
+            else:
+                path = self.updater.stop_recording()
+                if path: self._log(f"Recording saved: {path}")
+            self.var_record.set(bool(on))
+        except Exception as e:
+            self._log(f"Recording error: {e}")
 
-                now = time.monotonic()
-                rotated = False
-                if self.var_rot_enabled.get() and len(self.rotation_items) > 0 and now >= self.next_rotate_at:
-                    self.next_rotate_at = now + max(1, self.get_int(self.var_rot_interval, 6, 1, 3600))
-                    it = self.rotation_items[self.rot_idx % len(self.rotation_items)]
-                    self.rot_idx += 1
-                    self.current_rot_text = self._render_rotation_item(it.get("text",""))
-                    final_text = self._compose_full(spotify_main, time_line)
-                    if final_text and self._send_chatbox(final_text):
-                        self.last_message = final_text; rotated = True
-
-                track_id = (self.last_item or {}).get("id","")
-                combined = self._compose_full(spotify_main, time_line)
-                if not rotated and (not self.var_only_changes.get() or combined != self.last_message or track_id != self.last_track_id):
-                    if self._send_chatbox(combined):
-                        self.last_message = combined; self.last_track_id = track_id
-
-                # Anti-AFK
-                if self.var_afk_enabled.get() and now >= self.next_afk_at:
-                    ok = self._send_jump() if self.var_afk_mode.get() == "jump" else self._send_wiggle()
-                    if ok:
-                        self._log(f"Anti-AFK pulse ({self.var_afk_mode.get()})")
-                    afk_iv = max(5, self.get_int(self.var_afk_interval, self.cfg.get("anti_afk_interval", 240), 5, 3600))
-                    self.next_afk_at = now + afk_iv
-
-                self._update_preview()
+    # Callbacks aus dem Worker-Thread → in den Tk-Thread umleiten
+    def _log_async(self, s):
+        self.after(0, self._log, s)
 
-            except Exception as e:
-                self._log(f"Loop error: {e}")
+    def _status_async(self, kind, text):
+        lbl = {"auth": self.lbl_auth, "playback": self.lbl_pb}.get(kind)
+        if lbl is not None:
+            self.after(0, lambda: lbl.configure(text=text))
 
-            time.sleep(max(1, self.get_int(self.var_update, 3, 1, 120)))
+    def _frame_async(self, text):
+        self.after(0, self.var_preview.set, text)
 
     # ---------------- Rotator UI ------------------------
 
@@ -1245,28 +4759,45 @@ class App(ctk.CTk):
         for i, it in enumerate(self.rotation_items):
             txt = it.get("text","").replace("\n"," ")
             if len(txt) > 80: txt = txt[:77]+"…"
-            self.listbox.insert("end", f"{i+1:02d} {txt}")
+            tags = [f"x{it['weight']}" if it.get("weight", 1) != 1 else "",
+                    f"{it['duration']}s" if it.get("duration") else "",
+                    it.get("window", ""), it.get("when", "") if it.get("when", "always") != "always" else ""]
+            tags = ", ".join(t for t in tags if t)
+            self.listbox.insert("end", f"{i+1:02d} {txt}" + (f"  [{tags}]" if tags else ""))
 
     def _load_selected_rotation_item(self):
         sel = self.listbox.curselection()
         if not sel: return
         idx = sel[0]; it = self.rotation_items[idx]
         self.entry_item_text.delete("1.0","end"); self.entry_item_text.insert("1.0", it.get("text",""))
+        self.var_item_weight.set(str(it.get("weight", 1))); self.var_item_duration.set(str(it.get("duration", 0)))
+        self.var_item_window.set(it.get("window", "")); self.var_item_when.set(it.get("when", "always"))
+
+    def _rot_item_from_form(self):
+        it = {"text": self.entry_item_text.get("1.0","end").strip()}
+        weight = self.get_int(self.var_item_weight, 1, 1, ROTATION_MAX_WEIGHT)
+        duration = self.get_int(self.var_item_duration, 0, 0, 3600)
+        window = self.var_item_window.get().strip(); when = self.var_item_when.get()
+        # nur abweichende Werte speichern, damit einfache Einträge {"text": ...} bleiben
+        if weight != 1: it["weight"] = weight
+        if duration: it["duration"] = duration
+        if parse_time_window(window): it["window"] = window
+        if when != "always": it["when"] = when
+        return it
 
     def _on_rot_text_edit(self, _event=None):
         sel = self.listbox.curselection()
         if not sel: return
         idx = sel[0]
-        text = self.entry_item_text.get("1.0","end").strip()
-        self.rotation_items[idx] = {"text": text}
+        self.rotation_items[idx] = self._rot_item_from_form()
         self._refresh_rot_list()
         self.listbox.select_set(idx)
         self._save_config()
 
     def _rot_add(self):
-        text = self.entry_item_text.get("1.0","end").strip()
-        if not text: return
-        self.rotation_items.append({"text": text})
+        it = self._rot_item_from_form()
+        if not it["text"]: return
+        self.rotation_items.append(it)
         self._refresh_rot_list(); self.listbox.select_clear(0, "end"); self.listbox.select_set(len(self.rotation_items)-1)
         self._save_config()
 
@@ -1306,23 +4837,122 @@ class App(ctk.CTk):
         ctk.CTkButton(bar, text="Copy help", command=self._copy_help_text, width=120).pack(side="left")
         ctk.CTkButton(bar, text="Open data folder", command=self._open_data_dir, width=160).pack(side="left", padx=(8,0))
 
+    def _build_stats_tab(self, tab):
+        self.var_stats = ctk.StringVar(value="")
+        ctk.CTkLabel(tab, textvariable=self.var_stats, justify="left", anchor="nw",
+                     font=ctk.CTkFont(family="Consolas", size=13)).pack(fill="both", expand=True, padx=12, pady=12)
+
+    def _scan_processes(self):
+        # Prozessliste durchgehen dauert je nach System 50–500 ms → eigener Thread, Tk holt nur das Ergebnis ab
+        try:
+            sp = detect_process_any(["spotify.exe","spotify"])
+            vr = detect_process_any(["vrchat.exe","vrchat","vrchatclient.exe"])
+            self._proc_state.append((sp, vr))
+        finally:
+            self._proc_scanning = False
+
     def _update_status_loop(self):
-        sp = detect_process_any(["spotify.exe","spotify"])
-        self.lbl_sp.configure(text="Spotify: active" if sp else "Spotify: not found" if sp is False else "Spotify: unknown")
-        vr = detect_process_any(["vrchat.exe","vrchat","vrchatclient.exe"])
-        self.lbl_vr.configure(text="VRChat: active" if vr else "VRChat: not found" if vr is False else "VRChat: unknown")
-        if not self.tokens:
-            self.lbl_auth.configure(text="Auth: required")
-        else:
-            self.lbl_auth.configure(text="Auth: renew" if token_expired(self.tokens) else "Auth: ok")
-        self.after(1200, self._update_status_loop)
+        if self._proc_state:
+            sp, vr = self._proc_state.popleft()
+            self.lbl_sp.configure(text="Spotify: active" if sp else "Spotify: not found" if sp is False else "Spotify: unknown")
+            self.lbl_vr.configure(text="VRChat: active" if vr else "VRChat: not found" if vr is False else "VRChat: unknown")
+        if not self._proc_scanning:
+            self._proc_scanning = True
+            threading.Thread(target=self._scan_processes, name="proc-scan", daemon=True).start()
+        self.var_stats.set("\n".join(self.updater.metrics.summary_lines()) or "No data yet – press Start")
+        name = self.updater.renderer.profile.name
+        if name != (self.cfg.get("active_profile") or ""):
+            self._show_profile(name)      # per OSC umgeschaltet
+        self._status_job = self.after(int(STATUS_INTERVAL * 1000), self._update_status_loop)
+
+def run_headless(record=False, profile=None):
+    problems = []
+    cfg = config_load(problems)
+    def log(s):
+        print(time.strftime("[%H:%M:%S] ") + s, flush=True)
+    for p in problems: log(p)
+    if profile is not None:
+        if profile and profile not in profile_names(cfg):
+            log(f"Unknown profile: {profile}")
+            return 1
+        cfg = validate_config(dict(cfg, active_profile=profile))
+    if cfg["sessions"]:
+        return run_sessions(cfg, record=record, log=log)
+    last_status = {}
+    def on_status(kind, text):
+        if last_status.get(kind) != text:
+            last_status[kind] = text; log(text)
+    tokens = TOKENS.get()
+    if TOKENS.load_error:
+        log(f"Token file unreadable: {TOKENS.load_error}")
+    if not tokens.get("refresh_token"):
+        cid = str(cfg.get("client_id", "")).strip()
+        if not cid:
+            log("No tokens and no client_id in config – sign in once via the GUI or set client_id")
+            return 1
+        try:
+            tokens = authorize_pkce(cid, DEFAULT_REDIRECT_HOST, DEFAULT_REDIRECT_PORT, ui_log=log)
+        finally:
+            CALLBACKS.close()
+    if cfg.get("metrics_enabled"):
+        port = int(cfg.get("metrics_port", 9105))
+        start_metrics_server(port)
+        log(f"Metrics on http://127.0.0.1:{port}/metrics")
+    updater = Updater(cfg, TOKENS, log=log, on_status=on_status)
+    control = None
+    if cfg["control_enabled"] or cfg["overlay_enabled"]:
+        control = ControlServer(updater, cfg["control_port"], token=cfg["control_token"], log=log)
+        if cfg["overlay_enabled"]: install_overlay(control)
+        control.start()
+        log(f"Control API on http://127.0.0.1:{cfg['control_port']}/status")
+        if cfg["overlay_enabled"]:
+            log(f"Overlay on http://127.0.0.1:{cfg['control_port']}/overlay")
+    def reload(new, problems):
+        for p in problems: log(p)
+        if profile is not None and (not profile or profile in profile_names(new)):
+            new = validate_config(dict(new, active_profile=profile))    # --profile hat Vorrang
+        updater.set_config(new); log("Config reloaded from disk")
+    watcher = ConfigWatcher(reload, log=log)
+    watcher.start()
+    if record:
+        log(f"Recording to {updater.start_recording()}")
+    updater.start()
+    log("Updater started (headless, Ctrl+C to stop)")
+    try:
+        while updater.running:
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    watcher.stop(); updater.stop(); updater.stop_recording(); log("Updater stopped")
+    if control is not None: control.stop()
+    return 0
 
 def main():
+    ap = argparse.ArgumentParser(description="VRChat Spotify Status")
+    ap.add_argument("--headless", action="store_true", help="run the updater without GUI")
+    ap.add_argument("--record", action="store_true", help="record Spotify responses and OSC output to recordings/")
+    ap.add_argument("--replay", metavar="FILE", help="replay a recording offline")
+    ap.add_argument("--speed", type=float, default=1.0, help="replay speed factor (0 = as fast as possible)")
+    ap.add_argument("--check", action="store_true", help="with --replay: fail if OSC output differs from the recording")
+    ap.add_argument("--profile", metavar="NAME", help="start with this display profile ('' = base settings)")
+    args, _unknown = ap.parse_known_args()
+    if args.replay:
+        sys.exit(replay(args.replay, args.speed, args.check))
+    if args.headless or ctk is None:
+        sys.exit(run_headless(record=args.record, profile=args.profile))
     app = App()
+    if args.record:
+        app._toggle_recording(True)
+    if args.profile is not None:
+        app._on_profile_select(args.profile or PROFILE_BASE)
     def on_close():
         try: app._save_config()
         except: pass
-        app.running = False; app.destroy()
+        if app._auth_flow is not None: app._auth_flow.cancel()
+        app.cfg_watcher.stop()
+        if app._status_job is not None: app.after_cancel(app._status_job)
+        if app.control is not None: app.control.stop()
+        app.updater.stop(); app.updater.stop_recording(); CALLBACKS.close(); app.destroy()
     app.protocol("WM_DELETE_WINDOW", on_close)
     app.mainloop()
 
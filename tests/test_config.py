@@ -0,0 +1,77 @@
+import types
+
+import main
+
+def validate(raw):
+    problems = []
+    return main.validate_config(raw, problems), problems
+
+def test_defaults_are_frozen_and_complete():
+    cfg, problems = validate({})
+    assert problems == []
+    assert isinstance(cfg, types.MappingProxyType)
+    assert set(main.APP_DEFAULTS) <= set(cfg)
+    assert main.validate_config(cfg) is cfg          # schon geprüft → unverändert durchgereicht
+
+def test_scalars_are_clamped_or_fall_back_to_default():
+    cfg, problems = validate({"bar_length": 999, "update_interval": "5", "progress_style": "neon", "show_bar": "off"})
+    assert cfg["bar_length"] == 60
+    assert cfg["update_interval"] == 5
+    assert cfg["progress_style"] == main.APP_DEFAULTS["progress_style"]
+    assert cfg["show_bar"] is False
+    assert len(problems) == 1 and "progress_style" in problems[0]
+
+def test_bad_rotation_item_field_keeps_the_rest_of_the_list():
+    cfg, problems = validate({"rotation_items": [
+        {"text": "mine1"}, {"text": "mine2", "duration": "zz"}, 5, {"text": "w", "weight": 99, "when": "never"}]})
+    items = main.thaw(cfg["rotation_items"])
+    assert items == [{"text": "mine1"}, {"text": "mine2"}, {"text": "w", "weight": main.ROTATION_MAX_WEIGHT}]
+    assert any("rotation_items[1].duration" in p for p in problems)
+    assert any("rotation_items[2]" in p for p in problems)
+    assert any("rotation_items[3].when" in p for p in problems)
+
+def test_rotation_items_of_wrong_type_fall_back_to_defaults():
+    cfg, problems = validate({"rotation_items": "nope"})
+    assert main.thaw(cfg["rotation_items"]) == main.thaw(main.APP_DEFAULTS["rotation_items"])
+    assert problems
+
+def test_profiles_drop_only_bad_keys():
+    cfg, problems = validate({"profiles": {
+        "Night": {"bar_length": "x", "template": "{title}", "rotation_items": [{"text": "a", "weight": []}]},
+        "Broken": 3}})
+    profiles = main.thaw(cfg["profiles"])
+    assert profiles == {"Night": {"template": "{title}", "rotation_items": [{"text": "a"}]}}
+    assert any("profiles.Night.bar_length" in p for p in problems)
+    assert any("profiles.Night.rotation_items[0].weight" in p for p in problems)
+    assert any("profiles.Broken" in p for p in problems)
+
+def test_sessions_reject_bad_entries_and_colliding_names():
+    cfg, problems = validate({"sessions": [
+        {"name": "Ann B", "port": "bad"}, {"name": "Ann_B"}, {"name": "ann b"}, {"name": "Ann B"}, {},
+        {"name": "Cy", "tokens": "/x/t.json"}, {"name": "Di", "tokens": "/x/t.json"}]})
+    assert [s["name"] for s in cfg["sessions"]] == ["Ann B", "Cy"]
+    assert "port" not in cfg["sessions"][0]
+    assert len(problems) == 6
+
+def test_session_ports_must_be_unique():
+    cfg = main.validate_config({"osc_listen_enabled": True, "sessions": [
+        {"name": "A"}, {"name": "B"}, {"name": "C", "osc_listen_port": 9002}]})
+    problems = []
+    out = {name: scfg for name, scfg, _ in main.session_configs(cfg, problems)}
+    assert out["A"]["osc_listen_enabled"] and out["C"]["osc_listen_enabled"]
+    assert not out["B"]["osc_listen_enabled"]
+    assert len(problems) == 1 and "'B'" in problems[0]
+
+def test_migrate_v0_wraps_string_rotation_items():
+    raw = {"rotation_items": ["hello", {"text": "x"}]}
+    migrated = main.migrate_config(raw)
+    assert migrated["rotation_items"] == [{"text": "hello"}, {"text": "x"}]
+    assert "config_version" not in migrated
+
+def test_migrate_current_version_is_untouched():
+    raw = {"config_version": main.CONFIG_VERSION, "rotation_items": ["kept"]}
+    assert main.migrate_config(raw) == {"rotation_items": ["kept"]}
+
+def test_unknown_keys_survive_validation():
+    cfg, _ = validate({"future_key": 1})
+    assert cfg["future_key"] == 1
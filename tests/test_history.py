@@ -0,0 +1,54 @@
+import os
+
+import main
+
+def item(i, artist="A", name=None):
+    return {"id": f"t{i}", "name": name or f"Song {i}", "duration_ms": 1000 * i, "artists": [{"name": artist}]}
+
+def rows(store):
+    with open(store.path, "rb") as f:
+        data = f.read()
+    pos, out = main._HIST_HEADER.size, []
+    while pos < len(data):
+        (n,) = main._HIST_LEN.unpack_from(data, pos)
+        out.append(main.HistoryStore._decode(data, pos + main._HIST_LEN.size))
+        pos += main._HIST_LEN.size + n
+    return out
+
+def test_round_trip_and_cold_start(tmp_path):
+    h = main.HistoryStore(str(tmp_path), snapshot_every=2)
+    for i, artist in enumerate(("A", "B", "A"), 1):
+        h.add(item(i, artist), ts=1_700_000_000 + i)
+    assert (h.total, h.session_tracks, h.top_artist) == (3, 3, "A")
+    h.close()
+    assert [r[2:] for r in rows(h)] == [("t1", "Song 1", "A"), ("t2", "Song 2", "B"), ("t3", "Song 3", "A")]
+    again = main.HistoryStore(str(tmp_path))
+    assert again.total == 3
+    assert again.artists == {"A": 2, "B": 1}
+    assert again.session_tracks == 0
+
+def test_truncated_tail_is_dropped(tmp_path):
+    h = main.HistoryStore(str(tmp_path), snapshot_every=100)
+    h.add(item(1)); h.add(item(2))
+    size = os.path.getsize(h.path)
+    with open(h.path, "r+b") as f:
+        f.truncate(size - 3)            # Absturz mitten im Schreiben der zweiten Zeile
+    again = main.HistoryStore(str(tmp_path))
+    assert again.total == 1
+    assert [r[2] for r in rows(again)] == ["t1"]
+    again.add(item(3))
+    assert [r[2] for r in rows(again)] == ["t1", "t3"]
+
+def test_long_text_is_cut_on_a_character_boundary(tmp_path):
+    h = main.HistoryStore(str(tmp_path))
+    h.add(item(1, name="é" * 600))
+    title = rows(h)[0][3]
+    assert title == "é" * (main.HISTORY_FIELD_MAX // 2)
+    assert "�" not in title
+
+def test_old_day_counters_are_pruned(tmp_path):
+    h = main.HistoryStore(str(tmp_path), snapshot_every=1)
+    h.days = {"2001-01-01": 5}
+    h.add(item(1))
+    assert "2001-01-01" not in h.days
+    assert h.today() == 1
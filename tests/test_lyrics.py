@@ -0,0 +1,32 @@
+import main
+
+LRC = """[ar:Someone]
+[offset:+500]
+[00:01.00]first
+[00:05.50][00:20.00]chorus
+[00:10.25]<00:10.25>word <00:11.00>timed
+"""
+
+def test_parse_lrc_sorts_repeats_and_applies_offset():
+    lyr = main.parse_lrc(LRC)
+    assert lyr.times == [500, 5000, 9750, 19500]
+    assert lyr.lines == ["first", "chorus", "word timed", "chorus"]
+
+def test_lookup_returns_current_line_and_next_timestamp():
+    lyr = main.parse_lrc(LRC)
+    assert lyr.at(0) == ("", 500)
+    assert lyr.at(500) == ("first", 5000)
+    assert lyr.at(9999) == ("word timed", 19500)
+    assert lyr.at(60000) == ("chorus", None)
+
+def test_parse_lrc_without_timestamps_is_none():
+    assert main.parse_lrc("[ar:x]\nplain text") is None
+
+def test_store_finds_file_by_id_or_artist_title(tmp_path):
+    (tmp_path / "trackid.lrc").write_text("[00:00.00]by id", encoding="utf-8")
+    (tmp_path / "Art - Song.lrc").write_text("﻿[00:00.00]by name", encoding="utf-8")
+    store = main.LyricsStore(str(tmp_path))
+    assert store.get({"id": "trackid", "name": "x"}).at(0)[0] == "by id"
+    item = {"id": "other", "name": "Song", "artists": [{"name": "Art"}]}
+    assert store.get(item).at(0)[0] == "by name"
+    assert store.get({"id": "missing", "name": "Nope"}) is None
@@ -0,0 +1,36 @@
+import collections
+
+import main
+
+def test_weights_repeat_entries_evenly():
+    sched = main.RotationSchedule([{"text": "a", "weight": 3}, {"text": "b"}])
+    seq = sched.sequence(0, True, False)
+    assert collections.Counter(e.index for e in seq) == {0: 3, 1: 1}
+    assert [e.index for e in seq] != [0, 0, 0, 1]       # nicht alle a am Stück
+    assert sched.sequence(0, True, False) is seq         # einmal gebaut, danach Lookup
+
+def test_time_windows_including_midnight():
+    sched = main.RotationSchedule([
+        {"text": "day", "window": "08:00-20:00"},
+        {"text": "night", "window": "22:00-02:00"},
+        {"text": "always"}])
+    at = lambda h, m=0: [e.index for e in sched.sequence(h * 60 + m, True, False)]
+    assert at(12) == [0, 2]
+    assert at(21) == [2]
+    assert at(23, 30) == [1, 2]
+    assert at(1, 59) == [1, 2]
+    assert at(2) == [2]
+
+def test_conditions_follow_playback_and_afk():
+    sched = main.RotationSchedule([
+        {"text": "p", "when": "playing"}, {"text": "s", "when": "paused"},
+        {"text": "afk", "when": "afk"}, {"text": "here", "when": "active"}])
+    assert sched.needs_afk
+    assert [e.index for e in sched.sequence(0, True, False)] == [0, 3]
+    assert [e.index for e in sched.sequence(0, False, True)] == [1, 2]
+
+def test_parse_time_window():
+    assert main.parse_time_window("08:30-17:00") == (510, 1020)
+    assert main.parse_time_window("10:00-10:00") is None
+    assert main.parse_time_window("garbage") is None
+    assert main.parse_time_window("") is None
@@ -0,0 +1,51 @@
+import threading
+import time
+
+import main
+
+def test_jobs_run_in_deadline_order():
+    s = main.Scheduler()
+    ran, done = [], threading.Event()
+    now = s.clock()
+    for delay, tag in ((0.06, "c"), (0.02, "a"), (0.04, "b")):
+        s.call_at(now + delay, ran.append, tag)
+    s.call_at(now + 0.08, done.set)
+    assert done.wait(2)
+    assert ran == ["a", "b", "c"]
+
+def test_same_deadline_keeps_submission_order():
+    s = main.Scheduler()
+    ran, done = [], threading.Event()
+    when = s.clock() + 0.02
+    for tag in "xyz":
+        s.call_at(when, ran.append, tag)
+    s.call_at(when, done.set)
+    assert done.wait(2)
+    assert ran == ["x", "y", "z"]
+
+def test_cancelled_job_does_not_run():
+    s = main.Scheduler()
+    ran, done = [], threading.Event()
+    job = s.call_later(0.02, ran.append, "cancelled")
+    s.call_later(0.01, ran.append, "kept")
+    job.cancel()
+    s.call_later(0.05, done.set)
+    assert done.wait(2)
+    assert ran == ["kept"]
+    assert s.pending() == 0
+
+def test_earlier_job_wakes_sleeping_scheduler():
+    s = main.Scheduler()
+    s.call_later(30, lambda: None)
+    hit = threading.Event()
+    t0 = time.monotonic()
+    s.call_later(0.01, hit.set)
+    assert hit.wait(2)
+    assert time.monotonic() - t0 < 1
+
+def test_failing_job_does_not_stop_the_scheduler():
+    s = main.Scheduler()
+    done = threading.Event()
+    s.call_later(0.0, lambda: 1 / 0)
+    s.call_later(0.01, done.set)
+    assert done.wait(2)
@@ -0,0 +1,34 @@
+import main
+
+def test_high_priority_change_is_due_immediately():
+    slots = main.ChatboxSlots({"time": 6})
+    slots.update("track", "a"); slots.update("time", "0:01")
+    slots.mark_sent(0.0)
+    slots.update("track", "b")
+    assert slots.due(0.1)
+
+def test_low_priority_change_waits_for_its_interval():
+    slots = main.ChatboxSlots({"time": 6})
+    slots.update("track", "a"); slots.update("time", "0:01")
+    slots.mark_sent(10.0)
+    slots.update("time", "0:02")
+    assert slots.changed() == ["time"]
+    assert not slots.due(15.9)
+    assert slots.due(16.0)
+
+def test_unchanged_slots_are_never_due():
+    slots = main.ChatboxSlots({})
+    slots.update("main", "x")
+    slots.mark_sent(0.0)
+    slots.update("main", "x")
+    assert not slots.changed()
+    assert not slots.due(100.0)
+
+def test_first_value_of_low_slot_is_due_and_reset_forces_resend():
+    slots = main.ChatboxSlots({"clock": 15})
+    slots.update("clock", "20:15")
+    assert slots.due(0.0)
+    slots.mark_sent(0.0)
+    slots.reset()
+    slots.update("clock", "20:15")
+    assert slots.due(1.0)
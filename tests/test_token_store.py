@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+
+import pytest
+
+import main
+
+EXPIRED = {"access_token": "old", "refresh_token": "r0", "client_id": "cid", "expires_in": 1, "obtained_at": 0}
+
+def fresh(tag):
+    return {"access_token": tag, "refresh_token": "r-" + tag, "client_id": "cid",
+            "expires_in": 3600, "obtained_at": int(time.time())}
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "tokens.json")
+
+def slow_refresh(calls, delay=0.2, tag="new"):
+    def fn(cur):
+        calls.append(cur["refresh_token"])
+        time.sleep(delay)
+        return fresh(tag)
+    return fn
+
+def run_in_thread(fn, *args):
+    out = {}
+    t = threading.Thread(target=lambda: out.setdefault("v", fn(*args)))
+    t.start()
+    return t, out
+
+def test_concurrent_refreshes_spend_the_refresh_token_once(path):
+    main.TokenStore(path).set(EXPIRED)
+    calls = []
+    store = main.TokenStore(path)
+    t1, r1 = run_in_thread(store.refresh, slow_refresh(calls))
+    t2, r2 = run_in_thread(store.refresh, slow_refresh(calls))
+    t1.join(); t2.join()
+    assert calls == ["r0"]
+    assert r1["v"]["access_token"] == r2["v"]["access_token"] == "new"
+
+def test_refresh_from_second_store_adopts_file_instead_of_refreshing(path):
+    # zwei Instanzen = zwei Prozesse: die zweite sieht die erneuerte Datei und refresht nicht selbst
+    a, b = main.TokenStore(path), main.TokenStore(path)
+    a.set(EXPIRED); b.get()
+    calls = []
+    t1, _ = run_in_thread(a.refresh, slow_refresh(calls))
+    time.sleep(0.05)
+    got = b.refresh(slow_refresh(calls, tag="second"))
+    t1.join()
+    assert calls == ["r0"]
+    assert got["access_token"] == "new"
+
+def test_stale_cache_is_replaced_by_newer_file(path):
+    a, b = main.TokenStore(path), main.TokenStore(path)
+    a.set(EXPIRED)
+    time.sleep(0.01)
+    b.set(fresh("other-process"))
+    calls = []
+    got = a.refresh(slow_refresh(calls, delay=0))
+    assert calls == []
+    assert got["access_token"] == "other-process"
+
+def test_set_during_refresh_waits_and_wins(path):
+    store = main.TokenStore(path)
+    store.set(EXPIRED)
+    lock_path = path + ".lock"
+    written_under_lock = []
+    write = store._write
+    def checked_write(tokens):
+        written_under_lock.append(os.path.exists(lock_path))
+        write(tokens)
+    store._write = checked_write
+    calls = []
+    t, _ = run_in_thread(store.refresh, slow_refresh(calls))
+    time.sleep(0.05)
+    store.set(fresh("manual"))
+    t.join()
+    assert written_under_lock and all(written_under_lock)
+    assert store.get()["access_token"] == "manual"
+    assert main.TokenStore(path).get()["access_token"] == "manual"
+
+def test_clear_during_refresh_waits_and_wins(path):
+    store = main.TokenStore(path)
+    store.set(EXPIRED)
+    seen = []
+    store.subscribe(seen.append)
+    t, _ = run_in_thread(store.refresh, slow_refresh([]))
+    time.sleep(0.05)
+    store.clear()
+    t.join()
+    assert store.get() == {}
+    assert not os.path.exists(path)
+    assert seen[-1] == {}
+
+def test_get_does_not_block_on_refresh(path):
+    store = main.TokenStore(path)
+    store.set(EXPIRED)
+    t, _ = run_in_thread(store.refresh, slow_refresh([], delay=0.5))
+    time.sleep(0.05)
+    t0 = time.monotonic()
+    assert store.get()["access_token"] == "old"
+    assert time.monotonic() - t0 < 0.1
+    t.join()
+
+def test_lock_file_is_kept_alive_during_refresh(path, monkeypatch):
+    monkeypatch.setattr(main.TokenStore, "LOCK_KEEPALIVE", 0.05)
+    store = main.TokenStore(path)
+    store.set(EXPIRED)
+    lock_path = path + ".lock"
+    mtimes = []
+    def fn(cur):
+        for _ in range(4):
+            mtimes.append(os.path.getmtime(lock_path)); time.sleep(0.08)
+        return fresh("new")
+    store.refresh(fn)
+    assert mtimes[-1] > mtimes[0]
+    assert not os.path.exists(lock_path)
@@ -0,0 +1,65 @@
+import os
+import socket
+import struct
+
+import pytest
+
+import main
+
+def masked(payload, opcode=0x1, fin=True):
+    mask = os.urandom(4)
+    n = len(payload)
+    if n < 126: head = struct.pack("!BB", (0x80 if fin else 0) | opcode, 0x80 | n)
+    elif n < 65536: head = struct.pack("!BBH", 0x80 | opcode, 0x80 | 126, n)
+    else: head = struct.pack("!BBQ", 0x80 | opcode, 0x80 | 127, n)
+    return head + mask + bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+@pytest.fixture
+def pair():
+    a, b = socket.socketpair()
+    yield a, b
+    a.close(); b.close()
+
+def test_accept_key_matches_rfc_example():
+    assert main.ws_accept_key("dGhlIHNhbXBsZSBub25jZQ==") == "s3pPLMBiTxaQ9kYGzzhZRbK+xOo="
+
+@pytest.mark.parametrize("n, head_len", [(5, 2), (125, 2), (126, 4), (70000, 10)])
+def test_server_frame_lengths(n, head_len):
+    frame = main.ws_frame(b"x" * n)
+    assert frame[0] == 0x81
+    assert len(frame) == head_len + n
+    assert frame[1] & 0x80 == 0             # Server → Client: unmaskiert
+
+@pytest.mark.parametrize("n", [0, 5, 126, 3000])
+def test_read_masked_client_frame(pair, n):
+    client, server = pair
+    payload = bytes(range(256)) * (n // 256) + bytes(range(n % 256))
+    client.sendall(masked(payload, 0x2))
+    assert main.ws_read_frame(server) == (0x2, payload)
+
+def test_read_close_ping_and_eof(pair):
+    client, server = pair
+    client.sendall(masked(struct.pack("!H", 1000), 0x8) + masked(b"hi", 0x9))
+    assert main.ws_read_frame(server) == (0x8, b"\x03\xe8")
+    assert main.ws_read_frame(server) == (0x9, b"hi")
+    client.close()
+    assert main.ws_read_frame(server) is None
+
+def test_oversized_client_frame_is_treated_as_close(pair):
+    client, server = pair
+    client.sendall(struct.pack("!BBQ", 0x82, 0x80 | 127, main.WS_MAX_CLIENT_FRAME + 1))
+    assert main.ws_read_frame(server) == (0x8, struct.pack("!H", 1009))
+
+def test_drain_answers_ping_and_echoes_close(pair):
+    client, server = pair
+
+    class Handler:
+        class wfile:
+            @staticmethod
+            def write(data):
+                server.sendall(data)
+
+    api = main.ControlServer.__new__(main.ControlServer)
+    client.sendall(masked(b"p", 0x9) + masked(b"", 0xA) + masked(b"text") + masked(struct.pack("!H", 1001), 0x8))
+    assert api._ws_drain(Handler, server) is False
+    assert client.recv(64) == main.ws_frame(b"p", 0xA) + main.ws_frame(struct.pack("!H", 1001), 0x8)